@@ -8,6 +8,11 @@ import os
 import time
 from PIL import Image, ImageDraw, ImageFont
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # Path to WaveShare driver
 LIBDIR = '/root/projects/dietpink/software/eink/drivers/e-Paper/RaspberryPi_JetsonNano/python/lib'
 if os.path.exists(LIBDIR):
@@ -15,6 +20,83 @@ if os.path.exists(LIBDIR):
 
 from waveshare_epd import epd2in13_V4
 
+from metrics import counter, histogram
+from tracing import TRACER
+
+# Panel metrics (exposed by metrics.MetricsServer when a service starts one)
+REFRESHES = {kind: counter('dietpink_display_refreshes_total', 'Panel refreshes by kind',
+                           {'kind': kind})
+             for kind in ('full', 'partial')}
+GETBUFFER_MS = histogram('dietpink_display_getbuffer_ms', 'PIL image to panel buffer conversion')
+TRANSFER_MS = histogram('dietpink_display_transfer_ms', 'SPI transfer and commands (refresh minus BUSY)')
+BUSY_MS = histogram('dietpink_display_busy_ms', 'Time waiting on the BUSY pin per refresh')
+BYTES_SENT = counter('dietpink_display_bytes_sent_total', 'Frame buffer bytes sent to the panel')
+
+
+def lttb(times, values, threshold):
+    """
+    Downsample a series with Largest-Triangle-Three-Buckets
+    
+    Keeps the first and last points and, for each bucket in between, the
+    point forming the largest triangle with the previously kept point and
+    the average of the next bucket. Uses NumPy inside each bucket when
+    available.
+    
+    Args:
+        times, values: Sequences of equal length (sorted by time)
+        threshold: Number of points to keep
+    
+    Returns:
+        (times, values) lists with at most `threshold` points
+    """
+    n = len(times)
+    if threshold >= n or threshold < 3:
+        return list(times), list(values)
+    
+    if np is not None:
+        x = np.asarray(times, dtype=np.float64)
+        y = np.asarray(values, dtype=np.float64)
+    else:
+        x, y = times, values
+    
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    kept = [0]
+    
+    for i in range(threshold - 2):
+        # Average of the next bucket
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        
+        # Candidate points of the current bucket
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        
+        if np is not None:
+            avg_x = x[avg_start:avg_end].mean()
+            avg_y = y[avg_start:avg_end].mean()
+            areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) -
+                           (x[a] - x[start:end]) * (avg_y - y[a]))
+            a = start + int(areas.argmax())
+        else:
+            count = avg_end - avg_start
+            avg_x = sum(x[avg_start:avg_end]) / count
+            avg_y = sum(y[avg_start:avg_end]) / count
+            best = -1.0
+            for j in range(start, end):
+                area = abs((x[a] - avg_x) * (y[j] - y[a]) -
+                           (x[a] - x[j]) * (avg_y - y[a]))
+                if area > best:
+                    best = area
+                    best_j = j
+            a = best_j
+        
+        kept.append(a)
+    
+    kept.append(n - 1)
+    return [times[i] for i in kept], [values[i] for i in kept]
+
+
 class DietpinkDisplay:
     """
     Wrapper for WaveShare e-ink 2.13" V4
@@ -33,6 +115,8 @@ class DietpinkDisplay:
         """Initialize display"""
         print("🎨 Initializing DietpinkDisplay...")
         self.epd = epd2in13_V4.EPD()
+        self._busy_s = 0.0
+        self._instrument_busy()
         self.epd.init()
 
         # Physical clear of display to eliminate ghosting
@@ -46,8 +130,50 @@ class DietpinkDisplay:
         # Load fonts
         self._load_fonts()
         
+        # Rendered graphs, reused until their data changes
+        self._graph_cache = {}
+        
         print(f"✅ Display ready ({self.HEIGHT}x{self.WIDTH})")
     
+    def _instrument_busy(self):
+        """Time every ReadBusy() the driver makes (waveform time, not SPI)"""
+        read_busy = self.epd.ReadBusy
+        
+        def timed_read_busy():
+            start = time.monotonic()
+            try:
+                read_busy()
+            finally:
+                end = time.monotonic()
+                self._busy_s += end - start
+                TRACER.record('epd.busy', start, end)
+        
+        self.epd.ReadBusy = timed_read_busy
+    
+    def _send(self, image, partial=False):
+        """Convert an image, send it to the panel and record the timings"""
+        start = time.monotonic()
+        buffer = self.epd.getbuffer(image)
+        converted = time.monotonic()
+        
+        self._busy_s = 0.0
+        if partial:
+            self.epd.displayPartial(buffer)
+        else:
+            self.epd.display(buffer)
+        done = time.monotonic()
+        elapsed = done - converted
+        
+        # Trace: the gap between epd.display and its epd.busy children is SPI
+        TRACER.record('epd.getbuffer', start, converted)
+        TRACER.record('epd.display', converted, done, partial=partial, bytes=len(buffer))
+        
+        REFRESHES['partial' if partial else 'full'].inc()
+        GETBUFFER_MS.observe((converted - start) * 1000)
+        BUSY_MS.observe(self._busy_s * 1000)
+        TRANSFER_MS.observe((elapsed - self._busy_s) * 1000)
+        BYTES_SENT.inc(len(buffer))
+    
     def _load_fonts(self):
         """Load system fonts"""
         font_path = '/usr/share/fonts/truetype/dejavu/'
@@ -175,6 +301,74 @@ class DietpinkDisplay:
         if fill_width > 0:
             self.rectangle(x + 2, y + 2, fill_width, height - 4, fill=fill_color)
     
+    def render_graph(self, times, values, width, height, key=None,
+                     line_width=1, border=False, y_range=None):
+        """
+        Render a series as a 1-bit graph image
+        
+        The series is downsampled to the pixel width with LTTB, scaled to
+        fit and drawn as a single polyline. The result is cached per key
+        until the series changes (length or last timestamp).
+        
+        Args:
+            times, values: Series (sorted by time)
+            width, height: Graph size in pixels
+            key: Cache key (None = no caching)
+            line_width: Polyline thickness
+            border: Draw a frame around the graph
+            y_range: (min, max) fixed scale (None = auto-scale)
+        
+        Returns:
+            PIL Image ('1' mode) of width x height
+        """
+        signature = (len(times), times[-1] if len(times) else None,
+                     width, height, line_width, border, y_range)
+        if key is not None:
+            cached = self._graph_cache.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        
+        graph = Image.new('1', (width, height), self.WHITE)
+        draw = ImageDraw.Draw(graph)
+        
+        if border:
+            draw.rectangle((0, 0, width - 1, height - 1), outline=self.BLACK)
+        
+        if len(times) >= 2:
+            xs, ys = lttb(times, values, width)
+            
+            t0, t1 = xs[0], xs[-1]
+            if y_range is not None:
+                v0, v1 = y_range
+            else:
+                v0, v1 = min(ys), max(ys)
+            if v1 - v0 < 1e-9:
+                v0, v1 = v0 - 0.5, v1 + 0.5
+            
+            # Leave 1px margin so the line never touches the frame
+            sx = (width - 3) / (t1 - t0) if t1 > t0 else 0
+            sy = (height - 3) / (v1 - v0)
+            points = [(1 + (t - t0) * sx, height - 2 - (v - v0) * sy)
+                      for t, v in zip(xs, ys)]
+            draw.line(points, fill=self.BLACK, width=line_width)
+        
+        if key is not None:
+            self._graph_cache[key] = (signature, graph)
+        return graph
+    
+    def graph(self, x, y, width, height, times, values, key=None, **kwargs):
+        """
+        Draw a series graph on the canvas (see render_graph)
+        
+        Args:
+            x, y: Top-left position
+            width, height: Graph size
+            times, values: Series (sorted by time)
+            key: Cache key
+        """
+        self.image.paste(self.render_graph(times, values, width, height,
+                                           key=key, **kwargs), (x, y))
+    
     def image_from_file(self, path, x, y, width=None, height=None):
         """
         Load and draw image from file
@@ -210,7 +404,7 @@ class DietpinkDisplay:
             image = image.convert('1')
         
         # Mostrar al display
-        self.epd.display(self.epd.getbuffer(image))
+        self._send(image)
     
     def refresh(self, partial=False):
         """
@@ -219,10 +413,7 @@ class DietpinkDisplay:
         Args:
             partial: Use partial refresh (faster, less ghosting)
         """
-        if partial:
-            self.epd.displayPartial(self.epd.getbuffer(self.image))
-        else:
-            self.epd.display(self.epd.getbuffer(self.image))
+        self._send(self.image, partial)
     
     def sleep(self):
         """Put display in sleep mode (low power)"""
@@ -1,47 +1,62 @@
 """
 Simple digital clock for dietpink
-Updates every second with partial refresh
+Updates on every whole second with partial refresh
 """
 
 import sys
 sys.path.append('/root/projects/dietpink/software/eink')
+sys.path.append('/root/projects/dietpink/software/eink/modules')
 
 from dietpink_display import DietpinkDisplay
+from scheduler import TimerScheduler
 import time
 
+# Full refresh interval to clear partial-refresh ghosting (seconds)
+DEGHOST_INTERVAL = 600
+
+def draw_clock(display):
+    """Draw the current time and push it with a partial refresh"""
+    # Clear canvas
+    display.clear()
+    
+    # Header with date
+    display.rectangle(0, 0, 250, 28, fill=display.BLACK)
+    date_str = time.strftime('%A, %d %B %Y')
+    display.text(date_str, 125, 6, size='small', 
+               color=display.WHITE, align='center')
+    
+    # Large time in center
+    time_str = time.strftime('%H:%M')
+    display.text(time_str, 125, 50, size='huge', align='center')
+    
+    # Small seconds below
+    seconds_str = time.strftime(':%S')
+    display.text(seconds_str, 125, 90, size='medium', align='center')
+    
+    # Footer
+    display.line(10, 108, 240, 108)
+    display.text("dietpink clock", 125, 112, size='tiny', align='center')
+    
+    # Refresh with partial (faster, less flickering)
+    display.refresh(partial=True)
+
 def main():
     print("🕐 Starting dietpink clock...")
     print("   Press Ctrl+C to stop")
     
     with DietpinkDisplay() as display:
+        scheduler = TimerScheduler()
+        
+        # Tick on each whole second: the render time does not add drift
+        scheduler.call_every(1, lambda: draw_clock(display), name="clock",
+                             align=True, first_delay=0)
+        
+        # Periodic full refresh (on the 10-minute boundary) against ghosting
+        scheduler.call_every(DEGHOST_INTERVAL, lambda: display.refresh(partial=False),
+                             name="deghost", align=True)
+        
         try:
-            while True:
-                # Clear canvas
-                display.clear()
-                
-                # Header with date
-                display.rectangle(0, 0, 250, 28, fill=display.BLACK)
-                date_str = time.strftime('%A, %d %B %Y')
-                display.text(date_str, 125, 6, size='small', 
-                           color=display.WHITE, align='center')
-                
-                # Large time in center
-                time_str = time.strftime('%H:%M')
-                display.text(time_str, 125, 50, size='huge', align='center')
-                
-                # Small seconds below
-                seconds_str = time.strftime(':%S')
-                display.text(seconds_str, 125, 90, size='medium', align='center')
-                
-                # Footer
-                display.line(10, 108, 240, 108)
-                display.text("dietpink clock", 125, 112, size='tiny', align='center')
-                
-                # Refresh with partial (faster, less flickering)
-                display.refresh(partial=True)
-                
-                # Wait 1 second
-                time.sleep(1)
+            scheduler.run()
                 
         except KeyboardInterrupt:
             print("\n⏹️  Clock stopped")
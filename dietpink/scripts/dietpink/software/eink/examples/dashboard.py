@@ -1,119 +1,102 @@
 """
 Complete dashboard for dietpink
 Shows time, temperature and statistics with progress bars
-Updates automatically every 5 seconds
+Updates automatically every 5 seconds (aligned to the clock)
 """
 
 import sys
 sys.path.append('/root/projects/dietpink/software/eink')
+sys.path.append('/root/projects/dietpink/software/eink/modules')
 
 from dietpink_display import DietpinkDisplay
-import subprocess
+from scheduler import TimerScheduler
+from sysstats import SystemStats
 import time
 
+UPDATE_INTERVAL = 5
+
+# Kept open between updates: CPU% is measured over the update interval
+STATS = SystemStats()
+
 def get_stats():
     """Get system statistics"""
-    stats = {}
+    stats = STATS.snapshot()
+    stats['temp'] = f"{stats['temp']:.1f}" if stats['temp'] is not None else 'N/A'
+    return stats
+
+def draw_dashboard(display, iteration):
+    """Draw one dashboard frame (full refresh on the first one)"""
+    display.clear()
     
-    # Temperature
-    try:
-        temp = subprocess.check_output(['vcgencmd', 'measure_temp']).decode()
-        stats['temp'] = temp.replace('temp=', '').replace("'C\n", '').strip()
-    except:
-        stats['temp'] = 'N/A'
+    # Black header with title and time
+    display.rectangle(0, 0, 250, 28, fill=display.BLACK)
+    display.text("dietpink", 10, 6, size='medium', color=display.WHITE)
+    display.text(time.strftime('%H:%M:%S'), 190, 6, size='medium', 
+               color=display.WHITE)
     
-    # CPU usage (load average)
-    try:
-        load = subprocess.check_output(['cat', '/proc/loadavg']).decode().split()[0]
-        stats['cpu'] = min(int(float(load) * 100), 100)
-    except:
-        stats['cpu'] = 0
+    # Date and temperature
+    y = 35
+    display.text(time.strftime('%d/%m/%Y'), 10, y, size='small')
     
-    # Memory usage
-    try:
-        mem = subprocess.check_output(['free']).decode().split('\n')[1].split()
-        total = int(mem[1])
-        used = int(mem[2])
-        stats['mem'] = int((used / total) * 100)
-    except:
-        stats['mem'] = 0
+    # Get statistics
+    stats = get_stats()
+    display.text(f"{stats['temp']}°C", 190, y, size='small')
     
-    # Disk usage
-    try:
-        disk = subprocess.check_output(['df', '/']).decode().split('\n')[1].split()
-        stats['disk'] = int(disk[4].replace('%', ''))
-    except:
-        stats['disk'] = 0
+    # Separator
+    display.line(10, 50, 240, 50)
     
-    return stats
+    # Progress bars amb labels
+    y = 58
+    spacing = 18
+    
+    # CPU
+    display.text("CPU", 10, y, size='tiny')
+    display.progress_bar(45, y, 170, 12, stats['cpu'])
+    display.text(f"{stats['cpu']}%", 220, y, size='tiny')
+    y += spacing
+    
+    # RAM
+    display.text("RAM", 10, y, size='tiny')
+    display.progress_bar(45, y, 170, 12, stats['mem'])
+    display.text(f"{stats['mem']}%", 220, y, size='tiny')
+    y += spacing
+    
+    # Disk
+    display.text("Disk", 10, y, size='tiny')
+    display.progress_bar(45, y, 170, 12, stats['disk'])
+    display.text(f"{stats['disk']}%", 220, y, size='tiny')
+    
+    # Footer
+    display.line(10, 108, 240, 108)
+    display.text(f"Update #{iteration+1}", 125, 112, 
+               size='tiny', align='center')
+    
+    # Refresh (partial after first iteration)
+    if iteration == 0:
+        display.refresh(partial=False)  # First refresh: full
+    else:
+        display.refresh(partial=True)   # Subsequent: partial
 
 def main():
     print("📊 dietpink dashboard starting...")
-    print("   Updates every 5 seconds")
+    print(f"   Updates every {UPDATE_INTERVAL} seconds")
     print("   Press Ctrl+C to stop")
     
     with DietpinkDisplay() as display:
-        iteration = 0
+        scheduler = TimerScheduler()
+        
+        def update():
+            draw_dashboard(display, job.runs)
+        
+        # First frame now, then on every 5-second boundary (no drift)
+        job = scheduler.call_every(UPDATE_INTERVAL, update, name="dashboard",
+                                   align=True, first_delay=0)
         
         try:
-            while True:
-                display.clear()
-                
-                # Black header with title and time
-                display.rectangle(0, 0, 250, 28, fill=display.BLACK)
-                display.text("dietpink", 10, 6, size='medium', color=display.WHITE)
-                display.text(time.strftime('%H:%M:%S'), 190, 6, size='medium', 
-                           color=display.WHITE)
-                
-                # Date and temperature
-                y = 35
-                display.text(time.strftime('%d/%m/%Y'), 10, y, size='small')
-                
-                # Get statistics
-                stats = get_stats()
-                display.text(f"{stats['temp']}°C", 190, y, size='small')
-                
-                # Separator
-                display.line(10, 50, 240, 50)
-                
-                # Progress bars amb labels
-                y = 58
-                spacing = 18
-                
-                # CPU
-                display.text("CPU", 10, y, size='tiny')
-                display.progress_bar(45, y, 170, 12, stats['cpu'])
-                display.text(f"{stats['cpu']}%", 220, y, size='tiny')
-                y += spacing
-                
-                # RAM
-                display.text("RAM", 10, y, size='tiny')
-                display.progress_bar(45, y, 170, 12, stats['mem'])
-                display.text(f"{stats['mem']}%", 220, y, size='tiny')
-                y += spacing
-                
-                # Disk
-                display.text("Disk", 10, y, size='tiny')
-                display.progress_bar(45, y, 170, 12, stats['disk'])
-                display.text(f"{stats['disk']}%", 220, y, size='tiny')
-                
-                # Footer
-                display.line(10, 108, 240, 108)
-                display.text(f"Update #{iteration+1}", 125, 112, 
-                           size='tiny', align='center')
-                
-                # Refresh (partial after first iteration)
-                if iteration == 0:
-                    display.refresh(partial=False)  # First refresh: full
-                else:
-                    display.refresh(partial=True)   # Subsequent: partial
-                
-                iteration += 1
-                
-                # Update every 5 seconds
-                time.sleep(5)
+            scheduler.run()
                 
         except KeyboardInterrupt:
+            iteration = job.runs
             print(f"\n⏹️  Dashboard stopped after {iteration} updates")
             display.clear()
             display.text("Dashboard", 125, 50, size='large', align='center')
@@ -121,4 +104,4 @@ def main():
             display.refresh()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
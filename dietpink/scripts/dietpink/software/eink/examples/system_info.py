@@ -7,56 +7,40 @@ import sys
 sys.path.append('/root/projects/dietpink/software/eink')
 
 from dietpink_display import DietpinkDisplay
-import subprocess
+from sysstats import SystemStats, format_bytes
 import time
 
+STATS = SystemStats()
+
 def get_cpu_temp():
     """Get CPU temperature"""
-    try:
-        temp = subprocess.check_output(['vcgencmd', 'measure_temp']).decode()
-        return temp.replace('temp=', '').replace("'C\n", '').strip()
-    except:
-        return "N/A"
+    temp = STATS.temperature()
+    return f"{temp:.1f}" if temp is not None else "N/A"
 
 def get_cpu_usage():
-    """Get CPU usage % (approximated from load average)"""
-    try:
-        # Load average for 1 min
-        load = subprocess.check_output(['cat', '/proc/loadavg']).decode().split()[0]
-        # Pi Zero W has 1 core, so load 1.0 = 100%
-        percentage = min(float(load) * 100, 100)
-        return f"{percentage:.0f}%"
-    except:
-        return "N/A"
+    """Get CPU usage % (all cores, measured over half a second)"""
+    percentage = STATS.cpu_percent(interval=0.5)
+    return f"{percentage:.0f}%" if percentage is not None else "N/A"
 
 def get_memory():
     """Get memory used"""
-    try:
-        mem = subprocess.check_output(['free', '-h']).decode().split('\n')[1].split()
-        used = mem[2]
-        total = mem[1]
-        return f"{used}/{total}"
-    except:
+    mem = STATS.memory()
+    if mem is None:
         return "N/A"
+    used, total = mem
+    return f"{format_bytes(used)}/{format_bytes(total)}"
 
 def get_disk():
     """Get disk space"""
-    try:
-        disk = subprocess.check_output(['df', '-h', '/']).decode().split('\n')[1].split()
-        used = disk[2]
-        total = disk[1]
-        percent = disk[4]
-        return f"{used}/{total} ({percent})"
-    except:
+    disk = STATS.disk('/')
+    if disk is None:
         return "N/A"
+    used, total, percent = disk
+    return f"{format_bytes(used)}/{format_bytes(total)} ({percent}%)"
 
 def get_ip():
     """Get wlan0 IP"""
-    try:
-        ip = subprocess.check_output(['hostname', '-I']).decode().strip().split()[0]
-        return ip
-    except:
-        return "N/A"
+    return STATS.ip_address() or "N/A"
 
 def main():
     print("💻 System info display...")
@@ -0,0 +1,293 @@
+"""
+metrics - Lightweight metrics registry for dietpink
+Counters, gauges and fixed-bucket histograms, served as Prometheus text
+on a local HTTP port (stdlib only)
+"""
+
+import time
+import bisect
+from threading import Lock, Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default histogram buckets in milliseconds (SPI transfer .. full refresh)
+DEFAULT_MS_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _format_value(value):
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def samples(self, name, labels):
+        return [(name, labels, self._value)]
+
+
+class Gauge:
+    """Value that can go up and down, or be read from a function at scrape time"""
+
+    def __init__(self):
+        self._value = 0
+        self._func = None
+        self._lock = Lock()
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, func):
+        """Read the value from func() on every scrape"""
+        self._func = func
+
+    @property
+    def value(self):
+        if self._func is not None:
+            try:
+                return self._func()
+            except Exception:
+                return float('nan')
+        return self._value
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative buckets only built at scrape time)"""
+
+    def __init__(self, buckets=DEFAULT_MS_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.bounds) + 1)  # Last slot: +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time_ms(self):
+        """Context manager: observe the elapsed time in milliseconds"""
+        return _Timer(self)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        rows = []
+        cumulative = 0
+        for bound, n in zip(self.bounds + (float('inf'),), counts):
+            cumulative += n
+            rows.append((f"{name}_bucket", labels + (('le', _format_value(float(bound))),),
+                         cumulative))
+        rows.append((f"{name}_sum", labels, total))
+        rows.append((f"{name}_count", labels, count))
+        return rows
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe((time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class Registry:
+    """Named metric families, each with one child per label set"""
+
+    def __init__(self):
+        self._families = {}  # name -> [type, help, {labels: metric}]
+        self._lock = Lock()
+
+    def _get(self, kind, factory, name, help_text, labels):
+        key = tuple(sorted((labels or {}).items()))
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = [kind, help_text, {}]
+            elif family[0] != kind:
+                raise ValueError(f"Metric {name} already registered as {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+            return metric
+
+    def counter(self, name, help_text='', labels=None):
+        """Get or create a counter (name should end in _total)"""
+        return self._get('counter', Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text='', labels=None):
+        """Get or create a gauge"""
+        return self._get('gauge', Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text='', labels=None, buckets=DEFAULT_MS_BUCKETS):
+        """Get or create a histogram"""
+        return self._get('histogram', lambda: Histogram(buckets), name, help_text, labels)
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            families = [(name, kind, help_text, list(children.items()))
+                        for name, (kind, help_text, children) in sorted(self._families.items())]
+        lines = []
+        for name, kind, help_text, children in families:
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in children:
+                for sample_name, sample_labels, value in metric.samples(name, labels):
+                    lines.append(f"{sample_name}{_format_labels(sample_labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry used by the display, MQTT, YR and scheduler modules
+REGISTRY = Registry()
+
+
+def counter(name, help_text='', labels=None):
+    return REGISTRY.counter(name, help_text, labels)
+
+
+def gauge(name, help_text='', labels=None):
+    return REGISTRY.gauge(name, help_text, labels)
+
+
+def histogram(name, help_text='', labels=None, buckets=DEFAULT_MS_BUCKETS):
+    return REGISTRY.histogram(name, help_text, labels, buckets)
+
+
+class MetricsServer:
+    """Serve a registry on http://host:port/metrics from a daemon thread"""
+
+    def __init__(self, registry=REGISTRY, host='127.0.0.1', port=9105, routes=None):
+        """
+        Args:
+            registry: Registry to expose
+            host: Bind address (127.0.0.1 = local only)
+            port: TCP port (0 = any free port)
+            routes: Optional extra pages, path -> func() returning
+                    (content_type, body bytes)
+        """
+        self.registry = registry
+        self.routes = dict(routes or {})
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, name="metrics_http", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        registry = self.registry
+        routes = self.routes
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path in ('/metrics', '/'):
+                    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                    body = registry.render().encode()
+                elif path in routes:
+                    content_type, body = routes[path]()
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+# Module test
+if __name__ == "__main__":
+    import urllib.request
+
+    refreshes = counter('demo_refreshes_total', 'Display refreshes', {'kind': 'partial'})
+    busy = histogram('demo_busy_ms', 'BUSY wait')
+    uptime = gauge('demo_uptime_seconds', 'Seconds since start')
+    start = time.monotonic()
+    uptime.set_function(lambda: round(time.monotonic() - start, 3))
+
+    for ms in (3, 12, 40, 300, 2100):
+        refreshes.inc()
+        busy.observe(ms)
+
+    server = MetricsServer(port=0).start()
+    url = f"http://127.0.0.1:{server.port}/metrics"
+    print(f"📈 Metrics at {url}\n")
+    print(urllib.request.urlopen(url).read().decode())
+
+    n = 100000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        busy.observe(42)
+    print(f"observe(): {(time.perf_counter() - t0) / n * 1e9:.0f} ns")
+    server.stop()
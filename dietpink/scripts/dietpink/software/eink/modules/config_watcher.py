@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+config_watcher.py - Recàrrega en calent de weather_config.json
+- inotify (ctypes, sense dependències) sobre el directori del fitxer:
+  els editors solen desar amb fitxer temporal + rename
+- Fallback a polling de stat() si inotify no està disponible
+- diff_config: quines claus han canviat entre dues configuracions
+"""
+
+import os
+import json
+import select
+import struct
+import ctypes
+import ctypes.util
+from threading import Thread, Event
+
+# Constants de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def _load_libc():
+    """libc amb inotify, o None (no Linux / sense permisos)"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def diff_config(old, new, prefix=''):
+    """
+    Claus que han canviat entre dues configuracions
+
+    Es baixa fins al segon nivell ('mqtt.topics', 'yr_api.user_agent'):
+    és la granularitat a la qual WeatherDisplay aplica els canvis.
+
+    Returns:
+        set de claus amb punts
+    """
+    changed = set()
+    for key in set(old) | set(new):
+        path = f"{prefix}{key}"
+        a, b = old.get(key), new.get(key)
+        if a == b:
+            continue
+        if not prefix and isinstance(a, dict) and isinstance(b, dict):
+            changed |= diff_config(a, b, prefix=f"{path}.")
+        else:
+            changed.add(path)
+    return changed
+
+
+class ConfigWatcher:
+    """Vigila un fitxer JSON i crida callback(config) quan canvia"""
+
+    def __init__(self, path, callback, debounce_ms=200, poll_interval=2.0,
+                 use_inotify=True):
+        """
+        Args:
+            path: Fitxer de configuració
+            callback: callback(config) amb el dict nou (thread del watcher)
+            debounce_ms: Espera després d'un event per agrupar escriptures
+            poll_interval: Segons entre comprovacions en mode polling
+            use_inotify: False per forçar el mode polling
+        """
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.debounce_s = debounce_ms / 1000.0
+        self.poll_interval = poll_interval
+        self.libc = _load_libc() if use_inotify else None
+
+        self.last_text = self._read_text()
+        self.last_stat = self._stat()
+        self.reloads = 0
+
+        self.stop_event = Event()
+        self.thread = None
+        self.inotify_fd = None
+        self.wake_r, self.wake_w = None, None
+
+    def start(self):
+        """Iniciar el thread de vigilància"""
+        self.stop_event.clear()
+        target = self._run_polling
+        if self.libc is not None:
+            self.inotify_fd = self._inotify_setup()
+            if self.inotify_fd is not None:
+                self.wake_r, self.wake_w = os.pipe()
+                target = self._run_inotify
+        mode = "inotify" if target == self._run_inotify else "polling"
+        print(f"👀 Config: Vigilant {os.path.basename(self.path)} ({mode})")
+
+        self.thread = Thread(target=target, name="config_watcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Aturar el thread i tancar descriptors"""
+        self.stop_event.set()
+        if self.wake_w is not None:
+            os.write(self.wake_w, b'x')
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+        for fd in (self.inotify_fd, self.wake_r, self.wake_w):
+            if fd is not None:
+                os.close(fd)
+        self.inotify_fd = self.wake_r = self.wake_w = None
+
+    def _inotify_setup(self):
+        fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        directory = os.path.dirname(self.path).encode()
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if self.libc.inotify_add_watch(fd, directory, mask) < 0:
+            print(f"⚠️  Config: inotify no disponible ({os.strerror(ctypes.get_errno())})")
+            os.close(fd)
+            return None
+        return fd
+
+    def _run_inotify(self):
+        name = os.path.basename(self.path).encode()
+        while not self.stop_event.is_set():
+            ready, _, _ = select.select([self.inotify_fd, self.wake_r], [], [])
+            if self.wake_r in ready:
+                return
+
+            if not self._drain_events(name):
+                continue
+            # Agrupar les escriptures d'un mateix desat (truncate + write + rename)
+            if self.stop_event.wait(self.debounce_s):
+                return
+            self._drain_events(name)
+            self._check()
+
+    def _drain_events(self, name):
+        """Llegir els events pendents; True si algun és del nostre fitxer"""
+        hit = False
+        while True:
+            try:
+                buf = os.read(self.inotify_fd, 4096)
+            except BlockingIOError:
+                return hit
+            offset = 0
+            while offset < len(buf):
+                _, _, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                event_name = buf[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if event_name == name:
+                    hit = True
+
+    def _run_polling(self):
+        while not self.stop_event.wait(self.poll_interval):
+            stat = self._stat()
+            if stat != self.last_stat:
+                self.last_stat = stat
+                self._check()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_ino, st.st_size, st.st_mtime_ns)
+        except OSError:
+            return None
+
+    def _read_text(self):
+        try:
+            with open(self.path, 'r') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _check(self):
+        """Rellegir el fitxer i notificar si el contingut és nou i vàlid"""
+        text = self._read_text()
+        if text is None or text == self.last_text:
+            return
+        try:
+            config = json.loads(text)
+        except ValueError as e:
+            # Fitxer a mig editar o amb errors: mantenir l'anterior
+            print(f"⚠️  Config: JSON no vàlid, ignorant canvi: {e}")
+            return
+        self.last_text = text
+        self.reloads += 1
+        try:
+            self.callback(config)
+        except Exception as e:
+            print(f"❌ Config: Error aplicant canvis: {e}")
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(prefix="dietpink_cfg_"), 'weather_config.json')
+    config = {'mqtt': {'topics': {'balco': 'a'}, 'qos': 0}, 'yr_api': {'update_interval_hours': 3}}
+    with open(path, 'w') as f:
+        json.dump(config, f)
+
+    def on_change(new):
+        global config
+        print(f"🔔 Canvis: {sorted(diff_config(config, new))}")
+        config = new
+
+    watcher = ConfigWatcher(path, on_change, use_inotify='--poll' not in sys.argv,
+                            poll_interval=0.2).start()
+
+    # Desat atòmic com fan els editors (temporal + rename)
+    new = {'mqtt': {'topics': {'balco': 'b'}, 'qos': 0}, 'yr_api': {'update_interval_hours': 1}}
+    with open(path + '.tmp', 'w') as f:
+        json.dump(new, f)
+    start = time.perf_counter()
+    os.replace(path + '.tmp', path)
+    while watcher.reloads == 0 and time.perf_counter() - start < 5:
+        time.sleep(0.01)
+    print(f"   Detectat en {(time.perf_counter() - start) * 1000:.0f} ms")
+    watcher.stop()
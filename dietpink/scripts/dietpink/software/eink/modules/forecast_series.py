@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+forecast_series.py - Sèrie temporal de previsió YR en columnes
+Converteix tot el timeseries de locationforecast en columnes tipades
+(array o NumPy si està disponible) amb consultes per finestres de temps
+"""
+
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from threading import Lock
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Taula global de símbols (id <-> symbol_code). L'id 0 és 'unknown'
+SYMBOL_CODES = ['unknown']
+_SYMBOL_IDS = {'unknown': 0}
+_SYMBOL_LOCK = Lock()  # yr_multi parseja diverses ubicacions en paral·lel
+
+NAN = float('nan')
+
+
+def symbol_id(symbol_code):
+    """Obtenir (o registrar) l'id numèric d'un symbol_code"""
+    if symbol_code is None:
+        return 0
+    sid = _SYMBOL_IDS.get(symbol_code)
+    if sid is None:
+        with _SYMBOL_LOCK:
+            # Un altre thread el pot haver registrat mentre esperàvem
+            sid = _SYMBOL_IDS.get(symbol_code)
+            if sid is None:
+                sid = len(SYMBOL_CODES)
+                SYMBOL_CODES.append(symbol_code)
+                _SYMBOL_IDS[symbol_code] = sid
+    return sid
+
+
+def parse_time(iso_time):
+    """Convertir '2025-10-19T12:00:00Z' a epoch (segons UTC)"""
+    return datetime.fromisoformat(iso_time.replace('Z', '+00:00')).timestamp()
+
+
+class ForecastSeries:
+    """
+    Previsió completa en columnes compactes
+
+    Columnes (una fila per punt del timeseries):
+        times: epoch UTC (array 'd')
+        temperature, wind_speed, wind_direction: valors instant (array 'f')
+        precipitation: mm del període més fi disponible (1h o 6h)
+        symbol: id del símbol més fi disponible (array 'H')
+        symbol_6h: id del símbol de les pròximes 6h (array 'H')
+
+    Els valors absents es guarden com NaN (floats) o 0 (símbols).
+    """
+
+    FLOAT_COLUMNS = ('temperature', 'wind_speed', 'wind_direction', 'precipitation')
+    SYMBOL_COLUMNS = ('symbol', 'symbol_6h')
+
+    def __init__(self):
+        """Crear sèrie buida (s'omple amb append)"""
+        self.times = array('d')
+        self.temperature = array('f')
+        self.wind_speed = array('f')
+        self.wind_direction = array('f')
+        self.precipitation = array('f')
+        self.symbol = array('H')
+        self.symbol_6h = array('H')
+
+        # Vistes NumPy (creades a freeze())
+        self._np = None
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, t, temperature=None, wind_speed=None, wind_direction=None,
+               precipitation=None, symbol_code=None, symbol_code_6h=None):
+        """
+        Afegir un punt al final de la sèrie
+
+        Args:
+            t: Epoch UTC del punt (ha de ser creixent)
+            temperature..precipitation: floats o None
+            symbol_code, symbol_code_6h: strings YR o None
+        """
+        self._np = None  # Les columnes canvien: la còpia NumPy ja no val
+        self.times.append(t)
+        self.temperature.append(NAN if temperature is None else temperature)
+        self.wind_speed.append(NAN if wind_speed is None else wind_speed)
+        self.wind_direction.append(NAN if wind_direction is None else wind_direction)
+        self.precipitation.append(NAN if precipitation is None else precipitation)
+        self.symbol.append(symbol_id(symbol_code))
+        self.symbol_6h.append(symbol_id(symbol_code_6h))
+
+    def append_entry(self, entry):
+        """
+        Afegir un element del timeseries de YR (dict ja decodificat)
+
+        Args:
+            entry: {'time': ..., 'data': {'instant': ..., 'next_1_hours': ...}}
+        """
+        data = entry.get('data', {})
+        instant = data.get('instant', {}).get('details', {})
+        next_1h = data.get('next_1_hours')
+        next_6h = data.get('next_6_hours')
+
+        # Precipitació i símbol del període més fi disponible
+        period = next_1h or next_6h or {}
+
+        self.append(
+            parse_time(entry['time']),
+            temperature=instant.get('air_temperature'),
+            wind_speed=instant.get('wind_speed'),
+            wind_direction=instant.get('wind_from_direction'),
+            precipitation=period.get('details', {}).get('precipitation_amount'),
+            symbol_code=period.get('summary', {}).get('symbol_code'),
+            symbol_code_6h=(next_6h or {}).get('summary', {}).get('symbol_code')
+        )
+
+    @classmethod
+    def from_timeseries(cls, timeseries):
+        """Construir la sèrie a partir de properties.timeseries"""
+        series = cls()
+        for entry in timeseries:
+            series.append_entry(entry)
+        series.freeze()
+        return series
+
+    def freeze(self):
+        """
+        Crear còpies NumPy de les columnes float (si NumPy està disponible)
+
+        Són còpies i no vistes (np.frombuffer): una vista manté exportat
+        el buffer de l'array i un append() posterior fallaria amb
+        BufferError. Les columnes són petites (~90 punts).
+        """
+        if np is None or self._np is not None:
+            return
+        self._np = {
+            name: np.array(getattr(self, name), dtype=np.float32)
+            for name in self.FLOAT_COLUMNS
+        }
+
+    # ------------------------------------------------------------------
+    # Consultes per finestra
+    # ------------------------------------------------------------------
+
+    def index_at(self, t=None):
+        """
+        Índex del punt vigent a l'instant t (O(log n))
+
+        Args:
+            t: Epoch UTC (None = ara). Es limita al rang de la sèrie.
+        """
+        if t is None:
+            t = time.time()
+        i = bisect_right(self.times, t) - 1
+        return max(0, min(i, len(self.times) - 1))
+
+    def window(self, hours, start=None, inclusive=True):
+        """
+        Rang d'índexs [i0, i1) dels punts dins la finestra
+
+        Args:
+            hours: Durada de la finestra en hores
+            start: Epoch d'inici (None = punt vigent ara)
+            inclusive: Incloure el punt just a start + hours
+        """
+        if not self.times:
+            return 0, 0
+        i0 = self.index_at(start)
+        end = self.times[i0] + hours * 3600
+        if inclusive:
+            i1 = bisect_right(self.times, end, lo=i0)
+        else:
+            i1 = bisect_left(self.times, end, lo=i0)
+        return i0, i1
+
+    def _reduce(self, column, hours, start, np_func, py_func, inclusive=True):
+        """Aplicar una reducció ignorant NaN a una columna dins la finestra"""
+        i0, i1 = self.window(hours, start, inclusive)
+        if i1 <= i0:
+            return None
+
+        if self._np is not None:
+            values = self._np[column][i0:i1]
+            values = values[~np.isnan(values)]
+            return float(np_func(values)) if values.size else None
+
+        values = [v for v in getattr(self, column)[i0:i1] if v == v]
+        return py_func(values) if values else None
+
+    def max_temp(self, next_hours=6, start=None):
+        """Temperatura màxima dins les pròximes next_hours"""
+        return self._reduce('temperature', next_hours, start, np.max if np else None, max)
+
+    def min_temp(self, next_hours=6, start=None):
+        """Temperatura mínima dins les pròximes next_hours"""
+        return self._reduce('temperature', next_hours, start, np.min if np else None, min)
+
+    def precip_sum(self, next_hours=6, start=None):
+        """Precipitació acumulada (mm) de les pròximes next_hours"""
+        total = self._reduce('precipitation', next_hours, start,
+                             np.sum if np else None, sum, inclusive=False)
+        return round(total, 1) if total is not None else 0.0
+
+    def value_at(self, column, t=None):
+        """Valor d'una columna al punt vigent a l'instant t (None si absent)"""
+        if not self.times:
+            return None
+        value = getattr(self, column)[self.index_at(t)]
+        return None if value != value else value
+
+    def symbol_at(self, t=None, six_hours=False):
+        """
+        Symbol code vigent a l'instant t
+
+        Args:
+            t: Epoch UTC (None = ara)
+            six_hours: Usar el resum de 6h en lloc del període més fi
+        """
+        if not self.times:
+            return 'unknown'
+        column = self.symbol_6h if six_hours else self.symbol
+        return SYMBOL_CODES[column[self.index_at(t)]]
+
+    def summary(self, t=None, hours=6):
+        """
+        Resum de previsió en el format de YRWeatherClient
+
+        Args:
+            t: Epoch UTC de referència (None = ara)
+            hours: Finestra per max/min/pluja
+
+        Returns:
+            dict amb symbol_code, precipitation, temperatures i vent
+        """
+        def _value(v, default=0.0):
+            # Les columnes són float32: arrodonir per no arrossegar soroll
+            return round(v, 1) if v is not None else default
+
+        current = _value(self.value_at('temperature', t))
+
+        symbol = self.symbol_at(t, six_hours=True)
+        if symbol == 'unknown':
+            symbol = self.symbol_at(t)
+
+        return {
+            'symbol_code': symbol,
+            'precipitation': self.precip_sum(hours, t),
+            'temperature_current': current,
+            'temperature_max': _value(self.max_temp(hours, t), current),
+            'temperature_min': _value(self.min_temp(hours, t), current),
+            'wind_speed': _value(self.value_at('wind_speed', t)),
+            'wind_direction': _value(self.value_at('wind_direction', t)),
+        }
+
+    # ------------------------------------------------------------------
+    # Serialització (cache a disc)
+    # ------------------------------------------------------------------
+
+    def to_dict(self):
+        """Convertir a dict serialitzable a JSON (símbols com a strings)"""
+        data = {'times': list(self.times)}
+        for name in self.FLOAT_COLUMNS:
+            data[name] = [None if v != v else round(v, 2) for v in getattr(self, name)]
+        for name in self.SYMBOL_COLUMNS:
+            data[name] = [SYMBOL_CODES[i] for i in getattr(self, name)]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Reconstruir una sèrie creada amb to_dict()"""
+        series = cls()
+        for row in zip(data['times'], data['temperature'], data['wind_speed'],
+                       data['wind_direction'], data['precipitation'],
+                       data['symbol'], data['symbol_6h']):
+            series.append(*row)
+        series.freeze()
+        return series
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    # Sèrie sintètica: 48 punts horaris + 8 punts de 6h
+    t0 = 1760875200.0  # 2025-10-19T12:00:00Z
+    timeseries = []
+    for i in range(56):
+        hours = i if i < 48 else 48 + (i - 48) * 6
+        period = 'next_1_hours' if i < 48 else 'next_6_hours'
+        timeseries.append({
+            'time': datetime.fromtimestamp(t0 + hours * 3600, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'data': {
+                'instant': {'details': {'air_temperature': 10 + (hours % 24) / 2,
+                                        'wind_speed': 3.0,
+                                        'wind_from_direction': 90.0}},
+                period: {'summary': {'symbol_code': 'rain' if hours % 5 else 'cloudy'},
+                         'details': {'precipitation_amount': 0.5}}
+            }
+        })
+
+    series = ForecastSeries.from_timeseries(timeseries)
+    print(f"📊 Punts: {len(series)} (NumPy: {'sí' if np else 'no'})")
+    print(f"   Max 6h: {series.max_temp(6, t0)}°C")
+    print(f"   Min 6h: {series.min_temp(6, t0)}°C")
+    print(f"   Pluja 12h: {series.precip_sum(12, t0)} mm")
+    print(f"   Símbol +5h: {series.symbol_at(t0 + 5 * 3600)}")
+    print(f"   Resum: {series.summary(t0)}")
+
+    # Afegir punts després de freeze() (abans: BufferError amb vistes)
+    last = series.times[-1]
+    series.append(last + 6 * 3600, temperature=30.0, symbol_code='clearsky_day')
+    series.freeze()
+    assert series.max_temp(6, last + 6 * 3600) == 30.0
+    series.append(last + 12 * 3600, temperature=31.0)
+    print(f"   Append després de freeze(): {len(series)} punts")
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+ha_client.py - Client de Home Assistant
+- /api/config amb cache a disc i TTL (sense petició REST a cada arrencada)
+- Estats d'entitats en temps real per una sola connexió websocket
+  (alternativa a publicar-los per MQTT amb automatitzacions)
+"""
+
+import os
+import json
+import time
+import requests
+from datetime import datetime, timedelta
+from threading import Thread, Event, Lock
+
+try:
+    import websocket  # websocket-client (opcional)
+except ImportError:
+    websocket = None
+
+
+class HAAuthError(Exception):
+    """Token rebutjat per Home Assistant"""
+
+
+class HAClient:
+    """Client REST + websocket de Home Assistant"""
+
+    def __init__(self, url, token, cache_path=None, config_ttl_hours=24,
+                 timeout=10, ping_interval=30):
+        """
+        Inicialitzar client
+
+        Args:
+            url: URL base de HA (p.ex. http://192.168.0.10:8123)
+            token: Long-Lived Access Token
+            cache_path: Fitxer JSON per la cache de /api/config (opcional);
+                        només és vàlida per a la mateixa url
+            config_ttl_hours: Edat màxima de la cache abans de refrescar-la
+            timeout: Timeout de xarxa en segons
+            ping_interval: Segons sense trànsit abans d'enviar un ping pel websocket
+        """
+        self.url = url.rstrip('/')
+        self.token = token
+        self.cache_path = cache_path
+        self.config_ttl = timedelta(hours=config_ttl_hours)
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+
+        # Subscripció d'estats
+        self.entity_ids = ()
+        self.callback = None
+        self.states = {}             # entity_id -> (state, attributes)
+        self.states_lock = Lock()
+        self.ready = Event()         # Estats inicials rebuts
+        self.connected = False
+        self.running = False
+        self.stop_event = Event()
+        self.ws = None
+        self.ws_thread = None
+        self._next_id = 1
+
+    # ------------------------------------------------------------------
+    # /api/config
+    # ------------------------------------------------------------------
+
+    def get_config(self):
+        """
+        Configuració de HA (latitude, longitude, time_zone...)
+
+        Es fa servir la cache si té menys de config_ttl; altrament es
+        demana a HA i, si falla, es retorna la cache encara que sigui antiga.
+
+        Returns:
+            dict o None
+        """
+        cached, fetched_at = self._load_config_cache()
+        if cached is not None and datetime.now() - fetched_at < self.config_ttl:
+            return cached
+
+        try:
+            response = requests.get(
+                f"{self.url}/api/config",
+                headers={'Authorization': f"Bearer {self.token}"},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            config = response.json()
+            self._save_config_cache(config)
+            return config
+        except (requests.RequestException, ValueError) as e:
+            print(f"   ⚠️  HA: Error obtenint /api/config: {e}")
+            if cached is not None:
+                print(f"   ↩️  HA: Usant config en cache ({fetched_at.strftime('%d/%m %H:%M')})")
+            return cached
+
+    def get_coordinates(self):
+        """(lat, lon) de HA o None"""
+        config = self.get_config()
+        if not config:
+            return None
+        return (config['latitude'], config['longitude'])
+
+    def clear_config_cache(self):
+        """Esborrar la cache de /api/config (el pròxim get_config la demana a HA)"""
+        if not self.cache_path:
+            return
+        try:
+            os.remove(self.cache_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"   ⚠️  HA: Error esborrant cache: {e}")
+
+    def _load_config_cache(self):
+        if not self.cache_path:
+            return None, None
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+            if cache.get('url') != self.url:
+                # Cache d'una altra instància de HA: com si no n'hi hagués
+                return None, None
+            return cache['config'], datetime.fromisoformat(cache['fetched_at'])
+        except FileNotFoundError:
+            return None, None
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"   ⚠️  HA: Cache invàlida: {e}")
+            return None, None
+
+    def _save_config_cache(self, config):
+        """Escriure la cache de forma atòmica (fitxer temporal + rename)"""
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump({'url': self.url, 'fetched_at': datetime.now().isoformat(),
+                           'config': config}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"   ⚠️  HA: Error desant cache: {e}")
+
+    # ------------------------------------------------------------------
+    # Websocket: estats en temps real
+    # ------------------------------------------------------------------
+
+    @property
+    def ws_url(self):
+        if self.url.startswith('https://'):
+            return 'wss://' + self.url[len('https://'):] + '/api/websocket'
+        return 'ws://' + self.url.split('://', 1)[-1] + '/api/websocket'
+
+    def subscribe_states(self, entity_ids, callback):
+        """
+        Rebre els canvis d'estat d'unes entitats (thread de fons)
+
+        En connectar (i reconnectar) es llegeixen els estats actuals, així
+        que el callback rep primer el valor vigent de cada entitat.
+
+        Args:
+            entity_ids: Llista d'entity_id (p.ex. ['sensor.balco_temperature'])
+            callback: callback(entity_id, state, attributes), cridat al
+                      thread del websocket
+        """
+        if websocket is None:
+            raise RuntimeError("websocket-client no instal·lat (pip3 install websocket-client)")
+
+        self.entity_ids = tuple(entity_ids)
+        self.callback = callback
+        self.running = True
+        self.stop_event.clear()
+        self.ws_thread = Thread(target=self._ws_loop, name="ha_websocket", daemon=True)
+        self.ws_thread.start()
+
+    def wait_for_initial(self, timeout=5.0):
+        """Esperar els estats inicials (True si han arribat)"""
+        return self.ready.wait(timeout)
+
+    def get_state(self, entity_id):
+        """Últim (state, attributes) conegut d'una entitat o None"""
+        with self.states_lock:
+            return self.states.get(entity_id)
+
+    def stop(self):
+        """Tancar el websocket i aturar el thread"""
+        self.running = False
+        self.stop_event.set()
+        ws = self.ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if self.ws_thread is not None:
+            self.ws_thread.join(timeout=5)
+            self.ws_thread = None
+
+    def _ws_loop(self):
+        """Mantenir la connexió amb reconnexió i backoff"""
+        delay = 1
+        while self.running:
+            try:
+                self._ws_session()
+                delay = 1
+            except HAAuthError as e:
+                print(f"❌ HA: Autenticació rebutjada: {e}")
+                delay = 300  # No insistir amb un token invàlid
+            except (OSError, ValueError, websocket.WebSocketException) as e:
+                if self.running:
+                    print(f"⚠️  HA: Websocket caigut: {e}")
+            finally:
+                self.connected = False
+                self.ws = None
+
+            if self.running:
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, 60)
+
+    def _send(self, ws, message):
+        message['id'] = self._next_id
+        self._next_id += 1
+        ws.send(json.dumps(message))
+        return message['id']
+
+    def _ws_session(self):
+        """Una connexió: autenticar, subscriure, llegir estats inicials i escoltar"""
+        ws = websocket.create_connection(self.ws_url, timeout=self.timeout)
+        self.ws = ws
+        try:
+            message = json.loads(ws.recv())
+            if message.get('type') != 'auth_required':
+                raise ValueError(f"Missatge inesperat: {message.get('type')}")
+            ws.send(json.dumps({'type': 'auth', 'access_token': self.token}))
+            message = json.loads(ws.recv())
+            if message.get('type') != 'auth_ok':
+                raise HAAuthError(message.get('message', message.get('type')))
+
+            self._next_id = 1
+            # El filtre per entitat el fa HA: només arriben els canvis demanats
+            sub_id = self._send(ws, {
+                'type': 'subscribe_trigger',
+                'trigger': {'platform': 'state', 'entity_id': list(self.entity_ids)}
+            })
+            states_id = self._send(ws, {'type': 'get_states'})
+            self.connected = True
+            print(f"✅ HA: Websocket connectat ({len(self.entity_ids)} entitats)")
+
+            ws.settimeout(self.ping_interval)
+            ping_pending = False
+            while self.running:
+                try:
+                    raw = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    if ping_pending:
+                        raise ValueError("sense resposta al ping")
+                    self._send(ws, {'type': 'ping'})
+                    ping_pending = True
+                    continue
+                if not raw:
+                    raise ValueError("connexió tancada")
+
+                ping_pending = False
+                message = json.loads(raw)
+                kind = message.get('type')
+                if kind == 'event' and message.get('id') == sub_id:
+                    to_state = message['event']['variables']['trigger'].get('to_state')
+                    if to_state:
+                        self._dispatch(to_state)
+                elif kind == 'result' and message.get('id') == states_id:
+                    for state in message.get('result') or ():
+                        if state['entity_id'] in self.entity_ids:
+                            self._dispatch(state)
+                    self.ready.set()
+                elif kind == 'result' and not message.get('success', True):
+                    print(f"⚠️  HA: Error a la petició {message.get('id')}: {message.get('error')}")
+        finally:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def _dispatch(self, state):
+        entity_id = state['entity_id']
+        value = state.get('state')
+        attributes = state.get('attributes', {})
+        with self.states_lock:
+            self.states[entity_id] = (value, attributes)
+        if self.callback:
+            try:
+                self.callback(entity_id, value, attributes)
+            except Exception as e:
+                print(f"⚠️  HA: Error al callback: {e}")
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    with open('/root/projects/dietpink/software/eink/config/weather_config.json', 'r') as f:
+        config = json.load(f)
+
+    ha_config = config['homeassistant']
+    client = HAClient(ha_config['url'], ha_config['token'],
+                      cache_path='/tmp/dietpink_ha_config.json')
+
+    start = time.perf_counter()
+    print(f"📍 Coordenades: {client.get_coordinates()} "
+          f"({(time.perf_counter() - start) * 1000:.0f} ms)")
+
+    entities = list(ha_config.get('entities', {}).values())
+    if entities and websocket is not None:
+        client.subscribe_states(entities, lambda e, s, a: print(f"🔔 {e} = {s}"))
+        print(f"   Inicials: {client.wait_for_initial(10)}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            client.stop()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+log_setup.py - Logging asíncron per dietpink
+- QueueHandler als threads productors (MQTT, renderer): només encuen el
+  record; el format i l'escriptura es fan al thread del QueueListener
+- Límit de freqüència per missatge (les ràfegues no arriben al journal)
+- Nivells configurables per mòdul
+- Log circular opcional a RAM (tmpfs) en lloc de la SD
+"""
+
+import sys
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+from threading import Lock
+
+LOG_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+ROOT_LOGGER = 'dietpink'
+
+_listener = None
+
+
+def get_logger(name):
+    """Logger fill de 'dietpink' (p.ex. get_logger('mqtt') -> dietpink.mqtt)"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Deixa passar com a molt 'burst' records per clau i interval
+
+    La clau és l'atribut 'rate_key' del record (extra={'rate_key': ...})
+    o, si no n'hi ha, el logger + la plantilla del missatge: cada crida
+    a log.debug("%s = %s", ...) té una sola clau encara que canviïn els
+    arguments. El primer record de l'interval següent indica quants
+    se n'han suprimit.
+    """
+
+    MAX_KEYS = 1024
+
+    def __init__(self, interval=10.0, burst=5, min_level=logging.DEBUG):
+        """
+        Args:
+            interval: Finestra en segons
+            burst: Records permesos per clau dins la finestra
+            min_level: Nivell a partir del qual s'aplica (ERROR i més sempre passen)
+        """
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.min_level = min_level
+        self.windows = {}  # clau -> [inici, comptador, suprimits]
+        self.lock = Lock()
+        self.suppressed = 0
+
+    def filter(self, record):
+        if self.interval <= 0 or record.levelno >= logging.ERROR or record.levelno < self.min_level:
+            return True
+
+        key = getattr(record, 'rate_key', None) or (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if len(self.windows) >= self.MAX_KEYS:
+                    self.windows.clear()
+                dropped = window[2] if window is not None else 0
+                self.windows[key] = [now, 1, 0]
+                if dropped:
+                    record.msg = f"{record.msg} [+{dropped} suprimits]"
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que no formata al thread productor"""
+
+    def prepare(self, record):
+        # El QueueHandler estàndard formata aquí (al thread que fa log).
+        # Els arguments dels nostres missatges són valors simples, així que
+        # es pot diferir el format al QueueListener sense risc.
+        return record
+
+
+def setup_logging(config=None):
+    """
+    Configurar (o reconfigurar) el logging de dietpink
+
+    Args:
+        config: dict opcional (secció 'logging' de weather_config.json):
+            level: Nivell general ('INFO' per defecte)
+            levels: dict mòdul -> nivell (p.ex. {'mqtt': 'DEBUG'})
+            rate_limit_s: Finestra del límit per missatge (0 = desactivat)
+            rate_limit_burst: Records per missatge i finestra
+            console: Escriure a stdout (journal) (True per defecte)
+            ring_path: Fitxer del log circular (p.ex. /dev/shm/dietpink.log)
+            ring_max_kb: Mida màxima del log circular (es guarda 1 fitxer antic)
+
+    Returns:
+        logging.Logger: el logger 'dietpink'
+    """
+    global _listener
+    config = config or {}
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+    handlers = []
+    formatter = logging.Formatter(LOG_FORMAT, datefmt='%H:%M:%S')
+    if config.get('console', True):
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(formatter)
+        handlers.append(console)
+    if config.get('ring_path'):
+        try:
+            ring = logging.handlers.RotatingFileHandler(
+                config['ring_path'],
+                maxBytes=config.get('ring_max_kb', 512) * 1024,
+                backupCount=1
+            )
+            ring.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers.append(ring)
+        except OSError as e:
+            print(f"⚠️  Log: No s'ha pogut obrir {config['ring_path']}: {e}")
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(
+        interval=config.get('rate_limit_s', 10),
+        burst=config.get('rate_limit_burst', 5)
+    ))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers[:] = [queue_handler]
+    root.propagate = False
+    root.setLevel(config.get('level', 'INFO').upper())
+
+    # Nivells per mòdul (els que ja no hi són tornen a heretar)
+    for name, logger in list(logging.Logger.manager.loggerDict.items()):
+        if name.startswith(f"{ROOT_LOGGER}.") and isinstance(logger, logging.Logger):
+            logger.setLevel(logging.NOTSET)
+    for name, level in config.get('levels', {}).items():
+        get_logger(name).setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers,
+                                               respect_handler_level=True)
+    _listener.start()
+    return root
+
+
+def shutdown_logging():
+    """Buidar la cua i aturar el thread escriptor"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    setup_logging({'level': 'DEBUG', 'rate_limit_s': 1, 'rate_limit_burst': 3,
+                   'ring_path': '/tmp/dietpink_test.log', 'ring_max_kb': 64})
+    log = get_logger('test')
+
+    print("🧪 Test log_setup")
+    start = time.perf_counter()
+    for i in range(10000):
+        log.debug("mostra %d = %.2f°C", i, 20 + i / 100)
+    elapsed = time.perf_counter() - start
+    time.sleep(1.1)
+    log.debug("mostra %d = %.2f°C", -1, 0.0)  # Porta el recompte de suprimits
+    shutdown_logging()
+    print(f"   10000 crides en {elapsed * 1000:.1f} ms ({elapsed * 1e5:.1f} µs/crida)")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+mqtt_asyncio.py - Integració de paho-mqtt amb un loop asyncio
+Substitueix el thread de loop_start(): el socket del client es registra
+al loop (add_reader/add_writer) i loop_misc() corre com una tasca
+"""
+
+import asyncio
+import socket
+
+import paho.mqtt.client as mqtt
+
+
+class AsyncioHelper:
+    """
+    Connecta els hooks de socket de paho amb un loop asyncio
+
+    Tot (lectura, escriptura, keepalive i reconnexió) s'executa al thread
+    del loop, de manera que els callbacks de paho no competeixen amb cap
+    altre thread.
+    """
+
+    def __init__(self, loop, client, reconnect_min=1, reconnect_max=120):
+        """
+        Args:
+            loop: Loop asyncio en execució
+            client: mqtt.Client ja configurat
+            reconnect_min, reconnect_max: Backoff de reconnexió (segons)
+        """
+        self.loop = loop
+        self.client = client
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.misc_task = None
+        self.reconnect = True
+
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def start(self):
+        """Iniciar la tasca de manteniment (keepalive + reconnexió)"""
+        if self.misc_task is None:
+            self.misc_task = self.loop.create_task(self._misc_loop())
+
+    def stop(self):
+        """Aturar la tasca de manteniment (no reconnectar més)"""
+        self.reconnect = False
+        if self.misc_task is not None:
+            self.misc_task.cancel()
+            self.misc_task = None
+
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        # Buffer d'enviament petit: els missatges són curts i així
+        # register_write s'allibera aviat
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 2048)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def _misc_loop(self):
+        """loop_misc() cada segon i reconnexió amb backoff si cal"""
+        delay = self.reconnect_min
+        while True:
+            rc = self.client.loop_misc()
+            if rc == mqtt.MQTT_ERR_NO_CONN and self.reconnect:
+                await asyncio.sleep(delay)
+                try:
+                    self.client.reconnect()
+                    delay = self.reconnect_min
+                except OSError as e:
+                    print(f"⚠️  MQTT: Reconnexió fallida: {e}")
+                    delay = min(delay * 2, self.reconnect_max)
+                continue
+            await asyncio.sleep(1)
@@ -2,16 +2,55 @@
 """
 mqtt_handler.py - Gestor de connexions MQTT
 Subscriu a topics de temperatura i gestiona callbacks
+
+Dos modes: amb threads (connect(): loop_start + worker de callbacks) o
+dins un loop asyncio (connect_async(): tot al thread del loop)
 """
 
+import sys
+import json
+import time
+import queue
+import asyncio
 import paho.mqtt.client as mqtt
-from threading import Lock
+from threading import Lock, Thread, Event
+from collections import OrderedDict
+
+from sensor_registry import SensorRegistry
+from sensor_history import SensorHistory
+from sensor_filters import build_pipeline
+from sensor_extractors import compile_extractor
+from mqtt_asyncio import AsyncioHelper
+from log_setup import get_logger
+
+sys.path.append('/root/projects/dietpink/software/eink')
+from metrics import counter, gauge, histogram
+from tracing import TRACER
+
+log = get_logger('mqtt')
+
+# Element de la cua: recalcular l'espera del worker (nou flanc final pendent)
+_WAKE = object()
+
+MESSAGES = counter('dietpink_mqtt_messages_total', 'MQTT messages for known topics')
+INVALID = counter('dietpink_mqtt_invalid_total', 'Payloads that could not be decoded')
+SAMPLES = {outcome: counter('dietpink_mqtt_samples_total', 'Decoded samples by filter outcome',
+                            {'outcome': outcome})
+           for outcome in ('forwarded', 'filtered', 'rejected', 'trailing')}
+DROPPED = counter('dietpink_mqtt_dropped_notifications_total', 'Notifications dropped (queue full)')
+CONNECTED = gauge('dietpink_mqtt_connected', '1 while connected to the broker')
+NOTIFY_DELAY_MS = histogram('dietpink_mqtt_notify_delay_ms',
+                            'First change to callback start (coalescing + queueing)')
+CALLBACK_MS = histogram('dietpink_mqtt_callback_ms', 'Data callback duration')
 
 
 class MQTTHandler:
     """Gestor de connexions MQTT per dietpink"""
     
-    def __init__(self, broker, port, username, password, topics):
+    def __init__(self, broker, port, username, password, topics,
+                 coalesce_ms=200, queue_size=8, qos=0,
+                 history_size=0, history_windows=(3600, 86400), store=None,
+                 filters=None, history_max_keys=64):
         """
         Inicialitzar handler MQTT
         
@@ -20,23 +59,65 @@ class MQTTHandler:
             port: Port del broker (normalment 1883)
             username: Usuari MQTT
             password: Password MQTT
-            topics: dict amb topics a subscriure
+            topics: dict nom -> topic (admet wildcards + i #) o dict amb
+                    'topic' i extracció JSON ('path', 'scale', 'unit')
+            coalesce_ms: Finestra per agrupar canvis en una sola crida al callback
+            queue_size: Mida màxima de la cua de notificacions pendents
+            qos: QoS de les subscripcions (0, 1 o 2)
+            history_size: Mostres guardades per sensor (0 = sense històric)
+            history_windows: Finestres (s) amb estadístiques lliscants
+            store: SensorStore per persistir les mostres a disc (opcional)
+            filters: dict sensor -> especificació de filtres (veure
+                     sensor_filters.build_pipeline); 'default' per la resta
+            history_max_keys: Màxim d'històrics de claus de wildcard; en
+                              passar-lo es descarta el menys actualitzat
+                              (els sensors amb topic exacte no compten)
         """
         self.broker = broker
         self.port = port
         self.username = username
         self.password = password
         self.topics = topics
+        self.registry = SensorRegistry(topics)
+        
+        # Extractors JSON compilats un sol cop (sensors sense spec: float pla)
+        self.extractors = {name: compile_extractor(spec)
+                           for name, spec in self.registry.specs.items()}
         
-        # Dades rebudes
-        self.data = {
-            'temp_balco': None,
-            'temp_menjador': None
-        }
+        # Dades rebudes (una clau per sensor; els wildcards s'afegeixen en arribar)
+        self.data = {name: None for name in self.registry.static_names}
         self.data_lock = Lock()
+        self.qos = qos
+        
+        # Pipeline de filtres per sensor (es crea amb la primera mostra)
+        self.filter_specs = filters or {}
+        self.pipelines = {}
+        self.trailing = set()  # Claus amb una mostra retinguda per min_interval
+        
+        # Històric en memòria fixa per sensor (es crea amb la primera mostra)
+        self.history_size = history_size
+        self.history_windows = tuple(history_windows)
+        self.history_max_keys = history_max_keys
+        self.history = OrderedDict()  # Ordre LRU per les claus de wildcard
+        self.store = store
+        if self.store is not None and self.history_size:
+            self._preload_history()
+        
+        # Un Event per sensor: es marca quan arriba el primer valor (retained)
+        self.ready_events = {name: Event() for name in self.data}
         
-        # Callbacks externs
+        # Callbacks externs (executats al thread worker, no al de xarxa)
         self.on_data_callback = None
+        self.coalesce_s = coalesce_ms / 1000.0
+        self.dispatch_queue = queue.Queue(maxsize=queue_size)
+        self.dispatch_thread = None
+        self.dropped_notifications = 0
+        
+        # Mode asyncio (None = mode threads)
+        self.loop = None
+        self.aio = None
+        self.pending_callback = None  # Handle de call_later (coalescència)
+        self.arrived = None           # asyncio.Event: ha arribat un primer valor
         
         # Client MQTT
         self.client = mqtt.Client(
@@ -51,32 +132,67 @@ class MQTTHandler:
         self.client.on_disconnect = self._on_disconnect
         
         self.connected = False
+        CONNECTED.set_function(lambda: int(self.connected))
     
     def connect(self):
         """Connectar al broker MQTT"""
         try:
             print(f"🔌 MQTT: Connectant a {self.broker}:{self.port}...")
             self.client.connect(self.broker, self.port, 60)
+            self._start_dispatcher()
             self.client.loop_start()
             return True
         except Exception as e:
             print(f"❌ MQTT: Error connexió: {e}")
             return False
     
+    async def connect_async(self):
+        """
+        Connectar dins el loop asyncio actual (sense threads)
+        
+        El socket es gestiona amb add_reader/add_writer del loop, i el
+        callback extern s'executa al mateix loop després de la finestra
+        de coalescència. Si retorna una corrutina, es llança com a tasca.
+        
+        Returns:
+            bool: True si s'ha iniciat la connexió
+        """
+        self.loop = asyncio.get_running_loop()
+        self.arrived = asyncio.Event()
+        self.aio = AsyncioHelper(self.loop, self.client)
+        try:
+            print(f"🔌 MQTT: Connectant a {self.broker}:{self.port} (asyncio)...")
+            self.client.connect(self.broker, self.port, 60)
+        except Exception as e:
+            print(f"❌ MQTT: Error connexió: {e}")
+            self.aio.stop()
+            return False
+        self.aio.start()
+        return True
+    
     def disconnect(self):
         """Desconnectar del broker"""
         print("🔌 MQTT: Desconnectant...")
+        if self.aio is not None:
+            self.aio.stop()
+            if self.pending_callback is not None:
+                self.pending_callback.cancel()
+                self.pending_callback = None
+            self.client.disconnect()
+            self.connected = False
+            return
         self.client.loop_stop()
         self.client.disconnect()
         self.connected = False
+        self._stop_dispatcher()
     
     def set_data_callback(self, callback):
         """
         Establir callback quan arriben dades noves
         
         Args:
-            callback: funció a cridar quan canvia temperatura
-                     Signatura: callback(balco, menjador)
+            callback: funció a cridar quan canvien les dades
+                     Signatura: callback(snapshot) amb dict nom -> valor
         """
         self.on_data_callback = callback
     
@@ -88,7 +204,267 @@ class MQTTHandler:
             tuple: (temp_balco, temp_menjador)
         """
         with self.data_lock:
-            return (self.data['temp_balco'], self.data['temp_menjador'])
+            return (self.data.get('balco'), self.data.get('menjador'))
+    
+    def wait_for_initial(self, keys=None, timeout=5.0):
+        """
+        Esperar fins que tots els sensors indicats tinguin un primer valor
+        
+        Amb missatges retained al broker arriben just després del SUBSCRIBE,
+        així que normalment retorna en pocs mil·lisegons.
+        
+        Args:
+            keys: Noms dels sensors (None = tots els de topic exacte)
+            timeout: Límit total en segons
+            
+        Returns:
+            bool: True si tots han arribat dins el límit
+        """
+        if keys is None:
+            keys = list(self.ready_events)
+        
+        deadline = time.monotonic() + timeout
+        for key in keys:
+            remaining = deadline - time.monotonic()
+            if not self._ready_event(key).wait(max(0.0, remaining)):
+                return False
+        return True
+    
+    async def wait_for_initial_async(self, keys=None, timeout=5.0):
+        """Equivalent de wait_for_initial() per al mode asyncio"""
+        if keys is None:
+            keys = list(self.ready_events)
+        
+        deadline = self.loop.time() + timeout
+        while not all(self._ready_event(key).is_set() for key in keys):
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                return False
+            self.arrived.clear()
+            try:
+                await asyncio.wait_for(self.arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+    
+    def _ready_event(self, key):
+        """Obtenir (o crear) l'Event d'un sensor"""
+        with self.data_lock:
+            event = self.ready_events.get(key)
+            if event is None:
+                event = self.ready_events[key] = Event()
+            return event
+    
+    def _preload_history(self):
+        """Recuperar l'històric en memòria des de disc després d'un reinici"""
+        since = time.time() - max(self.history_windows, default=86400)
+        for key in self.data:
+            times, values = self.store.read(key, since)
+            if not times:
+                continue
+            history = self._history_for(key)
+            for t, value in zip(times, values):
+                history.append(value, t)
+            print(f"📈 MQTT: {key}: {len(times)} mostres recuperades de disc")
+    
+    def _history_for(self, key):
+        """
+        Històric d'una clau (es crea si no existeix); cridar amb data_lock
+        
+        Cada topic concret d'un wildcard té el seu anell de history_size
+        mostres: amb molts dispositius la memòria creixeria sense límit,
+        així que se'n guarden history_max_keys i es descarta el que fa
+        més temps que no rep res.
+        """
+        history = self.history.get(key)
+        if key in self.registry.topics:
+            if history is None:
+                history = self.history[key] = SensorHistory(self.history_size,
+                                                            self.history_windows)
+            return history
+        
+        if history is not None:
+            self.history.move_to_end(key)
+            return history
+        
+        wildcard_keys = [k for k in self.history if k not in self.registry.topics]
+        for old in wildcard_keys[:max(0, len(wildcard_keys) - self.history_max_keys + 1)]:
+            del self.history[old]
+            log.debug("📉 %s: històric descartat (history_max_keys)", old)
+        history = self.history[key] = SensorHistory(self.history_size, self.history_windows)
+        return history
+    
+    def get_stats(self, key, seconds):
+        """
+        Estadístiques lliscants d'un sensor
+        
+        Args:
+            key: Nom del sensor
+            seconds: Finestra (ha de ser a history_windows)
+            
+        Returns:
+            dict amb min, max, mean, count, rate_per_hour (o None)
+        """
+        with self.data_lock:
+            history = self.history.get(key)
+            return history.stats(seconds) if history else None
+    
+    def get_today(self, key):
+        """Mínim i màxim des de mitjanit d'un sensor (dict o None)"""
+        with self.data_lock:
+            history = self.history.get(key)
+            return history.today() if history else None
+    
+    def get_series(self, key, since=None):
+        """Mostres (times, values) d'un sensor per dibuixar gràfics"""
+        with self.data_lock:
+            history = self.history.get(key)
+            return history.series(since) if history else None
+    
+    def _decode(self, keys, payload):
+        """
+        Valors de cada clau a partir d'un payload
+        
+        El JSON es descodifica un sol cop encara que el missatge alimenti
+        diversos sensors (temperatura, humitat, bateria...). Una clau que
+        no es pot llegir es descarta sola: la resta del missatge es manté.
+        
+        Returns:
+            list de (clau, valor) per les claus amb valor vàlid
+        """
+        values = []
+        doc = None
+        doc_error = None
+        for key in keys:
+            extractor = self.extractors.get(key.split(':', 1)[0])
+            if extractor is None:
+                try:
+                    values.append((key, float(payload)))
+                except ValueError:
+                    self._invalid(key, payload)
+                continue
+            if doc is None and doc_error is None:
+                try:
+                    doc = json.loads(payload)
+                except ValueError as e:
+                    doc_error = e
+            if doc_error is not None:
+                self._invalid(key, payload)
+                continue
+            value = extractor(doc)
+            if value is not None:
+                values.append((key, value))
+        return values
+    
+    def _invalid(self, key, payload):
+        """Comptar i avisar (amb límit de freqüència) d'un valor no llegible"""
+        INVALID.inc()
+        log.warning("⚠️  Payload no vàlid per %s: %s", key, payload,
+                    extra={'rate_key': ('payload', key)})
+    
+    def _pipeline(self, key):
+        """Obtenir (o crear) el pipeline de filtres d'un sensor"""
+        pipeline = self.pipelines.get(key)
+        if pipeline is None:
+            # Claus de wildcards ('nom:topic') usen l'especificació del nom
+            name = key.split(':', 1)[0]
+            spec = self.filter_specs.get(name, self.filter_specs.get('default'))
+            pipeline = self.pipelines[key] = build_pipeline(spec)
+        return pipeline
+    
+    def get_filter_stats(self):
+        """
+        Comptadors de filtres per sensor
+        
+        Returns:
+            dict: sensor -> {received, rejected, filtered, forwarded}
+        """
+        with self.data_lock:
+            return {key: p.stats() for key, p in self.pipelines.items()}
+    
+    def set_topics(self, topics, qos=None):
+        """
+        Canviar els topics en calent (sense reconnectar)
+        
+        Només es desubscriuen els filtres que desapareixen i es subscriuen
+        els nous (el broker reenvia els seus valors retained). Els valors,
+        l'històric i els filtres dels sensors que es mantenen no es toquen.
+        
+        Args:
+            topics: dict nom -> topic o especificació (com al constructor)
+            qos: QoS nou (None = mantenir l'actual)
+        """
+        registry = SensorRegistry(topics)
+        extractors = {name: compile_extractor(spec)
+                      for name, spec in registry.specs.items()}
+        
+        old_filters = set(self.registry.topics.values())
+        new_filters = set(registry.topics.values())
+        if qos is not None and qos != self.qos:
+            self.qos = qos
+            old_filters = set()  # Tornar a subscriure-ho tot amb el QoS nou
+        
+        names = set(registry.names)
+        with self.data_lock:
+            self.topics = topics
+            self.registry = registry
+            self.extractors = extractors
+            # Descartar sensors eliminats (claus de wildcard 'nom:topic' incloses)
+            for key in list(self.data):
+                if key.split(':', 1)[0] not in names:
+                    del self.data[key]
+                    self.pipelines.pop(key, None)
+                    self.trailing.discard(key)
+                    self.ready_events.pop(key, None)
+            for name in registry.static_names:
+                self.data.setdefault(name, None)
+                self.ready_events.setdefault(name, Event())
+        
+        removed = sorted(old_filters - new_filters)
+        added = sorted(new_filters - old_filters)
+        if self.connected:
+            if removed:
+                self.client.unsubscribe(removed)
+            if added:
+                self.client.subscribe([(topic, self.qos) for topic in added])
+        print(f"📡 MQTT: Topics actualitzats (+{len(added)} -{len(removed)})")
+    
+    def set_filters(self, filters):
+        """
+        Canviar l'especificació de filtres (els pipelines es refan amb la
+        pròxima mostra de cada sensor)
+        """
+        with self.data_lock:
+            self.filter_specs = filters or {}
+            self.pipelines.clear()
+            self.trailing.clear()
+    
+    def reconnect(self, broker, port, username, password):
+        """
+        Connectar a un altre broker (o amb altres credencials)
+        
+        Es manté tot l'estat (valors, històric, callback); en connectar
+        es tornen a subscriure els topics i arriben els retained.
+        """
+        self.broker = broker
+        self.port = port
+        self.username = username
+        self.password = password
+        self.client.loop_stop()
+        self.client.disconnect()
+        self.connected = False
+        self.client.username_pw_set(username, password)
+        return self.connect()
+    
+    def get_snapshot(self):
+        """
+        Obtenir còpia de tots els valors actuals
+        
+        Returns:
+            dict: nom del sensor -> valor (None si encara no ha arribat)
+        """
+        with self.data_lock:
+            return dict(self.data)
     
     def _on_connect(self, client, userdata, flags, rc):
         """Callback quan es connecta al broker"""
@@ -96,10 +472,11 @@ class MQTTHandler:
             print("✅ MQTT: Connectat!")
             self.connected = True
             
-            # Subscriure's als topics
-            for key, topic in self.topics.items():
-                client.subscribe(topic)
-                print(f"📡 MQTT: Subscrit a {topic}")
+            # Subscriure's a tots els topics en un sol paquet SUBSCRIBE
+            subscriptions = self.registry.subscriptions(self.qos)
+            if subscriptions:
+                client.subscribe(subscriptions)
+                print(f"📡 MQTT: Subscrit a {len(subscriptions)} topics")
         else:
             print(f"❌ MQTT: Error connexió (codi {rc})")
             self.connected = False
@@ -107,37 +484,79 @@ class MQTTHandler:
     def _on_message(self, client, userdata, msg):
         """Callback quan arriba un missatge"""
         topic = msg.topic
+        keys = self.registry.resolve(topic)
+        if not keys:
+            return
+        
+        MESSAGES.inc()
+        received = time.monotonic()
+        trace_id = TRACER.new_trace(received) if TRACER.enabled else None
         payload = msg.payload.decode()
         
         try:
-            value = float(payload)
+            values = self._decode(keys, payload)
             changed = False
+            held = False
+            
+            now = time.time()
             
             with self.data_lock:
-                if topic == self.topics.get('balco'):
-                    old_value = self.data['temp_balco']
-                    self.data['temp_balco'] = value
-                    print(f"🌡️  MQTT: Balcó = {value}°C")
+                for key, value in values:
+                    pipeline = self._pipeline(key)
+                    value_f, forward = pipeline.process(value, now)
+                    if pipeline.pending is not None:
+                        self.trailing.add(key)
+                        held = True
+                    else:
+                        self.trailing.discard(key)
+                    if value_f is None:
+                        SAMPLES['rejected'].inc()
+                        continue  # Rebutjat (outlier)
                     
-                    if old_value is None or abs(value - old_value) >= 0.1:
-                        changed = True
-                
-                elif topic == self.topics.get('menjador'):
-                    old_value = self.data['temp_menjador']
-                    self.data['temp_menjador'] = value
-                    print(f"🏠 MQTT: Menjador = {value}°C")
+                    first = self.data.get(key) is None
+                    self.data[key] = value_f
+                    log.debug("🌡️  %s = %s°C", key, value_f)
                     
-                    if old_value is None or abs(value - old_value) >= 0.1:
+                    if self.history_size:
+                        self._history_for(key).append(value_f, now)
+                    
+                    if self.store is not None:
+                        self.store.append(key, value_f, now)
+                    
+                    if first:
+                        event = self.ready_events.get(key)
+                        if event is None:
+                            event = self.ready_events[key] = Event()
+                        event.set()
+                        if self.arrived is not None:
+                            self.arrived.set()
+                    
+                    if forward:
                         changed = True
+                        SAMPLES['forwarded'].inc()
+                    else:
+                        SAMPLES['filtered'].inc()
+            
+            # Notificar fora del lock
+            if trace_id is not None:
+                if changed:
+                    TRACER.record('mqtt.message', received, time.monotonic(), trace_id,
+                                  topic=topic)
+                else:
+                    TRACER.discard(trace_id)
+                    trace_id = None
             
-            # Cridar callback fora del lock
             if changed:
-                self._trigger_callback()
+                self._trigger_callback(trace_id)
+            if held:
+                self._schedule_trailing()
         
         except ValueError:
-            print(f"⚠️  MQTT: Valor no numèric: {payload}")
+            INVALID.inc()
+            log.warning("⚠️  Payload no vàlid a %s: %s", topic, payload,
+                        extra={'rate_key': ('payload', topic)})
         except Exception as e:
-            print(f"⚠️  MQTT: Error processant missatge: {e}")
+            log.warning("⚠️  Error processant missatge: %s", e)
     
     def _on_disconnect(self, client, userdata, rc):
         """Callback quan es desconnecta"""
@@ -145,20 +564,171 @@ class MQTTHandler:
         if rc != 0:
             print("⚠️  MQTT: Desconnexió inesperada. Reconnectant...")
     
-    def _trigger_callback(self):
-        """Cridar callback extern si està definit"""
+    def _trigger_callback(self, trace_id=None):
+        """
+        Notificar canvi al worker (thread de xarxa, no bloquejant)
+        
+        Si la cua és plena ja hi ha notificacions pendents: el worker
+        llegirà els valors més recents igualment, així que es descarta.
+        
+        Args:
+            trace_id: Traça del missatge (tracing), o None
+        """
+        if self.on_data_callback is None:
+            TRACER.discard(trace_id)
+            return
+        if self.loop is not None:
+            # Mode asyncio: ja som al thread del loop (sense traces)
+            TRACER.discard(trace_id)
+            if self.pending_callback is None:
+                self.pending_callback = self.loop.call_later(
+                    self.coalesce_s, self._run_pending_callback)
+            return
+        try:
+            self.dispatch_queue.put_nowait((time.monotonic(), trace_id))
+        except queue.Full:
+            self.dropped_notifications += 1
+            DROPPED.inc()
+            TRACER.discard(trace_id)
+    
+    def _trailing_delay(self):
+        """Segons fins al pròxim flanc final pendent (None si no n'hi ha)"""
+        with self.data_lock:
+            dues = [self.pipelines[key].pending_due for key in self.trailing
+                    if key in self.pipelines]
+        if not dues:
+            return None
+        return max(0.0, min(dues) - time.time())
+    
+    def _schedule_trailing(self):
+        """Fer que el worker (o el loop asyncio) notifiqui els flancs finals"""
+        if self.loop is not None:
+            delay = self._trailing_delay()
+            if delay is not None:
+                self.loop.call_later(delay, self._flush_trailing_async)
+            return
+        try:
+            self.dispatch_queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass  # El worker recalcula l'espera quan buidi la cua
+    
+    def _flush_trailing(self):
+        """
+        Notificar les mostres retingudes que ja han complert min_interval
+        
+        Returns:
+            bool: True si cal cridar el callback
+        """
+        now = time.time()
+        fired = False
+        with self.data_lock:
+            for key in list(self.trailing):
+                pipeline = self.pipelines.get(key)
+                if pipeline is None or pipeline.pending is None:
+                    self.trailing.discard(key)
+                elif pipeline.flush_due(now):
+                    self.trailing.discard(key)
+                    SAMPLES['trailing'].inc()
+                    fired = True
+        return fired
+    
+    def _flush_trailing_async(self):
+        if self._flush_trailing():
+            self._trigger_callback()
+    
+    def _start_dispatcher(self):
+        """Iniciar el thread worker que executa el callback extern"""
+        if self.dispatch_thread is not None and self.dispatch_thread.is_alive():
+            return
+        self.dispatch_thread = Thread(target=self._dispatch_loop,
+                                      name="mqtt_dispatch", daemon=True)
+        self.dispatch_thread.start()
+    
+    def _stop_dispatcher(self):
+        """Aturar el worker (sentinella None a la cua)"""
+        if self.dispatch_thread is None:
+            return
+        try:
+            self.dispatch_queue.put(None, timeout=1)
+        except queue.Full:
+            pass
+        self.dispatch_thread.join(timeout=5)
+        self.dispatch_thread = None
+    
+    def _dispatch_loop(self):
+        """Worker: agrupar notificacions dins la finestra i cridar el callback"""
+        while True:
+            try:
+                item = self.dispatch_queue.get(timeout=self._trailing_delay())
+            except queue.Empty:
+                # Ha vençut el min_interval d'una mostra retinguda
+                if self._flush_trailing():
+                    self._run_callback()
+                continue
+            if item is None:
+                return
+            if item is _WAKE:
+                continue
+            
+            # Finestra de coalescència: esperar més canvis i buidar la cua.
+            # Es traça el primer canvi de la finestra; la resta s'hi agrupen
+            queued_at, trace_id = item
+            if self.coalesce_s > 0:
+                time.sleep(self.coalesce_s)
+            try:
+                while True:
+                    extra = self.dispatch_queue.get_nowait()
+                    if extra is None:
+                        self._run_callback(queued_at, trace_id)
+                        return
+                    if extra is not _WAKE:
+                        TRACER.discard(extra[1])
+            except queue.Empty:
+                pass
+            
+            self._run_callback(queued_at, trace_id)
+    
+    def _run_pending_callback(self):
+        """Final de la finestra de coalescència en mode asyncio"""
+        self.pending_callback = None
         if self.on_data_callback:
             try:
-                temps = self.get_temperatures()
-                self.on_data_callback(temps[0], temps[1])
+                with CALLBACK_MS.time_ms():
+                    result = self.on_data_callback(self.get_snapshot())
+                if asyncio.iscoroutine(result):
+                    self.loop.create_task(result)
+            except Exception as e:
+                print(f"⚠️  MQTT: Error al callback: {e}")
+    
+    def _run_callback(self, queued_at=None, trace_id=None):
+        """
+        Cridar callback extern amb els valors actuals
+        
+        Args:
+            queued_at: time.monotonic() del primer canvi de la finestra
+            trace_id: Traça activa durant el callback (tracing.TRACER)
+        """
+        if self.on_data_callback:
+            if queued_at is not None:
+                now = time.monotonic()
+                NOTIFY_DELAY_MS.observe((now - queued_at) * 1000)
+                if trace_id is not None:
+                    TRACER.record('mqtt.coalesce', queued_at, now, trace_id)
+            try:
+                with CALLBACK_MS.time_ms(), TRACER.activate(trace_id):
+                    self.on_data_callback(self.get_snapshot())
             except Exception as e:
                 print(f"⚠️  MQTT: Error al callback: {e}")
 
 
 # Test del mòdul
 if __name__ == "__main__":
+    import sys
     import json
     import time
+    from log_setup import setup_logging
+    
+    setup_logging({'level': 'DEBUG'})
     
     # Carregar config
     config_path = '/root/projects/dietpink/software/eink/config/weather_config.json'
@@ -168,10 +738,11 @@ if __name__ == "__main__":
     mqtt_config = config['mqtt']
     
     # Callback de test
-    def on_data_change(balco, menjador):
-        print(f"\n🔔 Callback: Balcó={balco}°C, Menjador={menjador}°C\n")
+    def on_data_change(snapshot):
+        print(f"\n🔔 Callback: {snapshot}\n")
     
     # Crear handler
+    use_asyncio = '--asyncio' in sys.argv
     handler = MQTTHandler(
         broker=mqtt_config['broker'],
         port=mqtt_config['port'],
@@ -182,8 +753,24 @@ if __name__ == "__main__":
     
     handler.set_data_callback(on_data_change)
     
+    async def run_async():
+        if not await handler.connect_async():
+            return
+        ok = await handler.wait_for_initial_async()
+        print(f"\n⏳ Valors inicials: {ok} (Ctrl+C per aturar)...\n")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            handler.disconnect()
+    
+    if use_asyncio:
+        try:
+            asyncio.run(run_async())
+        except KeyboardInterrupt:
+            print("\n⏹️  Test aturat")
+    
     # Connectar
-    if handler.connect():
+    elif handler.connect():
         print("\n⏳ Esperant missatges (Ctrl+C per aturar)...\n")
         try:
             while True:
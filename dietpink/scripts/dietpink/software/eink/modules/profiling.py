@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+profiling.py - Diagnòstic en calent del servei (sense reiniciar-lo)
+- SIGUSR1: activa/desactiva cProfile al voltant de cada render; en
+  desactivar-lo es desa el .prof i un resum de text
+- SIGUSR2: snapshot de tracemalloc comparat amb l'anterior (creixement
+  de memòria per línia de codi) + RSS del procés
+Els fitxers van a logs/ amb data i hora al nom
+"""
+
+import os
+import io
+import time
+import signal
+import pstats
+import cProfile
+import tracemalloc
+from datetime import datetime
+from threading import Lock
+
+
+def read_rss_kb():
+    """RSS actual del procés en kB (None si no hi ha /proc)"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class ServiceProfiler:
+    """Perfilador de CPU (renders) i de memòria activable per senyals"""
+
+    def __init__(self, log_dir, defer=None, top=30, tracemalloc_frames=1,
+                 tracemalloc_at_start=False):
+        """
+        Args:
+            log_dir: Directori on es desen els resultats
+            defer: Funció per executar feina fora del handler del senyal
+                   (p.ex. lambda f: scheduler.call_later(0, f)); None = directe
+            top: Línies dels resums
+            tracemalloc_frames: Frames guardats per assignació (més = més cost)
+            tracemalloc_at_start: Engegar tracemalloc ja (el primer SIGUSR2
+                                  compara amb l'arrencada; té cost de CPU i RAM)
+        """
+        self.log_dir = log_dir
+        self.defer = defer or (lambda func: func())
+        self.top = top
+        self.tracemalloc_frames = tracemalloc_frames
+
+        self.profile = None          # cProfile.Profile mentre està actiu
+        self.profile_started = None
+        self.profiled_renders = 0
+        self.lock = Lock()           # Un render perfilat o un bolcat, no tots dos
+        self.last_snapshot = None
+        if tracemalloc_at_start and not tracemalloc.is_tracing():
+            tracemalloc.start(tracemalloc_frames)
+
+    def _path(self, prefix, ext):
+        os.makedirs(self.log_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.log_dir, f"{prefix}-{stamp}.{ext}")
+        n = 1
+        while os.path.exists(path):  # Dos senyals dins el mateix segon
+            n += 1
+            path = os.path.join(self.log_dir, f"{prefix}-{stamp}-{n}.{ext}")
+        return path
+
+    # ------------------------------------------------------------------
+    # CPU (cProfile al voltant del render)
+    # ------------------------------------------------------------------
+
+    @property
+    def profiling(self):
+        return self.profile is not None
+
+    def toggle_profile(self):
+        """Activar o aturar (i desar) el perfil de CPU"""
+        with self.lock:
+            if self.profile is None:
+                self.profile = cProfile.Profile()
+                self.profile_started = time.monotonic()
+                self.profiled_renders = 0
+                print("🔬 Perfil: cProfile activat als renders (SIGUSR1 per aturar)")
+                return None
+            profile, self.profile = self.profile, None
+        return self._dump_profile(profile)
+
+    def section(self):
+        """
+        Context manager per al renderer: perfila el bloc si està actiu
+
+        cProfile només observa el thread que crida enable(), per això
+        s'activa dins el thread renderer i no al handler del senyal.
+        """
+        return _ProfiledSection(self)
+
+    def _dump_profile(self, profile):
+        duration = time.monotonic() - self.profile_started
+        path = self._path('profile', 'prof')
+        profile.dump_stats(path)
+
+        summary = io.StringIO()
+        summary.write(f"# {self.profiled_renders} renders en {duration:.0f}s\n")
+        stats = pstats.Stats(profile, stream=summary)
+        stats.sort_stats('cumulative').print_stats(self.top)
+        stats.sort_stats('tottime').print_stats(self.top)
+        with open(path[:-len('.prof')] + '.txt', 'w') as f:
+            f.write(summary.getvalue())
+
+        print(f"🔬 Perfil desat ({self.profiled_renders} renders): {path}")
+        return path
+
+    # ------------------------------------------------------------------
+    # Memòria (tracemalloc)
+    # ------------------------------------------------------------------
+
+    def snapshot_memory(self):
+        """
+        Snapshot de tracemalloc i diferència amb l'anterior
+
+        El primer cop (si tracemalloc no estava actiu) només l'engega i
+        pren la referència: el creixement es veu a partir del segon.
+
+        Returns:
+            Ruta de l'informe desat
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            print("🧠 Memòria: tracemalloc activat, referència presa")
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+
+        path = self._path('tracemalloc', 'txt')
+        with open(path, 'w') as f:
+            f.write(f"# RSS: {read_rss_kb()} kB, traçat: {current / 1024:.0f} kB "
+                    f"(pic {peak / 1024:.0f} kB)\n")
+            if self.last_snapshot is None:
+                f.write(f"\n# Top {self.top} (sense snapshot anterior)\n")
+                for stat in snapshot.statistics('lineno')[:self.top]:
+                    f.write(f"{stat}\n")
+            else:
+                f.write(f"\n# Top {self.top} canvis des de l'snapshot anterior\n")
+                for stat in snapshot.compare_to(self.last_snapshot, 'lineno')[:self.top]:
+                    f.write(f"{stat}\n")
+        self.last_snapshot = snapshot
+
+        print(f"🧠 Memòria: snapshot desat a {path}")
+        return path
+
+    # ------------------------------------------------------------------
+    # Senyals
+    # ------------------------------------------------------------------
+
+    def install_signals(self):
+        """SIGUSR1 = perfil de CPU on/off, SIGUSR2 = snapshot de memòria"""
+        signal.signal(signal.SIGUSR1, lambda sig, frame: self.defer(self._safe(self.toggle_profile)))
+        signal.signal(signal.SIGUSR2, lambda sig, frame: self.defer(self._safe(self.snapshot_memory)))
+
+    @staticmethod
+    def _safe(func):
+        def run():
+            try:
+                func()
+            except Exception as e:
+                print(f"❌ Perfil: Error: {e}")
+        return run
+
+
+class _ProfiledSection:
+    __slots__ = ('profiler', 'profile')
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.profile = None
+
+    def __enter__(self):
+        if self.profiler.profile is None:
+            return self
+        self.profiler.lock.acquire()
+        self.profile = self.profiler.profile
+        if self.profile is None:
+            self.profiler.lock.release()
+        else:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profile is not None:
+            self.profile.disable()
+            self.profiler.profiled_renders += 1
+            self.profiler.lock.release()
+        return False
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    import tempfile
+
+    log_dir = tempfile.mkdtemp(prefix="dietpink_logs_")
+    profiler = ServiceProfiler(log_dir)
+    profiler.install_signals()
+
+    leak = []
+
+    def fake_render():
+        with profiler.section():
+            sum(i * i for i in range(50000))
+            leak.append(bytearray(100000))
+
+    print("🧪 Test ServiceProfiler")
+    os.kill(os.getpid(), signal.SIGUSR2)      # Referència de memòria
+    os.kill(os.getpid(), signal.SIGUSR1)      # Perfil on
+    for _ in range(20):
+        fake_render()
+    os.kill(os.getpid(), signal.SIGUSR1)      # Perfil off -> desat
+    os.kill(os.getpid(), signal.SIGUSR2)      # Diferència: ~2 MB a fake_render
+    print(f"   Fitxers: {sorted(os.listdir(log_dir))}")
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+scheduler.py - Planificador de tasques basat en un heap de temporitzadors
+Dorm fins al pròxim deadline exacte en lloc de despertar-se periòdicament.
+Tasques puntuals i periòdiques (sense deriva, opcionalment alineades al
+rellotge: cada minut en punt, cada hora en punt...)
+"""
+
+import sys
+import heapq
+import itertools
+import time
+from datetime import datetime
+from threading import Thread, Condition, current_thread
+
+sys.path.append('/root/projects/dietpink/software/eink')
+from metrics import counter, histogram
+
+LATENESS_MS = histogram('dietpink_scheduler_lateness_ms', 'Job start delay past its deadline')
+ERRORS = counter('dietpink_scheduler_errors_total', 'Jobs that raised an exception')
+
+
+def _utc_offset(t):
+    """Desplaçament local respecte UTC (s) a l'epoch t (inclou horari d'estiu)"""
+    return datetime.fromtimestamp(t).astimezone().utcoffset().total_seconds()
+
+
+def next_aligned(interval, offset=0.0, now=None):
+    """
+    Pròxim epoch múltiple d'interval en hora local (+ offset)
+
+    Exemples: interval=60 -> pròxim minut en punt; interval=3600,
+    offset=30 -> 30 s després de la pròxima hora en punt.
+    """
+    if now is None:
+        now = time.time()
+    tz = _utc_offset(now)
+    local = now + tz - offset
+    return (local // interval + 1) * interval - tz + offset
+
+
+class TimerJob:
+    """Tasca planificada (retornada per TimerScheduler.call_later/call_at)"""
+
+    def __init__(self, deadline, callback, name, interval=None, align=False, offset=0.0):
+        self.deadline = deadline  # time.monotonic()
+        self.callback = callback
+        self.name = name
+        self.cancelled = False
+        
+        # Tasques periòdiques
+        self.interval = interval
+        self.align = align
+        self.offset = offset
+        self.runs = 0
+        self.skipped = 0  # Ticks perduts perquè la tasca anava endarrerida
+
+    def cancel(self):
+        """Cancel·lar la tasca (s'ignora quan arribi el seu torn)"""
+        self.cancelled = True
+
+
+class TimerScheduler:
+    """
+    Heap de temporitzadors amb rellotge monòton
+
+    Les tasques s'executen al thread del planificador, una rere l'altra.
+    Entre tasques el thread queda bloquejat a Condition.wait() fins al
+    pròxim deadline, sense cap despertar intermedi.
+    """
+
+    def __init__(self, name="scheduler"):
+        """
+        Inicialitzar planificador
+
+        Args:
+            name: Nom del thread
+        """
+        self.name = name
+        self._heap = []
+        self._counter = itertools.count()  # Desempat estable al heap
+        self._cond = Condition()
+        self._running = False
+        self._thread = None
+
+    def call_later(self, delay, callback, name=None):
+        """
+        Planificar callback() d'aquí a delay segons
+
+        Returns:
+            TimerJob: per poder-la cancel·lar
+        """
+        return self._push(time.monotonic() + max(0.0, delay), callback, name)
+
+    def call_at(self, wall_time, callback, name=None):
+        """
+        Planificar callback() a una hora de rellotge (epoch)
+
+        Es converteix a deadline monòton en el moment de planificar.
+        """
+        return self.call_later(wall_time - time.time(), callback, name)
+
+    def call_every(self, interval, callback, name=None, align=False, offset=0.0,
+                   first_delay=None):
+        """
+        Planificar callback() cada interval segons
+        
+        Els deadlines es calculen a partir de l'anterior (no de quan acaba
+        la tasca), així que el temps d'execució no acumula deriva. Si una
+        execució s'allarga més d'un interval, els ticks perduts se salten.
+        
+        Args:
+            interval: Període en segons
+            align: Alinear al rellotge local (p.ex. 60 = cada minut en punt)
+            offset: Desplaçament respecte l'alineació (s)
+            first_delay: Primera execució (None = al primer tick; sense
+                         alinear, d'aquí a un interval)
+        
+        Returns:
+            TimerJob: cancel() atura les repeticions
+        """
+        if first_delay is not None:
+            deadline = time.monotonic() + max(0.0, first_delay)
+        elif align:
+            deadline = self._aligned_deadline(interval, offset)
+        else:
+            deadline = time.monotonic() + interval
+        job = TimerJob(deadline, callback, name or getattr(callback, '__name__', 'job'),
+                       interval=interval, align=align, offset=offset)
+        return self._push_job(job)
+    
+    @staticmethod
+    def _aligned_deadline(interval, offset):
+        """Deadline monòton del pròxim límit de rellotge"""
+        now = time.time()
+        return time.monotonic() + (next_aligned(interval, offset, now) - now)
+    
+    def _reschedule(self, job):
+        """Calcular el pròxim deadline d'una tasca periòdica"""
+        now = time.monotonic()
+        if job.align:
+            # Recalcular des del rellotge: segueix canvis d'hora i ajustos NTP
+            deadline = self._aligned_deadline(job.interval, job.offset)
+        else:
+            deadline = job.deadline + job.interval
+            if deadline <= now:
+                missed = int((now - job.deadline) // job.interval)
+                job.skipped += missed
+                deadline = job.deadline + (missed + 1) * job.interval
+        job.deadline = deadline
+        self._push_job(job)
+    
+    def _push(self, deadline, callback, name):
+        return self._push_job(TimerJob(deadline, callback,
+                                       name or getattr(callback, '__name__', 'job')))
+    
+    def _push_job(self, job):
+        with self._cond:
+            heapq.heappush(self._heap, (job.deadline, next(self._counter), job))
+            # Despertar el thread si aquesta tasca és la més propera
+            if self._heap[0][2] is job:
+                self._cond.notify()
+        return job
+
+    def next_deadline(self):
+        """Segons fins a la pròxima tasca (None si no n'hi ha)"""
+        with self._cond:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def start(self):
+        """Iniciar el thread del planificador"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        """
+        Executar el planificador al thread actual fins a stop()
+        
+        Per scripts d'un sol thread (exemples): el thread principal dorm
+        fins al pròxim deadline en lloc d'un bucle amb time.sleep().
+        """
+        with self._cond:
+            self._running = True
+        self._run()
+    
+    def stop(self):
+        """Aturar el planificador (les tasques pendents es descarten)"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None and self._thread is not current_thread():
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        """Loop principal: dormir fins al pròxim deadline i executar"""
+        while True:
+            with self._cond:
+                while self._running:
+                    if self._heap:
+                        timeout = self._heap[0][0] - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+
+                if not self._running:
+                    return
+
+                deadline, _, job = heapq.heappop(self._heap)
+
+            if job.cancelled:
+                continue
+
+            start = time.monotonic()
+            LATENESS_MS.observe((start - deadline) * 1000)
+            try:
+                job.callback()
+            except Exception as e:
+                ERRORS.inc()
+                print(f"❌ Scheduler: Error a la tasca '{job.name}': {e}")
+            histogram('dietpink_scheduler_job_ms', 'Job run time',
+                      {'job': job.name}).observe((time.monotonic() - start) * 1000)
+            job.runs += 1
+            
+            if job.interval is not None and not job.cancelled:
+                self._reschedule(job)
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    scheduler = TimerScheduler()
+    start = time.monotonic()
+
+    def report(label):
+        return lambda: print(f"   ⏰ {label} a +{time.monotonic() - start:.2f}s")
+
+    ticks = []
+    scheduler.call_every(0.25, lambda: ticks.append(time.monotonic() - start), name="tick")
+    scheduler.call_later(0.6, report("C"))
+    scheduler.call_later(0.2, report("A"))
+    job = scheduler.call_later(0.4, report("cancel·lada"))
+    scheduler.call_later(0.4, report("B"))
+    job.cancel()
+
+    print("🧪 Test scheduler (esperat: A, B, C)")
+    scheduler.start()
+    time.sleep(1.1)
+    scheduler.stop()
+    print(f"   Periòdica: {', '.join(f'+{t:.3f}s' for t in ticks)}")
+    
+    aligned = next_aligned(60)
+    print(f"   Pròxim minut en punt: {datetime.fromtimestamp(aligned).strftime('%H:%M:%S')}")
+    print("✅ Test completat")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+sensor_extractors.py - Extracció de valors de payloads JSON
+Especificacions per sensor (path, escala, unitat) compilades un sol cop
+a funcions d'accés, per llegir missatges de Zigbee2MQTT, Tasmota, HA...
+"""
+
+import re
+from operator import itemgetter
+
+
+# Conversions de la unitat d'origen a °C
+UNIT_CONVERSIONS = {
+    'F': lambda v: (v - 32) * 5 / 9,
+    '°F': lambda v: (v - 32) * 5 / 9,
+    'K': lambda v: v - 273.15,
+}
+
+_PATH_TOKEN = re.compile(r'([^.\[\]]+)|\[(\d+)\]')
+
+
+def parse_path(path):
+    """
+    Convertir un path JSON a una tupla de claus
+
+    Exemples:
+        'temperature'            -> ('temperature',)
+        'AM2301.Temperature'     -> ('AM2301', 'Temperature')
+        'sensors[0].value'       -> ('sensors', 0, 'value')
+
+    Returns:
+        tuple de claus (str) i índexs (int)
+    """
+    keys = []
+    for name, index in _PATH_TOKEN.findall(path):
+        keys.append(int(index) if index else name)
+    if not keys:
+        raise ValueError(f"Path JSON buit: {path!r}")
+    return tuple(keys)
+
+
+def _getter(keys):
+    """Funció d'accés per una seqüència de claus (sense bucle si és un nivell)"""
+    if len(keys) == 1:
+        return itemgetter(keys[0])
+
+    def get(doc):
+        for key in keys:
+            doc = doc[key]
+        return doc
+    return get
+
+
+def compile_extractor(spec):
+    """
+    Compilar l'especificació d'un sensor a una funció extract(doc)
+
+    Args:
+        spec: dict amb 'path' (obligatori) i opcionals 'scale', 'offset'
+              i 'unit' (unitat d'origen; F i K es converteixen a °C)
+
+    Returns:
+        funció doc -> float o None (camp absent o no numèric)
+    """
+    get = _getter(parse_path(spec['path']))
+    scale = float(spec.get('scale', 1.0))
+    offset = float(spec.get('offset', 0.0))
+
+    # Unitats sense conversió (%, hPa...) es deixen tal qual
+    convert = UNIT_CONVERSIONS.get(spec.get('unit'))
+
+    linear = scale != 1.0 or offset != 0.0
+
+    def extract(doc):
+        try:
+            value = float(get(doc))
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
+        if linear:
+            value = value * scale + offset
+        if convert is not None:
+            value = convert(value)
+        return value
+
+    return extract
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    import json
+    import time
+
+    z2m = json.dumps({"temperature": 21.4, "humidity": 48, "battery": 97, "linkquality": 120})
+    tasmota = json.dumps({"Time": "2024-01-01T00:00:00", "AM2301": {"Temperature": 70.5, "Humidity": 40}})
+
+    specs = {
+        'temperatura': {'path': 'temperature'},
+        'humitat': {'path': 'humidity'},
+        'bateria': {'path': 'battery', 'scale': 0.01},
+        'tasmota_f': {'path': 'AM2301.Temperature', 'unit': 'F'},
+        'absent': {'path': 'pressure'},
+    }
+    extractors = {name: compile_extractor(spec) for name, spec in specs.items()}
+
+    print("🧪 Test extractors")
+    doc = json.loads(z2m)
+    for name in ('temperatura', 'humitat', 'bateria', 'absent'):
+        print(f"   {name}: {extractors[name](doc)}")
+    print(f"   tasmota_f: {extractors['tasmota_f'](json.loads(tasmota)):.2f}")
+
+    start = time.perf_counter()
+    for _ in range(100000):
+        extractors['temperatura'](doc)
+    elapsed = (time.perf_counter() - start) * 10
+    print(f"   {elapsed:.2f} µs per extracció")
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+sensor_filters.py - Filtres per sensor per a MQTTHandler
+Pipeline configurable: rebuig d'outliers, mediana, EMA (transformen el valor)
+i deadband, interval mínim (decideixen si es notifica el callback)
+"""
+
+from collections import deque
+
+
+class OutlierReject:
+    """Rebutjar valors fora de límits o massa lluny de la mediana recent"""
+
+    def __init__(self, max_delta=None, min=None, max=None, window=5, max_rejects=3):
+        """
+        Args:
+            max_delta: Salt màxim respecte la mediana de les últimes mostres
+            min, max: Límits absoluts
+            window: Mostres per calcular la mediana de referència
+            max_rejects: Rebutjos seguits després dels quals s'accepta el
+                         valor (un canvi real i sostingut no queda bloquejat)
+        """
+        self.max_delta = max_delta
+        self.min = min
+        self.max = max
+        self.max_rejects = max_rejects
+        self.recent = deque(maxlen=window)
+        self.rejects = 0
+
+    def process(self, value, t):
+        if (self.min is not None and value < self.min) or \
+                (self.max is not None and value > self.max):
+            return None
+
+        if self.max_delta is not None and self.recent:
+            reference = sorted(self.recent)[len(self.recent) // 2]
+            if abs(value - reference) > self.max_delta and self.rejects < self.max_rejects:
+                self.rejects += 1
+                return None
+            if abs(value - reference) > self.max_delta:
+                # Canvi sostingut: acceptar i oblidar la referència antiga
+                self.recent.clear()
+
+        self.rejects = 0
+        self.recent.append(value)
+        return value
+
+
+class MedianFilter:
+    """Mediana mòbil de les últimes n mostres"""
+
+    def __init__(self, n=5):
+        self.values = deque(maxlen=n)
+
+    def process(self, value, t):
+        self.values.append(value)
+        ordered = sorted(self.values)
+        return ordered[len(ordered) // 2]
+
+
+class EMAFilter:
+    """Mitjana mòbil exponencial (alpha alt = més reactiu)"""
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.value = None
+
+    def process(self, value, t):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class Deadband:
+    """Notificar només si el valor s'allunya prou de l'últim notificat"""
+
+    def __init__(self, threshold=0.1):
+        self.threshold = threshold
+        self.last = None
+
+    def check(self, value, t):
+        return self.last is None or abs(value - self.last) >= self.threshold
+
+    def commit(self, value, t):
+        self.last = value
+
+    def retry_at(self, t):
+        # Un canvi massa petit no cal notificar-lo més tard
+        return None
+
+
+class MinInterval:
+    """Notificar com a màxim un cop cada 'seconds' segons"""
+
+    def __init__(self, seconds=30):
+        self.seconds = seconds
+        self.last_t = None
+
+    def check(self, value, t):
+        return self.last_t is None or t - self.last_t >= self.seconds
+
+    def commit(self, value, t):
+        self.last_t = t
+
+    def retry_at(self, t):
+        return self.last_t + self.seconds
+
+
+class FilterPipeline:
+    """
+    Pipeline d'un sensor
+
+    process() s'executa al thread de xarxa de paho, així que tots els
+    filtres són objectes amb estat petit i cost O(window).
+    """
+
+    def __init__(self, transforms=(), gates=()):
+        """
+        Args:
+            transforms: Filtres que retornen el valor (o None per descartar)
+            gates: Filtres que decideixen si cal notificar (check/commit)
+        """
+        self.transforms = list(transforms)
+        self.gates = list(gates)
+
+        # Mostra retinguda per un gate amb retry_at: (valor, quan notificar-la)
+        self.pending = None
+
+        # Comptadors
+        self.received = 0
+        self.rejected = 0    # Descartats pels transforms (no es guarden)
+        self.filtered = 0    # Guardats però sense notificar
+        self.forwarded = 0   # Guardats i notificats
+
+    def process(self, value, t):
+        """
+        Passar una mostra pel pipeline
+
+        Returns:
+            (valor a guardar o None, bool notificar)
+        """
+        self.received += 1
+
+        for f in self.transforms:
+            value = f.process(value, t)
+            if value is None:
+                self.rejected += 1
+                return None, False
+
+        # L'estat dels gates només avança si la mostra es notifica
+        for gate in self.gates:
+            if not gate.check(value, t):
+                self.filtered += 1
+                # Flanc final: si el gate ho demana, notificar-la quan toqui
+                due = gate.retry_at(t)
+                self.pending = (value, due) if due is not None else None
+                return value, False
+        for gate in self.gates:
+            gate.commit(value, t)
+
+        self.pending = None
+        self.forwarded += 1
+        return value, True
+
+    @property
+    def pending_due(self):
+        """Quan s'ha de notificar la mostra retinguda (None si no n'hi ha)"""
+        return self.pending[1] if self.pending is not None else None
+
+    def flush_due(self, t):
+        """
+        Notificar la mostra retinguda si ja ha vençut el seu interval
+
+        Sense això, un canvi que arriba dins de min_interval i després
+        silenci no arribaria mai al callback.
+
+        Returns:
+            bool: True si s'ha de notificar ara
+        """
+        if self.pending is None or t < self.pending[1]:
+            return False
+        value = self.pending[0]
+        self.pending = None
+        for gate in self.gates:
+            gate.commit(value, t)
+        self.forwarded += 1
+        return True
+
+    def stats(self):
+        """Comptadors del pipeline"""
+        return {
+            'received': self.received,
+            'rejected': self.rejected,
+            'filtered': self.filtered,
+            'forwarded': self.forwarded
+        }
+
+
+# Comportament per defecte (el mateix que abans: canvis >= 0.1)
+DEFAULT_SPEC = {'deadband': 0.1}
+
+
+def build_pipeline(spec=None):
+    """
+    Crear un FilterPipeline a partir de la configuració d'un sensor
+
+    Exemple:
+        {"outlier": {"max_delta": 5}, "median": 5, "ema": 0.3,
+         "deadband": 0.2, "min_interval": 30}
+
+    L'ordre és fix: outlier -> median -> ema -> deadband -> min_interval.
+    """
+    if spec is None:
+        spec = DEFAULT_SPEC
+
+    transforms = []
+    if 'outlier' in spec:
+        transforms.append(OutlierReject(**spec['outlier']))
+    if 'median' in spec:
+        transforms.append(MedianFilter(spec['median']))
+    if 'ema' in spec:
+        transforms.append(EMAFilter(spec['ema']))
+
+    gates = []
+    if 'deadband' in spec:
+        gates.append(Deadband(spec['deadband']))
+    if 'min_interval' in spec:
+        gates.append(MinInterval(spec['min_interval']))
+
+    return FilterPipeline(transforms, gates)
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    import random
+
+    pipeline = build_pipeline({
+        'outlier': {'max_delta': 3},
+        'median': 3,
+        'ema': 0.5,
+        'deadband': 0.2,
+        'min_interval': 10
+    })
+
+    t = 0.0
+    for i in range(200):
+        t += 1
+        value = 20 + random.gauss(0, 0.1)
+        if i % 50 == 25:
+            value = 85.0  # Lectura errònia
+        pipeline.process(value, t)
+
+    print("🧪 Test FilterPipeline")
+    print(f"   {pipeline.stats()}")
+
+    # Flanc final de min_interval: A es notifica, B (dins l'interval) després
+    trailing = build_pipeline({'min_interval': 30})
+    assert trailing.process(20.0, 0) == (20.0, True)
+    assert trailing.process(21.0, 5) == (21.0, False)
+    assert not trailing.flush_due(29)
+    assert trailing.flush_due(30) and trailing.pending is None
+    print(f"   Flanc final: {trailing.stats()}")
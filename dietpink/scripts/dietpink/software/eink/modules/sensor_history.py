@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+sensor_history.py - Històric de memòria fixa per sensor
+Ring buffer sobre arrays (timestamp, valor) amb append O(1) i estadístiques
+de finestres lliscants (min/max amb deques monòtones, mitjana amb suma)
+"""
+
+import time
+from array import array
+from collections import deque
+from datetime import datetime
+
+
+class _Window:
+    """Estat d'una finestra lliscant de 'seconds' segons"""
+
+    __slots__ = ('seconds', 'tail', 'total', 'maxq', 'minq')
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.tail = 0         # Seqüència de la mostra més antiga dins la finestra
+        self.total = 0.0      # Suma dels valors dins la finestra
+        self.maxq = deque()   # Seqüències amb valors decreixents
+        self.minq = deque()   # Seqüències amb valors creixents
+
+
+class SensorHistory:
+    """
+    Ring buffer de mostres (t, valor) amb estadístiques incrementals
+
+    Les mostres viuen en dos array('d') preassignats: la memòria és fixa
+    (16 bytes per mostra) i no hi ha cap objecte Python per mostra. Cada
+    mostra té un número de seqüència; la posició és seq % capacity.
+    """
+
+    def __init__(self, capacity=1440, windows=(3600, 86400)):
+        """
+        Args:
+            capacity: Nombre màxim de mostres guardades
+            windows: Durades (s) de les finestres amb estadístiques
+        """
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.seq = 0  # Seqüència de la pròxima mostra
+
+        self.windows = {seconds: _Window(seconds) for seconds in windows}
+
+        # Extrems del dia actual
+        self.day = None
+        self.day_min = None
+        self.day_max = None
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
+
+    def append(self, value, t=None):
+        """
+        Afegir una mostra (O(1) amortitzat)
+
+        Args:
+            value: Valor numèric
+            t: Epoch de la mostra (None = ara)
+        """
+        if t is None:
+            t = time.time()
+
+        seq = self.seq
+        pos = seq % self.capacity
+
+        # La mostra seq - capacity es sobreescriu: treure-la abans de les finestres
+        for window in self.windows.values():
+            self._evict(window, seq - self.capacity + 1, None)
+
+        self.times[pos] = t
+        self.values[pos] = value
+        self.seq = seq + 1
+
+        for window in self.windows.values():
+            self._push(window, seq, value)
+            self._evict(window, 0, t - window.seconds)
+
+        self._update_day(value, t)
+
+    def _push(self, window, seq, value):
+        """Afegir la mostra nova a la finestra (deques monòtones + suma)"""
+        window.total += value
+
+        values, cap = self.values, self.capacity
+        while window.maxq and values[window.maxq[-1] % cap] <= value:
+            window.maxq.pop()
+        window.maxq.append(seq)
+        while window.minq and values[window.minq[-1] % cap] >= value:
+            window.minq.pop()
+        window.minq.append(seq)
+
+    def _evict(self, window, min_seq, horizon):
+        """
+        Expulsar de la finestra les mostres amb seq < min_seq o t < horizon
+
+        Args:
+            min_seq: Primera seqüència que es pot quedar
+            horizon: Epoch mínim (None = no filtrar per temps)
+        """
+        cap = self.capacity
+        while window.tail < self.seq and (
+                window.tail < min_seq or
+                (horizon is not None and self.times[window.tail % cap] < horizon)):
+            window.total -= self.values[window.tail % cap]
+            window.tail += 1
+            if window.maxq and window.maxq[0] < window.tail:
+                window.maxq.popleft()
+            if window.minq and window.minq[0] < window.tail:
+                window.minq.popleft()
+
+    def _update_day(self, value, t):
+        """Mantenir min/max des de mitjanit"""
+        day = datetime.fromtimestamp(t).date()
+        if day != self.day:
+            self.day = day
+            self.day_min = self.day_max = value
+        else:
+            self.day_min = min(self.day_min, value)
+            self.day_max = max(self.day_max, value)
+
+    def latest(self):
+        """Última mostra (t, valor) o None"""
+        if not self.seq:
+            return None
+        pos = (self.seq - 1) % self.capacity
+        return (self.times[pos], self.values[pos])
+
+    def stats(self, seconds):
+        """
+        Estadístiques d'una finestra configurada (O(1))
+
+        Returns:
+            dict amb min, max, mean, count i rate_per_hour (None si buida)
+        """
+        window = self.windows[seconds]
+        count = self.seq - window.tail
+        if count <= 0:
+            return None
+
+        cap = self.capacity
+        first = window.tail % cap
+        last = (self.seq - 1) % cap
+        dt = self.times[last] - self.times[first]
+        rate = (self.values[last] - self.values[first]) * 3600 / dt if dt > 0 else 0.0
+
+        return {
+            'min': self.values[window.minq[0] % cap],
+            'max': self.values[window.maxq[0] % cap],
+            'mean': window.total / count,
+            'count': count,
+            'rate_per_hour': rate
+        }
+
+    def today(self):
+        """Mínim i màxim des de mitjanit (dict o None)"""
+        if self.day is None or self.day != datetime.now().date():
+            return None
+        return {'min': self.day_min, 'max': self.day_max}
+
+    def series(self, since=None):
+        """
+        Mostres en ordre cronològic (per gràfics)
+
+        Args:
+            since: Epoch mínim (None = totes)
+
+        Returns:
+            (times, values) com a array('d')
+        """
+        start = max(0, self.seq - self.capacity)
+        times = array('d')
+        values = array('d')
+        for s in range(start, self.seq):
+            pos = s % self.capacity
+            if since is None or self.times[pos] >= since:
+                times.append(self.times[pos])
+                values.append(self.values[pos])
+        return times, values
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    import random
+
+    history = SensorHistory(capacity=500, windows=(600, 3600))
+    t0 = time.time() - 7200
+    for i in range(1000):
+        history.append(20 + random.uniform(-2, 2) + i / 200, t0 + i * 7.2)
+
+    print("🧪 Test SensorHistory")
+    print(f"   Mostres: {len(history)} (capacitat {history.capacity})")
+    for seconds in history.windows:
+        s = history.stats(seconds)
+        print(f"   {seconds}s: min={s['min']:.2f} max={s['max']:.2f} "
+              f"mean={s['mean']:.2f} n={s['count']} rate={s['rate_per_hour']:.2f}/h")
+    print(f"   Avui: {history.today()}")
+
+    # Comprovació contra càlcul directe
+    times, values = history.series(since=history.latest()[0] - 600)
+    assert abs(max(values) - history.stats(600)['max']) < 1e-9
+    assert abs(sum(values) / len(values) - history.stats(600)['mean']) < 1e-6
+    print("✅ Estadístiques coincideixen")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+sensor_registry.py - Registre declaratiu de sensors MQTT
+Construït a partir de la secció 'topics' de la configuració:
+dispatch O(1) per topics exactes i trie precompilat per wildcards (+, #)
+"""
+
+
+class TopicTrie:
+    """Trie de filtres MQTT amb suport de wildcards '+' (un nivell) i '#' (resta)"""
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def insert(self, topic_filter, value):
+        """Afegir un filtre (p.ex. 'casa/+/temperatura' o 'zigbee2mqtt/#')"""
+        node = self.root
+        for level in topic_filter.split('/'):
+            node = node.setdefault(level, {})
+        node.setdefault(None, []).append(value)  # Clau None = valors finals
+        self.size += 1
+
+    def match(self, topic):
+        """Retornar tots els valors dels filtres que coincideixen amb el topic"""
+        levels = topic.split('/')
+        results = []
+        # Topics de sistema ($SYS/...) no coincideixen amb wildcards inicials
+        wildcard_ok = not topic.startswith('$')
+        self._match(self.root, levels, 0, results, wildcard_ok)
+        return results
+
+    def _match(self, node, levels, i, results, wildcard_ok):
+        # '#' coincideix amb la resta de nivells (inclòs el nivell pare)
+        if wildcard_ok and '#' in node:
+            results.extend(node['#'].get(None, ()))
+
+        if i == len(levels):
+            results.extend(node.get(None, ()))
+            return
+
+        child = node.get(levels[i])
+        if child is not None:
+            self._match(child, levels, i + 1, results, True)
+        if wildcard_ok and '+' in node:
+            self._match(node['+'], levels, i + 1, results, True)
+
+
+class SensorRegistry:
+    """
+    Registre de sensors: nom -> topic (o filtre amb wildcards)
+
+    Els topics exactes es resolen amb un dict (O(1)). Els filtres amb
+    wildcards es resolen amb el trie i el resultat es memoritza per topic,
+    de manera que cada topic només recorre el trie el primer cop.
+    Per filtres amb wildcards la clau del valor és 'nom:topic'.
+
+    Cada entrada pot ser un topic o un dict {'topic': ..., 'path': ...}
+    amb l'especificació d'extracció JSON (veure sensor_extractors).
+    """
+
+    MATCH_CACHE_SIZE = 256
+
+    def __init__(self, topics):
+        """
+        Args:
+            topics: dict nom -> topic o especificació (config['mqtt']['topics'])
+        """
+        self.topics = {}
+        self.specs = {}  # nom -> especificació d'extracció (sensors JSON)
+        self.exact = {}
+        self.trie = TopicTrie()
+        self._match_cache = {}
+
+        for name, entry in topics.items():
+            if isinstance(entry, dict):
+                topic = entry['topic']
+                spec = {k: v for k, v in entry.items() if k != 'topic'}
+                if spec:
+                    self.specs[name] = spec
+            else:
+                topic = entry
+            self.topics[name] = topic
+
+            if '+' in topic or '#' in topic:
+                self.trie.insert(topic, name)
+            else:
+                self.exact.setdefault(topic, []).append(name)
+
+    @property
+    def names(self):
+        """Noms dels sensors declarats"""
+        return list(self.topics)
+
+    @property
+    def static_names(self):
+        """Noms dels sensors amb topic exacte (valor sota el mateix nom)"""
+        return [name for names in self.exact.values() for name in names]
+
+    def subscriptions(self, qos=0):
+        """Llista [(filtre, qos)] per un sol SUBSCRIBE (sense duplicats)"""
+        return [(topic, qos) for topic in dict.fromkeys(self.topics.values())]
+
+    def resolve(self, topic):
+        """
+        Claus de dades afectades per un missatge a 'topic'
+
+        Returns:
+            tuple de claus (buida si el topic no és de cap sensor)
+        """
+        keys = self._match_cache.get(topic)
+        if keys is not None:
+            return keys
+
+        keys = list(self.exact.get(topic, ()))
+        if self.trie.size:
+            keys.extend(f"{name}:{topic}" for name in self.trie.match(topic))
+        keys = tuple(keys)
+
+        if len(self._match_cache) >= self.MATCH_CACHE_SIZE:
+            self._match_cache.clear()
+        self._match_cache[topic] = keys
+        return keys
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    registry = SensorRegistry({
+        'balco': 'dietpink/temperatura/balco',
+        'menjador': 'dietpink/temperatura/menjador',
+        'habitacions': 'casa/+/temperatura',
+        'zigbee': 'zigbee2mqtt/#',
+        'sala': {'topic': 'zigbee2mqtt/sala', 'path': 'temperature'},
+        'sala_humitat': {'topic': 'zigbee2mqtt/sala', 'path': 'humidity'},
+    })
+
+    print("🧪 Test SensorRegistry")
+    print(f"   Subscripcions: {registry.subscriptions()}")
+    for topic in ['dietpink/temperatura/balco', 'casa/cuina/temperatura',
+                  'zigbee2mqtt/sala', 'casa/cuina/humitat', '$SYS/broker']:
+        print(f"   {topic} -> {registry.resolve(topic)}")
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+sensor_store.py - Històric de sensors a disc (append-only)
+Registres binaris de mida fixa en fitxers diaris per sensor, escriptures
+agrupades per estalviar la SD, lectures amb mmap i compactació a agregats
+"""
+
+import os
+import re
+import mmap
+import time
+import struct
+from array import array
+from datetime import datetime, date, timedelta
+from threading import Lock, Thread, Event
+
+
+# Registre cru: (epoch, valor)
+RECORD = struct.Struct('<dd')
+# Registre agregat: (epoch inici bucket, min, max, mitjana)
+AGG_RECORD = struct.Struct('<dfff')
+
+RAW_EXT = '.bin'
+AGG_EXT = '.agg'
+
+
+def _safe_name(key):
+    """Nom de directori segur per una clau de sensor (p.ex. 'nom:topic/x')"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', key)
+
+
+def _day_of(t):
+    return datetime.fromtimestamp(t).date()
+
+
+class SensorStore:
+    """
+    Magatzem de sèries temporals local
+
+    Estructura:
+        base_dir/<sensor>/YYYYMMDD.bin   registres crus (16 bytes)
+        base_dir/<sensor>/YYYYMMDD.agg   agregats per bucket (20 bytes)
+    """
+
+    # Registres per sensor retinguts en memòria mentre el disc falla
+    MAX_RETRY_RECORDS = 65536
+
+    def __init__(self, base_dir, flush_interval=60, flush_records=256):
+        """
+        Args:
+            base_dir: Directori arrel de l'històric
+            flush_interval: Segons màxims entre escriptures a disc
+            flush_records: Registres pendents que forcen una escriptura
+        """
+        self.base_dir = base_dir
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+
+        # Registres pendents per sensor (bytes ja empaquetats)
+        self.pending = {}
+        self.pending_count = 0
+        self.lock = Lock()
+
+        self.flush_event = Event()
+        self.running = False
+        self.thread = None
+
+    # ------------------------------------------------------------------
+    # Escriptura
+    # ------------------------------------------------------------------
+
+    def append(self, key, value, t=None):
+        """
+        Afegir una mostra (només memòria; l'escriu el thread de flush)
+
+        Args:
+            key: Nom del sensor
+            value: Valor numèric
+            t: Epoch (None = ara)
+        """
+        if t is None:
+            t = time.time()
+
+        with self.lock:
+            buf = self.pending.get(key)
+            if buf is None:
+                buf = self.pending[key] = bytearray()
+            buf += RECORD.pack(t, value)
+            self.pending_count += 1
+            if self.pending_count >= self.flush_records:
+                self.flush_event.set()
+
+    def flush(self):
+        """
+        Escriure a disc tots els registres pendents
+
+        Si l'escriptura d'un sensor falla (SD plena o de només lectura),
+        el que no s'ha escrit torna a la cua per al pròxim flush i la
+        resta de sensors s'escriuen igualment. L'últim error es propaga
+        un cop acabat.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.pending_count = 0
+
+        error = None
+        for key, buf in pending.items():
+            try:
+                offset = self._write_key(key, buf)
+            except OSError as e:
+                error = e
+                offset = e.offset
+            if offset < len(buf):
+                self._requeue(key, buf[offset:])
+
+        if error is not None:
+            raise error
+
+    def _write_key(self, key, buf):
+        """
+        Escriure els registres d'un sensor; retorna els bytes escrits
+
+        Si falla a mig escriure, l'excepció porta a e.offset els bytes de
+        registres sencers que ja són a disc: només es tornen a encuar els
+        que falten (el registre a mitges es trunca al pròxim intent).
+        """
+        offset = 0
+        written = 0
+        try:
+            directory = os.path.join(self.base_dir, _safe_name(key))
+            os.makedirs(directory, exist_ok=True)
+
+            # Separar per dia (un lot pot creuar mitjanit)
+            while offset < len(buf):
+                day = _day_of(RECORD.unpack_from(buf, offset)[0])
+                end = offset
+                while end < len(buf) and _day_of(RECORD.unpack_from(buf, end)[0]) == day:
+                    end += RECORD.size
+                path = os.path.join(directory, day.strftime('%Y%m%d') + RAW_EXT)
+                # Sense buffer: write() retorna els bytes que han arribat al fitxer
+                with open(path, 'ab', buffering=0) as f, memoryview(buf) as view:
+                    # Un intent anterior pot haver deixat un registre a mitges
+                    size = f.seek(0, os.SEEK_END)
+                    if size % RECORD.size:
+                        f.truncate(size - size % RECORD.size)
+                    written = 0
+                    while offset + written < end:
+                        written += f.write(view[offset + written:end])
+                offset = end
+                written = 0
+        except OSError as e:
+            e.offset = offset + written - written % RECORD.size
+            raise
+        return offset
+
+    def _requeue(self, key, buf):
+        """Tornar registres no escrits a la cua, davant dels més nous"""
+        # Amb el disc ple indefinidament, limitar la memòria: es perden els més antics
+        excess = len(buf) - self.MAX_RETRY_RECORDS * RECORD.size
+        if excess > 0:
+            buf = buf[excess:]
+        with self.lock:
+            newer = self.pending.get(key)
+            self.pending[key] = bytearray(buf) + newer if newer else bytearray(buf)
+            self.pending_count += len(buf) // RECORD.size
+
+    def start(self):
+        """Iniciar el thread de flush periòdic"""
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = Thread(target=self._flush_loop, name="sensor_store", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Aturar el thread i escriure el que quedi pendent"""
+        self.running = False
+        self.flush_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+        self.flush()
+
+    def _flush_loop(self):
+        while self.running:
+            self.flush_event.wait(self.flush_interval)
+            self.flush_event.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️  Store: Error escrivint històric: {e}")
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def read(self, key, since, until=None):
+        """
+        Llegir mostres [since, until) d'un sensor
+
+        Els fitxers es mapegen amb mmap i només es copien els bytes del
+        rang demanat (cerca binària sobre el temps). Els dies compactats
+        retornen la mitjana de cada bucket.
+
+        Args:
+            key: Nom del sensor
+            since: Epoch inicial
+            until: Epoch final (None = ara)
+
+        Returns:
+            (times, values) com a array('d')
+        """
+        if until is None:
+            until = time.time()
+
+        times = array('d')
+        values = array('d')
+        directory = os.path.join(self.base_dir, _safe_name(key))
+
+        day = _day_of(since)
+        last_day = _day_of(until)
+        while day <= last_day:
+            stem = os.path.join(directory, day.strftime('%Y%m%d'))
+            has_raw = os.path.exists(stem + RAW_EXT)
+            has_agg = os.path.exists(stem + AGG_EXT)
+            if has_raw and has_agg:
+                # Dia compactat amb mostres que han arribat després: fusionar
+                day_t, day_v = array('d'), array('d')
+                self._read_agg(stem + AGG_EXT, since, until, day_t, day_v)
+                self._read_raw(stem + RAW_EXT, since, until, day_t, day_v)
+                for t, v in sorted(zip(day_t, day_v)):
+                    times.append(t)
+                    values.append(v)
+            elif has_raw:
+                self._read_raw(stem + RAW_EXT, since, until, times, values)
+            elif has_agg:
+                self._read_agg(stem + AGG_EXT, since, until, times, values)
+            day += timedelta(days=1)
+
+        # Afegir els pendents encara no escrits
+        with self.lock:
+            buf = bytes(self.pending.get(key, b''))
+        for t, v in RECORD.iter_unpack(buf):
+            if since <= t < until:
+                times.append(t)
+                values.append(v)
+
+        return times, values
+
+    @staticmethod
+    def _bisect(mm, count, size, t):
+        """Primer registre amb temps >= t (el temps és el primer camp)"""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from('<d', mm, mid * size)[0] < t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _read_raw(self, path, since, until, times, values):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            count = size // RECORD.size
+            if not count:
+                return
+            with mmap.mmap(f.fileno(), count * RECORD.size, access=mmap.ACCESS_READ) as mm:
+                i0 = self._bisect(mm, count, RECORD.size, since)
+                i1 = self._bisect(mm, count, RECORD.size, until)
+                chunk = array('d')
+                chunk.frombytes(mm[i0 * RECORD.size:i1 * RECORD.size])
+        times.extend(chunk[0::2])
+        values.extend(chunk[1::2])
+
+    def _read_agg(self, path, since, until, times, values):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            count = size // AGG_RECORD.size
+            if not count:
+                return
+            with mmap.mmap(f.fileno(), count * AGG_RECORD.size, access=mmap.ACCESS_READ) as mm:
+                i0 = self._bisect(mm, count, AGG_RECORD.size, since)
+                i1 = self._bisect(mm, count, AGG_RECORD.size, until)
+                for t, _, _, mean in AGG_RECORD.iter_unpack(
+                        mm[i0 * AGG_RECORD.size:i1 * AGG_RECORD.size]):
+                    times.append(t)
+                    values.append(mean)
+
+    # ------------------------------------------------------------------
+    # Compactació
+    # ------------------------------------------------------------------
+
+    def compact(self, older_than_days=7, bucket=300):
+        """
+        Convertir els dies antics a agregats (min/max/mitjana per bucket)
+
+        Args:
+            older_than_days: Dies crus que es conserven sense compactar
+            bucket: Mida del bucket en segons
+
+        Returns:
+            int: fitxers compactats
+        """
+        limit = date.today() - timedelta(days=older_than_days)
+        compacted = 0
+
+        if not os.path.isdir(self.base_dir):
+            return 0
+
+        for sensor in os.listdir(self.base_dir):
+            directory = os.path.join(self.base_dir, sensor)
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith(RAW_EXT):
+                    continue
+                try:
+                    day = datetime.strptime(name[:-len(RAW_EXT)], '%Y%m%d').date()
+                except ValueError:
+                    continue  # Fitxer aliè (còpia, nom editat a mà...)
+                if day >= limit:
+                    continue
+                self._compact_file(os.path.join(directory, name), bucket)
+                compacted += 1
+
+        return compacted
+
+    def _compact_file(self, path, bucket):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        buckets = []
+        current = None
+        vmin = vmax = total = 0.0
+        n = 0
+        for t, v in RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size]):
+            start = t - t % bucket
+            if start != current:
+                if n:
+                    buckets.append((current, vmin, vmax, total / n))
+                current, vmin, vmax, total, n = start, v, v, 0.0, 0
+            vmin = min(vmin, v)
+            vmax = max(vmax, v)
+            total += v
+            n += 1
+        if n:
+            buckets.append((current, vmin, vmax, total / n))
+
+        # Mostres tardanes d'un dia ja compactat: fusionar amb l'agregat
+        # existent (un bucket repetit fa la mitjana de les dues mitjanes)
+        agg_path = path[:-len(RAW_EXT)] + AGG_EXT
+        if os.path.exists(agg_path):
+            with open(agg_path, 'rb') as f:
+                old = f.read()
+            merged = {}
+            for record in AGG_RECORD.iter_unpack(old[:len(old) - len(old) % AGG_RECORD.size]):
+                merged[record[0]] = record
+            for record in buckets:
+                prev = merged.get(record[0])
+                if prev is not None:
+                    record = (record[0], min(prev[1], record[1]), max(prev[2], record[2]),
+                              (prev[3] + record[3]) / 2)
+                merged[record[0]] = record
+            buckets = [merged[start] for start in sorted(merged)]
+
+        out = bytearray()
+        for record in buckets:
+            out += AGG_RECORD.pack(*record)
+
+        # Escriptura atòmica de l'agregat i després esborrar el cru
+        with open(agg_path + '.tmp', 'wb') as f:
+            f.write(out)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(agg_path + '.tmp', agg_path)
+        os.remove(path)
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    import tempfile
+
+    base = tempfile.mkdtemp(prefix="dietpink_store_")
+    store = SensorStore(base)
+
+    now = time.time()
+    for i in range(10 * 24 * 60):  # 10 dies, una mostra per minut
+        store.append('balco', 10 + (i % 1440) / 144, now - (10 * 24 * 60 - i) * 60)
+    store.flush()
+
+    start = time.perf_counter()
+    times, values = store.read('balco', now - 86400)
+    elapsed = (time.perf_counter() - start) * 1000
+    print("🧪 Test SensorStore")
+    print(f"   24h: {len(times)} mostres en {elapsed:.1f} ms")
+
+    print(f"   Compactats: {store.compact(older_than_days=7)} fitxers")
+    times, values = store.read('balco', now - 10 * 86400)
+    print(f"   10 dies: {len(times)} mostres (amb agregats)")
+    print(f"   Directori: {base}")
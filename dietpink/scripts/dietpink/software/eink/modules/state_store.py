@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+state_store.py - Estat central versionat
+Actualitzacions atòmiques de diverses claus, número de versió monòton i
+snapshots immutables; els consumidors esperen fins que la versió canvia
+"""
+
+from threading import Condition
+from types import MappingProxyType
+
+
+class Snapshot:
+    """Vista immutable de l'estat en una versió concreta"""
+
+    __slots__ = ('version', 'data')
+
+    def __init__(self, version, data):
+        self.version = version
+        self.data = data  # MappingProxyType (només lectura)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def __repr__(self):
+        return f"Snapshot(v{self.version}, {dict(self.data)})"
+
+
+class StateStore:
+    """
+    Magatzem d'estat compartit entre productors (MQTT, YR...) i el renderer
+
+    Cada update() crea un dict nou (copy-on-write): els snapshots ja
+    lliurats no canvien mai, i llegir-los no necessita cap lock.
+    """
+
+    def __init__(self, initial=None):
+        """
+        Args:
+            initial: dict amb els valors inicials (versió 0)
+        """
+        self._cond = Condition()
+        self._snapshot = Snapshot(0, MappingProxyType(dict(initial or {})))
+        self._closed = False
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def snapshot(self):
+        """Snapshot actual (lectura atòmica d'una referència)"""
+        return self._snapshot
+
+    def update(self, changes=None, **kwargs):
+        """
+        Aplicar canvis a diverses claus de forma atòmica
+
+        Si cap valor canvia realment, la versió no s'incrementa i no es
+        desperta ningú.
+
+        Returns:
+            int: versió resultant
+        """
+        if changes:
+            kwargs.update(changes)
+
+        with self._cond:
+            current = self._snapshot
+            if all(key in current.data and current.data[key] == value
+                   for key, value in kwargs.items()):
+                return current.version
+
+            data = dict(current.data)
+            data.update(kwargs)
+            self._snapshot = Snapshot(current.version + 1, MappingProxyType(data))
+            self._cond.notify_all()
+            return self._snapshot.version
+
+    def wait(self, since_version, timeout=None):
+        """
+        Esperar una versió posterior a since_version
+
+        Args:
+            since_version: Última versió que ja ha processat el consumidor
+            timeout: Segons màxims d'espera (None = indefinit)
+
+        Returns:
+            Snapshot nou, o None si timeout o el magatzem s'ha tancat
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._closed or self._snapshot.version > since_version,
+                timeout)
+            if self._closed or self._snapshot.version <= since_version:
+                return None
+            return self._snapshot
+
+    def close(self):
+        """Despertar tots els consumidors perquè acabin"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    import time
+    from threading import Thread
+
+    store = StateStore({'temp_interior': None, 'temp_exterior': None, 'forecast': None})
+    renders = []
+
+    def renderer():
+        version = 0
+        while True:
+            snapshot = store.wait(version)
+            if snapshot is None:
+                return
+            time.sleep(0.05)  # Finestra de coalescència
+            snapshot = store.snapshot()
+            version = snapshot.version
+            renders.append(snapshot)
+
+    thread = Thread(target=renderer)
+    thread.start()
+
+    # Ràfega de productors: s'han d'agrupar en pocs renders
+    for i in range(20):
+        store.update(temp_interior=20 + i / 10, temp_exterior=5.0)
+        if i == 10:
+            store.update(forecast={'symbol_code': 'rain'})
+    store.update(temp_exterior=5.0)  # Sense canvi: no incrementa la versió
+    time.sleep(0.2)
+    store.close()
+    thread.join()
+
+    print("🧪 Test StateStore")
+    print(f"   Versió final: {store.version}, renders: {len(renders)}")
+    print(f"   Últim: {renders[-1]}")
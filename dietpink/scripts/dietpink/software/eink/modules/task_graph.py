@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+task_graph.py - Execució concurrent de tasques amb dependències
+Cada tasca arrenca quan han acabat les seves dependències; el temps total
+és el del camí més llarg, no la suma de totes les tasques
+"""
+
+import time
+from threading import Thread, Event
+
+
+class _Task:
+    """Node del graf"""
+
+    __slots__ = ('name', 'func', 'deps', 'done', 'result', 'error',
+                 'started', 'finished')
+
+    def __init__(self, name, func, deps):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.done = Event()
+        self.result = None
+        self.error = None
+        self.started = None
+        self.finished = None
+
+
+class TaskGraph:
+    """
+    Graf de tasques d'arrencada
+
+    Cada tasca corre al seu propi thread (els grafs són petits). Si una
+    dependència falla, les tasques que en depenen no s'executen.
+    """
+
+    def __init__(self, name="startup"):
+        """
+        Args:
+            name: Prefix dels threads
+        """
+        self.name = name
+        self.tasks = {}
+        self.start_time = None
+
+    def add(self, name, func, deps=()):
+        """
+        Afegir una tasca
+
+        Args:
+            name: Nom únic
+            func: Funció sense arguments; el valor retornat és el resultat
+            deps: Noms de les tasques que han d'acabar abans
+        """
+        for dep in deps:
+            if dep not in self.tasks:
+                raise ValueError(f"Dependència desconeguda: {dep}")
+        self.tasks[name] = _Task(name, func, deps)
+
+    def run(self, timeout=None):
+        """
+        Executar el graf i esperar que acabi
+
+        Args:
+            timeout: Límit total en segons (None = sense límit)
+
+        Returns:
+            dict: nom -> resultat (None si ha fallat o no ha acabat)
+        """
+        self.start_time = time.monotonic()
+        threads = [
+            Thread(target=self._run_task, args=(task,),
+                   name=f"{self.name}_{task.name}", daemon=True)
+            for task in self.tasks.values()
+        ]
+        for thread in threads:
+            thread.start()
+
+        deadline = None if timeout is None else self.start_time + timeout
+        for thread in threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+
+        return {name: task.result for name, task in self.tasks.items()}
+
+    def _run_task(self, task):
+        try:
+            for dep in task.deps:
+                dep_task = self.tasks[dep]
+                dep_task.done.wait()
+                if dep_task.error is not None:
+                    task.error = f"depèn de '{dep}', que ha fallat"
+                    return
+
+            task.started = time.monotonic()
+            try:
+                task.result = task.func()
+            except Exception as e:
+                task.error = e
+                print(f"❌ {self.name}: Error a '{task.name}': {e}")
+            task.finished = time.monotonic()
+        finally:
+            task.done.set()
+
+    def failed(self, name):
+        """Comprovar si una tasca ha fallat (o no s'ha pogut executar)"""
+        return self.tasks[name].error is not None
+
+    def timings(self):
+        """
+        Durada de cada tasca
+
+        Returns:
+            list de (nom, inici, durada) en segons relatius a run()
+        """
+        rows = []
+        for task in self.tasks.values():
+            if task.started is None or task.finished is None:
+                continue
+            rows.append((task.name, task.started - self.start_time,
+                         task.finished - task.started))
+        return sorted(rows, key=lambda row: row[1])
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    graph = TaskGraph()
+    graph.add('coords', lambda: time.sleep(0.3) or (41.39, 2.17))
+    graph.add('ui', lambda: time.sleep(0.5) or 'ui')
+    graph.add('mqtt', lambda: time.sleep(0.4) or 'mqtt')
+    graph.add('yr', lambda: time.sleep(0.2) or 'yr', deps=['coords'])
+    graph.add('frame', lambda: 'frame', deps=['ui', 'yr'])
+
+    print("🧪 Test TaskGraph (seqüencial serien 1.4s)")
+    start = time.monotonic()
+    results = graph.run(timeout=5)
+    print(f"   Total: {time.monotonic() - start:.2f}s")
+    for name, begin, duration in graph.timings():
+        print(f"   {name:8s} +{begin:.2f}s  {duration:.2f}s")
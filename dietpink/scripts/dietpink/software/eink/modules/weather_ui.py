@@ -11,6 +11,10 @@ import math
 # Afegir path del display wrapper
 sys.path.append('/root/projects/dietpink/software/eink')
 from dietpink_display import DietpinkDisplay
+from log_setup import get_logger
+from tracing import span
+
+log = get_logger('ui')
 
 
 class WeatherUI:
@@ -23,6 +27,10 @@ class WeatherUI:
     # Layout split vertical
     SPLIT_X = 125  # Meitat
     
+    # Gràfics d'històric (mode compacte)
+    GRAPH_IN_H = 14   # Franja inferior de la casa
+    GRAPH_OUT_W = 36  # Al costat de la temperatura exterior
+    
     def __init__(self):
         """Inicialitzar UI"""
         self.display = DietpinkDisplay()
@@ -40,7 +48,7 @@ class WeatherUI:
             self.font_small = ImageFont.load_default()
             self.font_tiny = ImageFont.load_default()
     
-    def render(self, temp_interior, temp_exterior, forecast):
+    def render(self, temp_interior, temp_exterior, forecast, history=None):
         """
         Renderitzar UI complet
         
@@ -48,30 +56,46 @@ class WeatherUI:
             temp_interior: Temperatura menjador (float o None)
             temp_exterior: Temperatura balcó (float o None)
             forecast: Dict amb dades de previsió YR
+            history: Dict opcional {'interior': (times, values),
+                     'exterior': (times, values)} per als gràfics de 24h
         """
-        print(f"   [UI] render() cridat amb: IN={temp_interior}, OUT={temp_exterior}, forecast={forecast.get('symbol_code') if forecast else None}")
+        log.debug("render(): IN=%s, OUT=%s, forecast=%s", temp_interior, temp_exterior,
+                  forecast.get('symbol_code') if forecast else None)
 
-        # Crear imatge
-        image = Image.new('1', (self.WIDTH, self.HEIGHT), 255)  # Blanc
-        draw = ImageDraw.Draw(image)
-        
-        # Línia divisoria vertical
-        draw.line([(self.SPLIT_X, 0), (self.SPLIT_X, self.HEIGHT)], fill=0, width=2)
-        
-        # Secció esquerra: Temperatures
-        self._draw_temperatures(draw, temp_interior, temp_exterior)
-        
-        # Secció dreta: Previsió
-        self._draw_forecast(draw, forecast)
-       
-        # Rotar 180 graus
-        image = image.rotate(180)
+        with span('ui.draw'):
+            # Crear imatge
+            image = Image.new('1', (self.WIDTH, self.HEIGHT), 255)  # Blanc
+            draw = ImageDraw.Draw(image)
+            
+            # Línia divisoria vertical
+            draw.line([(self.SPLIT_X, 0), (self.SPLIT_X, self.HEIGHT)], fill=0, width=2)
+            
+            # Secció esquerra: Temperatures (+ gràfics si hi ha històric)
+            ext_right = self._draw_temperatures(draw, temp_interior, temp_exterior,
+                                                compact=bool(history))
+            if history:
+                self._draw_graphs(image, history, ext_right)
+            
+            # Secció dreta: Previsió
+            self._draw_forecast(draw, forecast)
+           
+            # Rotar 180 graus
+            image = image.rotate(180)
 
         # Mostrar al display
         self.display.show_image(image)
     
-    def _draw_temperatures(self, draw, temp_interior, temp_exterior):
-        """Dibuixar secció de temperatures (esquerra)"""
+    def _draw_temperatures(self, draw, temp_interior, temp_exterior, compact=False):
+        """
+        Dibuixar secció de temperatures (esquerra)
+        
+        Args:
+            compact: Deixar espai pels gràfics (text interior amunt,
+                     text exterior a l'esquerra)
+        
+        Returns:
+            int: Coordenada x on acaba el text exterior
+        """
         
         # Zona interior (casa)
         house_x = 5
@@ -106,6 +130,8 @@ class WeatherUI:
             
             # Centrar dins l'àrea de la casa (exclou sostre)
             house_inner_h = house_h - 12  # Altura útil sense sostre
+            if compact:
+                house_inner_h -= self.GRAPH_IN_H  # Franja inferior pel gràfic
             text_x = house_x + (house_w - text_w) // 2
             text_y = house_y + 12 + (house_inner_h - text_h) // 2
             
@@ -122,12 +148,40 @@ class WeatherUI:
             # Centrar horitzontalment a la secció esquerra
             bbox = draw.textbbox((0, 0), temp_text, font=self.font_large)
             text_w = bbox[2] - bbox[0]
-            text_x = (self.SPLIT_X - text_w) // 2
+            if compact:
+                text_x = 3
+            else:
+                text_x = (self.SPLIT_X - text_w) // 2
             
             draw.text((text_x, ext_y), temp_text, font=self.font_large, fill=0)
+            return text_x + text_w
             
         else:
             draw.text((40, ext_y), "---", font=self.font_large, fill=0)
+            return self.SPLIT_X
+    
+    def _draw_graphs(self, image, history, ext_right):
+        """
+        Dibuixar gràfics de 24h (interior dins la casa, exterior al costat)
+        
+        El gràfic exterior s'omet si el text de la temperatura no hi deixa
+        espai (ext_right = on acaba el text).
+        
+        El rasteritzat el fa DietpinkDisplay.render_graph (LTTB + polilínia)
+        i queda en cache fins que arriben mostres noves.
+        """
+        interior = history.get('interior')
+        if interior and len(interior[0]) >= 2:
+            graph = self.display.render_graph(interior[0], interior[1],
+                                              100, self.GRAPH_IN_H, key='ui_interior')
+            image.paste(graph, (10, 77 - self.GRAPH_IN_H))
+        
+        exterior = history.get('exterior')
+        graph_x = self.SPLIT_X - self.GRAPH_OUT_W - 3
+        if exterior and len(exterior[0]) >= 2 and ext_right < graph_x - 2:
+            graph = self.display.render_graph(exterior[0], exterior[1],
+                                              self.GRAPH_OUT_W, 30, key='ui_exterior')
+            image.paste(graph, (graph_x, 84))
     
     def _draw_forecast(self, draw, forecast):
         """Dibuixar secció de previsió (dreta)"""
@@ -446,8 +500,16 @@ if __name__ == "__main__":
         'success': True
     }
     
+    # Històric sintètic de 24h (una mostra cada 5 minuts)
+    now = time.time()
+    times = [now - 86400 + i * 300 for i in range(288)]
+    history_test = {
+        'interior': (times, [21 + math.sin(i / 40) for i in range(288)]),
+        'exterior': (times, [8 + 4 * math.sin(i / 46) for i in range(288)])
+    }
+    
     print("📊 Renderitzant UI de test...")
-    ui.render(temp_interior, temp_exterior, forecast_test)
+    ui.render(temp_interior, temp_exterior, forecast_test, history=history_test)
     
     print("✅ UI mostrada al display!")
     print("   (Espera 5 segons...)")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+yr_multi.py - Previsió YR per a diverses ubicacions en paral·lel
+Un YRWeatherClient per ubicació única (cache i validadors propis),
+amb els fetch llançats alhora en un pool de threads
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from yr_weather import YRWeatherClient, round_coordinates
+
+
+class MultiLocationClient:
+    """Client YR per a múltiples ubicacions (casa, refugi, oficina...)"""
+
+    def __init__(self, user_agent, locations, cache_dir=None, max_workers=4,
+                 **client_kwargs):
+        """
+        Inicialitzar client multi-ubicació
+
+        Args:
+            user_agent: User-Agent string (obligatori per YR)
+            locations: dict nom -> (lat, lon)
+            cache_dir: Directori per les caches a disc (opcional)
+            max_workers: Fetch simultanis màxims
+            client_kwargs: Arguments extra per cada YRWeatherClient
+        """
+        self.user_agent = user_agent
+        self.cache_dir = cache_dir
+        self.client_kwargs = client_kwargs
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="yr_fetch")
+
+        # nom -> clau arrodonida, clau -> client (ubicacions repetides comparteixen client)
+        self.locations = {}
+        self.clients = {}
+
+        for name, (lat, lon) in locations.items():
+            self.add_location(name, lat, lon)
+
+    def add_location(self, name, lat, lon):
+        """Afegir (o moure) una ubicació"""
+        key = round_coordinates(lat, lon)
+        self.locations[name] = key
+
+        if key not in self.clients:
+            cache_path = None
+            if self.cache_dir:
+                cache_path = os.path.join(self.cache_dir, f"yr_{key[0]}_{key[1]}.json")
+            self.clients[key] = YRWeatherClient(
+                user_agent=self.user_agent,
+                lat=key[0],
+                lon=key[1],
+                cache_path=cache_path,
+                **self.client_kwargs
+            )
+
+        self._drop_unused_clients()
+
+    def remove_location(self, name):
+        """Treure una ubicació"""
+        self.locations.pop(name, None)
+        self._drop_unused_clients()
+
+    def _drop_unused_clients(self):
+        """Eliminar clients de claus que ja no fa servir cap nom"""
+        in_use = set(self.locations.values())
+        for key in list(self.clients):
+            if key not in in_use:
+                del self.clients[key]
+
+    def client(self, name):
+        """YRWeatherClient d'una ubicació"""
+        return self.clients[self.locations[name]]
+
+    def fetch_all(self):
+        """
+        Obtenir la previsió de totes les ubicacions alhora
+
+        Cada ubicació única es demana un sol cop; el temps total és
+        aproximadament el d'un sol round trip.
+
+        Returns:
+            dict: nom -> forecast
+        """
+        futures = {
+            key: self.executor.submit(client.get_forecast)
+            for key, client in self.clients.items()
+        }
+
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                print(f"   ❌ YR {key}: {e}")
+                results[key] = self.clients[key].get_cached_forecast()
+
+        return {name: results[key] for name, key in self.locations.items()}
+
+    def get_cached_forecasts(self):
+        """Última previsió en cache de cada ubicació (sense xarxa)"""
+        return {
+            name: self.clients[key].get_cached_forecast()
+            for name, key in self.locations.items()
+        }
+
+    def shutdown(self):
+        """Aturar el pool de threads"""
+        self.executor.shutdown(wait=False)
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    import json
+    import time
+
+    with open('../config/weather_config.json', 'r') as f:
+        config = json.load(f)
+
+    multi = MultiLocationClient(
+        user_agent=config['yr_api']['user_agent'],
+        locations={
+            'casa': (59.8586, 17.6389),
+            'casa (duplicada)': (59.858612, 17.638901),
+            'oficina': (59.3293, 18.0686),
+            'refugi': (61.0, 14.5),
+        }
+    )
+
+    print(f"📍 {len(multi.locations)} ubicacions, {len(multi.clients)} úniques")
+
+    start = time.perf_counter()
+    forecasts = multi.fetch_all()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n📊 Resultat ({elapsed:.2f}s):")
+    for name, forecast in forecasts.items():
+        print(f"   {name}: {forecast['symbol_code']}, "
+              f"{forecast['temperature_current']}°C, success={forecast['success']}")
+
+    multi.shutdown()
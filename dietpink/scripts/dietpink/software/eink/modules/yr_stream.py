@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+yr_stream.py - Parseig incremental de la resposta locationforecast
+Llegeix el cos JSON per trossos (ijson) i només guarda els camps que
+fem servir a una ForecastSeries, sense construir mai el dict complet
+"""
+
+from forecast_series import ForecastSeries
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+TIMESERIES_PREFIX = 'properties.timeseries.item'
+
+
+def stream_available():
+    """Comprovar si el mode streaming està disponible (ijson instal·lat)"""
+    return ijson is not None
+
+
+def parse_stream(fileobj):
+    """
+    Parsejar un payload locationforecast de forma incremental
+
+    Cada element del timeseries es decodifica sol (~1 KB), s'afegeix a
+    les columnes i es descarta abans de llegir el següent.
+
+    Args:
+        fileobj: Objecte tipus fitxer en mode binari (p.ex. response.raw)
+
+    Returns:
+        ForecastSeries amb tots els punts
+    """
+    if ijson is None:
+        raise RuntimeError("ijson no instal·lat (pip3 install ijson)")
+
+    series = ForecastSeries()
+    # use_float=True: floats natius en lloc de Decimal
+    for entry in ijson.items(fileobj, TIMESERIES_PREFIX, use_float=True):
+        series.append_entry(entry)
+    series.freeze()
+    return series
+
+
+# Test del mòdul
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Ús: python3 yr_stream.py <payload.json>")
+        sys.exit(1)
+
+    if not stream_available():
+        print("❌ ijson no instal·lat")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'rb') as f:
+        series = parse_stream(f)
+
+    print(f"📊 Punts: {len(series)}")
+    print(f"   Resum: {series.summary(t=series.times[0])}")
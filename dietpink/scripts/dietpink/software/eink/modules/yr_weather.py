@@ -4,14 +4,42 @@ yr_weather.py - Client per YR (met.no) Weather API
 Obté previsió del temps per Uppsala
 """
 
+import os
+import sys
+import json
+import time
+import random
 import requests
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from threading import Lock
+
+from forecast_series import ForecastSeries
+from yr_stream import parse_stream, stream_available
+
+sys.path.append('/root/projects/dietpink/software/eink')
+from metrics import counter, histogram
+
+FETCHES = {result: counter('dietpink_yr_fetches_total', 'YR API requests by result',
+                           {'result': result})
+           for result in ('ok', 'not_modified', 'error')}
+FETCH_MS = histogram('dietpink_yr_fetch_ms', 'YR request latency, download and parse included')
+PARSE_MS = histogram('dietpink_yr_parse_ms', 'YR response parse time')
+
+# met.no demana com a màxim 4 decimals a les coordenades
+COORD_DECIMALS = 4
+
+
+def round_coordinates(lat, lon):
+    """Arrodonir coordenades a la precisió acceptada per met.no (clau de cache)"""
+    return (round(lat, COORD_DECIMALS), round(lon, COORD_DECIMALS))
 
 
 class YRWeatherClient:
     """Client per obtenir previsió del temps de YR API"""
     
-    def __init__(self, user_agent, lat=None, lon=None):
+    def __init__(self, user_agent, lat=None, lon=None, cache_path=None,
+                 max_age_hours=3, stream_parse=False):
         """
         Inicialitzar client YR
         
@@ -19,6 +47,9 @@ class YRWeatherClient:
             user_agent: User-Agent string (obligatori per YR)
             lat: Latitud (opcional, es pot obtenir de HA)
             lon: Longitud (opcional, es pot obtenir de HA)
+            cache_path: Fitxer JSON on persistir l'última previsió (opcional)
+            max_age_hours: Edat a partir de la qual la cache es considera antiga
+            stream_parse: Parsejar la resposta de forma incremental (requereix ijson)
         """
         self.user_agent = user_agent
         self.lat = lat
@@ -26,12 +57,50 @@ class YRWeatherClient:
         self.last_forecast = None
         self.last_update = None
         
+        # Sèrie completa en columnes (veure forecast_series.py)
+        self.series = None
+        
+        # Validadors HTTP per peticions condicionals (304 Not Modified)
+        self.etag = None
+        self.last_modified = None
+        
+        # Planificació: Expires de met.no i errors consecutius (backoff)
+        self.expires = None
+        self.failures = 0
+        
+        # Cache persistent a disc
+        self.cache_path = cache_path
+        self.max_age = timedelta(hours=max_age_hours)
+        self.cache_lock = Lock()
+        
+        # Parseig incremental (menys memòria pic a la Pi Zero)
+        self.stream_parse = stream_parse and stream_available()
+        if stream_parse and not self.stream_parse:
+            print("⚠️  YR: ijson no disponible, usant parseig complet")
+        
         self.api_url = "https://api.met.no/weatherapi/locationforecast/2.0/compact"
+        
+        if self.cache_path:
+            self._load_cache()
     
     def set_coordinates(self, lat, lon):
-        """Actualitzar coordenades"""
-        self.lat = lat
-        self.lon = lon
+        """
+        Actualitzar coordenades
+        
+        Returns:
+            bool: True si la ubicació ha canviat (cal un fetch nou)
+        """
+        moved = self.lat is None or round_coordinates(lat, lon) != round_coordinates(self.lat, self.lon)
+        with self.cache_lock:
+            if moved:
+                # Els validadors i la cache són d'una altra ubicació
+                self.etag = None
+                self.last_modified = None
+                self.expires = None
+                self.last_update = None  # La previsió en cache passa a ser antiga
+            self.lat = lat
+            self.lon = lon
+        return moved
     
     def get_forecast(self):
         """
@@ -50,32 +119,71 @@ class YRWeatherClient:
             print("⚠️  YR: Coordenades no configurades")
             return self._empty_forecast()
         
+        lat, lon = round_coordinates(self.lat, self.lon)
         params = {
-            'lat': self.lat,
-            'lon': self.lon
+            'lat': lat,
+            'lon': lon
         }
         
         headers = {
             'User-Agent': self.user_agent
         }
         
+        # Petició condicional si tenim previsió i validadors
+        if self.last_forecast is not None:
+            if self.last_modified:
+                headers['If-Modified-Since'] = self.last_modified
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+        
+        start = time.perf_counter()
         try:
             print(f"🌤️  YR: Obtenint previsió per ({self.lat}, {self.lon})...")
             
-            response = requests.get(
+            with requests.get(
                 self.api_url,
                 params=params,
                 headers=headers,
-                timeout=15
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            forecast = self._parse_forecast(data)
-            
-            self.last_forecast = forecast
-            self.last_update = datetime.now()
+                timeout=15,
+                stream=self.stream_parse
+            ) as response:
+                
+                if response.status_code == 304:
+                    print("   ✅ Previsió sense canvis (304)")
+                    FETCHES['not_modified'].inc()
+                    FETCH_MS.observe((time.perf_counter() - start) * 1000)
+                    with self.cache_lock:
+                        self.last_update = datetime.now()
+                        self.expires = self._parse_expires(response)
+                        self.failures = 0
+                        self._save_cache()
+                    return self.get_cached_forecast()
+                
+                response.raise_for_status()
+                
+                with PARSE_MS.time_ms():
+                    if self.stream_parse:
+                        # Descomprimir gzip mentre es llegeix el cos
+                        response.raw.decode_content = True
+                        forecast, series = self._parse_stream(response.raw)
+                    else:
+                        forecast, series = self._parse_forecast(response.json())
+                
+                with self.cache_lock:
+                    if forecast['success']:
+                        self.series = series
+                        self.last_forecast = forecast
+                        self.last_update = datetime.now()
+                        self.etag = response.headers.get('ETag')
+                        self.last_modified = response.headers.get('Last-Modified')
+                        self.expires = self._parse_expires(response)
+                        self.failures = 0
+                        self._save_cache()
+                    else:
+                        self.failures += 1
             
+            FETCHES['ok' if forecast['success'] else 'error'].inc()
+            FETCH_MS.observe((time.perf_counter() - start) * 1000)
             print(f"   ✅ Symbol: {forecast['symbol_code']}")
             print(f"   ✅ Pluja: {forecast['precipitation']} mm")
             print(f"   ✅ Temp: {forecast['temperature_current']}°C")
@@ -84,70 +192,66 @@ class YRWeatherClient:
             
         except requests.exceptions.RequestException as e:
             print(f"   ❌ Error cridant YR API: {e}")
+            with self.cache_lock:
+                self.failures += 1
+            FETCHES['error'].inc()
             return self._empty_forecast()
         except Exception as e:
             print(f"   ❌ Error processant dades YR: {e}")
+            with self.cache_lock:
+                self.failures += 1
+            FETCHES['error'].inc()
             return self._empty_forecast()
+    
+    def _parse_expires(self, response):
+        """Llegir la capçalera Expires com a datetime local (None si absent)"""
+        try:
+            expires = parsedate_to_datetime(response.headers['Expires'])
+            return expires.astimezone().replace(tzinfo=None)
+        except (KeyError, TypeError, ValueError):
+            return None
+
     def _parse_forecast(self, data):
-        """Extreure dades rellevants de la resposta YR"""
+        """
+        Extreure dades rellevants de la resposta YR
+        
+        Tot el timeseries es converteix a columnes i el resum de les
+        pròximes 6h es calcula a partir d'elles.
+        
+        Returns:
+            (previsió, ForecastSeries o None); el cridador les desa
+            juntes sota cache_lock
+        """
         try:
-            timeseries = data['properties']['timeseries']
-            
-            # Temperatura actual i dades instant
-            current = timeseries[0]
-            instant = current['data']['instant']['details']
-            
-            forecast_data = {
-                'symbol_code': 'unknown',
-                'precipitation': 0.0,
-                'temperature_current': instant.get('air_temperature', 0),
-                'temperature_max': instant.get('air_temperature', 0),
-                'temperature_min': instant.get('air_temperature', 0),
-                'wind_speed': instant.get('wind_speed', 0),
-                'wind_direction': instant.get('wind_from_direction', 0),
-                'timestamp': datetime.now(),
-                'success': True
-            }
-            
-            # Next 6 hours summary
-            if 'next_6_hours' in current['data']:
-                next_6h = current['data']['next_6_hours']
-                forecast_data['symbol_code'] = next_6h['summary']['symbol_code']
-                
-                details = next_6h['details']
-                forecast_data['precipitation'] = details.get('precipitation_amount', 0.0)
-                
-                # Max/min de les pròximes 6h
-                if 'air_temperature_max' in details:
-                    forecast_data['temperature_max'] = details['air_temperature_max']
-                if 'air_temperature_min' in details:
-                    forecast_data['temperature_min'] = details['air_temperature_min']
-            
-            # Fallback a next_1_hours
-            elif 'next_1_hours' in current['data']:
-                next_1h = current['data']['next_1_hours']
-                forecast_data['symbol_code'] = next_1h['summary']['symbol_code']
-                forecast_data['precipitation'] = next_1h['details'].get('precipitation_amount', 0.0)
-            
-            # Calcular max/min de les pròximes 6 hores analitzant timeseries
-            temps_6h = []
-            for i in range(min(7, len(timeseries))):  # 6 hores = 7 punts (0-6)
-                try:
-                    temp = timeseries[i]['data']['instant']['details'].get('air_temperature')
-                    if temp is not None:
-                        temps_6h.append(temp)
-                except:
-                    pass
-            
-            if temps_6h:
-                forecast_data['temperature_max'] = max(temps_6h)
-                forecast_data['temperature_min'] = min(temps_6h)
-            
-            return forecast_data
+            series = ForecastSeries.from_timeseries(data['properties']['timeseries'])
+            return self._summarize(series), series
             
-        except (KeyError, IndexError) as e:
+        except (KeyError, IndexError, ValueError) as e:
             print(f"   ⚠️  Error parseig YR: {e}")
-            return self._empty_forecast()
+            return self._empty_forecast(), None
+    
+    def _parse_stream(self, fileobj):
+        """Igual que _parse_forecast però llegint el cos de forma incremental"""
+        try:
+            series = parse_stream(fileobj)
+            return self._summarize(series), series
+            
+        except (KeyError, IndexError, ValueError) as e:
+            print(f"   ⚠️  Error parseig YR (stream): {e}")
+            return self._empty_forecast(), None
+    
+    def _summarize(self, series):
+        """Construir el dict de previsió a partir de la sèrie"""
+        if not len(series):
+            raise IndexError("timeseries buit")
+        
+        forecast_data = series.summary(t=series.times[0])
+        forecast_data.update({
+            'timestamp': datetime.now(),
+            'success': True,
+            'stale': False
+        })
+        return forecast_data
     
     def _empty_forecast(self):
         """Retornar previsió buida en cas d'error"""
@@ -160,7 +264,8 @@ class YRWeatherClient:
             'wind_speed': 0.0,
             'wind_direction': 0.0,
             'timestamp': datetime.now(),
-            'success': False
+            'success': False,
+            'stale': True
         }
 
     def should_update(self, interval_hours=3):
@@ -179,11 +284,131 @@ class YRWeatherClient:
         elapsed = datetime.now() - self.last_update
         return elapsed > timedelta(hours=interval_hours)
     
+    def next_update_delay(self, interval_hours=3, start_hour=0,
+                          backoff_base=60, backoff_max=3600):
+        """
+        Segons fins al pròxim fetch
+        
+        - Sense previsió: immediat
+        - Després d'errors: backoff exponencial amb jitter (±50%)
+        - Altrament: pròxima hora "rodona" de la cadència (start_hour +
+          n * interval_hours), mai abans de l'Expires de met.no
+        
+        Args:
+            interval_hours: Cadència configurada
+            start_hour: Hora de referència de la cadència
+            backoff_base: Primer retard després d'un error (s)
+            backoff_max: Retard màxim de backoff (s)
+        """
+        now = datetime.now()
+        with self.cache_lock:
+            failures, last_update, expires = self.failures, self.last_update, self.expires
+        
+        if failures:
+            delay = min(backoff_base * 2 ** (failures - 1), backoff_max)
+            return delay * random.uniform(0.5, 1.5)
+        
+        if last_update is None:
+            return 0.0
+        
+        # Pròxim límit de cadència després de l'últim fetch
+        base = last_update.replace(minute=0, second=0, microsecond=0)
+        hours_since_start = (base.hour - start_hour) % interval_hours
+        target = base - timedelta(hours=hours_since_start) + timedelta(hours=interval_hours)
+        
+        if expires is not None and expires > target:
+            target = expires
+        
+        return max(0.0, (target - now).total_seconds())
+    
     def get_cached_forecast(self):
-        """Obtenir última previsió en cache"""
-        if self.last_forecast is None:
-            return self._empty_forecast()
-        return self.last_forecast
+        """
+        Obtenir última previsió en cache
+        
+        Es retorna encara que sigui antiga; el camp 'stale' indica si
+        ha superat max_age.
+        """
+        with self.cache_lock:
+            if self.last_forecast is None:
+                return self._empty_forecast()
+            forecast = dict(self.last_forecast)
+            forecast['stale'] = self.is_stale()
+            
+            # Previsió antiga: recalcular el resum pel moment actual
+            if forecast['stale'] and self.series is not None:
+                forecast.update(self.series.summary())
+            return forecast
+    
+    def is_stale(self):
+        """Comprovar si la previsió en cache ha superat max_age"""
+        if self.last_update is None:
+            return True
+        return datetime.now() - self.last_update > self.max_age
+    
+    def _load_cache(self):
+        """Carregar previsió persistida a disc (si és de les mateixes coordenades)"""
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+            
+            if (self.lat is not None and
+                    round_coordinates(cache['lat'], cache['lon']) != round_coordinates(self.lat, self.lon)):
+                print("   ⚠️  YR: Cache d'altres coordenades, ignorada")
+                return False
+            
+            forecast = cache['forecast']
+            forecast['timestamp'] = datetime.fromisoformat(forecast['timestamp'])
+            
+            # Sense coordenades (encara no ha respost HA): usar les de la cache
+            if self.lat is None:
+                self.lat, self.lon = cache['lat'], cache['lon']
+            
+            self.last_forecast = forecast
+            self.last_update = datetime.fromisoformat(cache['fetched_at'])
+            self.etag = cache.get('etag')
+            self.last_modified = cache.get('last_modified')
+            if cache.get('expires'):
+                self.expires = datetime.fromisoformat(cache['expires'])
+            if cache.get('series'):
+                self.series = ForecastSeries.from_dict(cache['series'])
+            
+            print(f"   ✅ YR: Cache carregada ({self.last_update.strftime('%d/%m %H:%M')})")
+            return True
+            
+        except FileNotFoundError:
+            return False
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"   ⚠️  YR: Cache invàlida: {e}")
+            return False
+    
+    def _save_cache(self):
+        """Escriure la cache a disc de forma atòmica (fitxer temporal + rename)"""
+        if not self.cache_path or self.last_forecast is None:
+            return
+        
+        forecast = dict(self.last_forecast)
+        forecast['timestamp'] = forecast['timestamp'].isoformat()
+        cache = {
+            'lat': self.lat,
+            'lon': self.lon,
+            'fetched_at': self.last_update.isoformat(),
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'expires': self.expires.isoformat() if self.expires else None,
+            'forecast': forecast,
+            'series': self.series.to_dict() if self.series is not None else None
+        }
+        
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(cache, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"   ⚠️  YR: Error desant cache: {e}")
 
 
 # Test del mòdul
@@ -211,3 +436,8 @@ if __name__ == "__main__":
     print(f"   Temp min: {forecast['temperature_min']}°C")
     print(f"   Vent: {forecast['wind_speed']} m/s, dir: {forecast['wind_direction']}°")
     print(f"   Success: {forecast['success']}")
+    
+    if client.series is not None:
+        print(f"\n📈 Sèrie: {len(client.series)} punts")
+        print(f"   Max 24h: {client.series.max_temp(24)}°C")
+        print(f"   Pluja 12h: {client.series.precip_sum(12)} mm")
@@ -0,0 +1,257 @@
+"""
+sysstats - System statistics without spawning processes
+Reads /proc and /sys directly (temperature, CPU, memory, disk, addresses)
+and keeps the files open between calls: a refresh is a seek(0) + read()
+instead of a fork/exec of vcgencmd, free, df or hostname
+"""
+
+import os
+import math
+import time
+import socket
+import struct
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+THERMAL_PATH = '/sys/class/thermal/thermal_zone0/temp'
+SIOCGIFADDR = 0x8915  # <linux/sockios.h>
+
+
+def format_bytes(value):
+    """Human-readable size like `free -h` / `df -h` (e.g. 1.2G, 427M)"""
+    for unit in ('B', 'K', 'M', 'G'):
+        if value < 1024:
+            return f"{value:.0f}{unit}" if unit == 'B' or value >= 10 else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}T"
+
+
+class SystemStats:
+    """
+    Reusable reader for the numbers the examples display
+
+    Create one instance and keep it: the file handles stay open and
+    cpu_percent() measures the time between two calls.
+    """
+
+    def __init__(self, thermal_path=THERMAL_PATH, disk_path='/'):
+        """
+        Args:
+            thermal_path: sysfs file with the SoC temperature in m°C
+            disk_path: Mount point reported by disk()
+        """
+        self.thermal_path = thermal_path
+        self.disk_path = disk_path
+        self._files = {}        # path -> unbuffered file (None = not available)
+        self._cpu_last = None   # (busy ticks, total ticks) of the previous call
+        self._socket = None
+
+    def _read(self, path, size=4096):
+        """Re-read an open /proc or /sys file (None if it does not exist)"""
+        f = self._files.get(path, False)
+        if f is False:
+            try:
+                f = open(path, 'rb', buffering=0)
+            except OSError:
+                f = None
+            self._files[path] = f
+        if f is None:
+            return None
+        try:
+            f.seek(0)
+            return f.read(size).decode()
+        except OSError:
+            return None
+
+    def close(self):
+        """Close the cached file handles and socket"""
+        for f in self._files.values():
+            if f is not None:
+                f.close()
+        self._files.clear()
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def temperature(self):
+        """SoC temperature in °C (float), or None"""
+        text = self._read(self.thermal_path, 32)
+        try:
+            return int(text) / 1000.0
+        except (TypeError, ValueError):
+            return None
+
+    def _cpu_ticks(self):
+        text = self._read('/proc/stat')
+        if not text or not text.startswith('cpu '):
+            return None
+        # user nice system idle iowait irq softirq steal (guest is already in user)
+        fields = [int(v) for v in text.split('\n', 1)[0].split()[1:9]]
+        idle = fields[3] + fields[4]
+        total = sum(fields)
+        return total - idle, total
+
+    def cpu_percent(self, interval=None):
+        """
+        CPU usage (all cores) since the previous call, from /proc/stat ticks
+
+        The first call has no previous sample: with interval it waits that
+        many seconds and measures them, otherwise it returns the average
+        since boot.
+
+        Returns:
+            float 0-100, or None without /proc/stat
+        """
+        ticks = self._cpu_ticks()
+        if ticks is None:
+            return None
+        last = self._cpu_last
+        if last is None:
+            if interval:
+                time.sleep(interval)
+                last, ticks = ticks, self._cpu_ticks()
+            else:
+                last = (0, 0)
+        self._cpu_last = ticks
+        total = ticks[1] - last[1]
+        if total <= 0:
+            return 0.0
+        return min(100.0, (ticks[0] - last[0]) * 100.0 / total)
+
+    def memory(self):
+        """
+        Memory in use, as `free` counts it (total - available)
+
+        Returns:
+            (used bytes, total bytes), or None
+        """
+        text = self._read('/proc/meminfo')
+        if not text:
+            return None
+        values = {}
+        for line in text.splitlines():
+            key, _, rest = line.partition(':')
+            if key in ('MemTotal', 'MemAvailable', 'MemFree', 'Buffers', 'Cached'):
+                values[key] = int(rest.split()[0]) * 1024
+        if 'MemTotal' not in values:
+            return None
+        available = values.get('MemAvailable')
+        if available is None:  # Kernels before 3.14
+            available = values.get('MemFree', 0) + values.get('Buffers', 0) + values.get('Cached', 0)
+        return values['MemTotal'] - available, values['MemTotal']
+
+    def disk(self, path=None):
+        """
+        Disk usage of a mount point, as `df` counts it
+
+        Returns:
+            (used bytes, total bytes, int percent rounded up like df), or None
+        """
+        try:
+            st = os.statvfs(path or self.disk_path)
+        except OSError:
+            return None
+        total = st.f_blocks * st.f_frsize
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        # df ignores the root-reserved blocks in the percentage
+        usable = used + st.f_bavail * st.f_frsize
+        percent = int(math.ceil(used * 100.0 / usable)) if usable else 0
+        return used, total, percent
+
+    def ip_addresses(self):
+        """
+        IPv4 address of each interface (loopback excluded)
+
+        Interface names come from if_nameindex() (netlink) and addresses
+        from the SIOCGIFADDR ioctl on one cached socket.
+
+        Returns:
+            dict interface -> address (interfaces without IPv4 are omitted)
+        """
+        if fcntl is None:
+            return {}
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        addresses = {}
+        for _, name in socket.if_nameindex():
+            if name == 'lo':
+                continue
+            try:
+                request = struct.pack('256s', name.encode()[:15])
+                reply = fcntl.ioctl(self._socket.fileno(), SIOCGIFADDR, request)
+            except OSError:
+                continue  # Interface down or without IPv4
+            addresses[name] = socket.inet_ntoa(reply[20:24])
+        return addresses
+
+    def ip_address(self, prefer=('wlan0', 'eth0')):
+        """Main IPv4 address (first of prefer, else any), or None"""
+        addresses = self.ip_addresses()
+        for name in prefer:
+            if name in addresses:
+                return addresses[name]
+        return next(iter(addresses.values()), None)
+
+    def uptime(self):
+        """Seconds since boot (float), or None"""
+        text = self._read('/proc/uptime', 64)
+        try:
+            return float(text.split()[0])
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    def snapshot(self):
+        """
+        The dashboard numbers in one call
+
+        Returns:
+            dict with temp (°C or None) and cpu, mem, disk (int percent)
+        """
+        memory = self.memory()
+        disk = self.disk()
+        cpu = self.cpu_percent()
+        return {
+            'temp': self.temperature(),
+            'cpu': int(round(cpu)) if cpu is not None else 0,
+            'mem': int(memory[0] * 100 / memory[1]) if memory else 0,
+            'disk': disk[2] if disk else 0,
+        }
+
+
+# Module test
+if __name__ == "__main__":
+    import subprocess
+
+    stats = SystemStats()
+    print("🧪 Test sysstats")
+    print(f"   Temp: {stats.temperature()}")
+    print(f"   CPU:  {stats.cpu_percent(interval=0.5):.1f}%")
+    used, total = stats.memory()
+    print(f"   RAM:  {format_bytes(used)}/{format_bytes(total)}")
+    used, total, percent = stats.disk()
+    print(f"   Disk: {format_bytes(used)}/{format_bytes(total)} ({percent}%)")
+    print(f"   IP:   {stats.ip_addresses()}")
+    print(f"   Up:   {stats.uptime():.0f}s")
+
+    n = 1000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        stats.snapshot()
+    print(f"   snapshot(): {(time.perf_counter() - t0) / n * 1e6:.0f} µs")
+
+    t0 = time.perf_counter()
+    for _ in range(20):
+        for cmd in (['cat', '/proc/loadavg'], ['free'], ['df', '/']):
+            subprocess.check_output(cmd)
+    print(f"   3 subprocesses: {(time.perf_counter() - t0) / 20 * 1e6:.0f} µs")
+    stats.close()
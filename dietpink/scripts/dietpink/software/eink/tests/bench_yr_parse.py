@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark del parseig de locationforecast: complet (json) vs streaming (ijson)
+Mesura temps i memòria pic (tracemalloc) sobre payloads gravats a fixtures/
+(inclou un payload sintètic amb el format i la mida d'una resposta compact
+real, 89 punts; per comparar amb dades reals, gravar-ne un amb --record)
+
+Ús:
+    python3 bench_yr_parse.py                 # Benchmark de tots els fixtures
+    python3 bench_yr_parse.py --record LAT LON  # Gravar un payload nou
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import tracemalloc
+
+sys.path.append('/root/projects/dietpink/software/eink/modules')
+
+from forecast_series import ForecastSeries
+from yr_stream import parse_stream, stream_available
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+USER_AGENT = "dietpink/1.0 (github.com/Markuson; hi@marcuson.dev)"
+RUNS = 5
+
+
+def record(lat, lon):
+    """Gravar un payload real de YR a fixtures/"""
+    import requests
+
+    url = "https://api.met.no/weatherapi/locationforecast/2.0/compact"
+    params = {'lat': round(lat, 4), 'lon': round(lon, 4)}
+    response = requests.get(url, params=params,
+                            headers={'User-Agent': USER_AGENT}, timeout=15)
+    response.raise_for_status()
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    path = os.path.join(FIXTURES_DIR, f"locationforecast_{params['lat']}_{params['lon']}.json")
+    with open(path, 'wb') as f:
+        f.write(response.content)
+    print(f"✅ Gravat {path} ({len(response.content) / 1024:.0f} KB)")
+
+
+def parse_full(path):
+    """Camí actual: json complet + columnes"""
+    with open(path, 'rb') as f:
+        data = json.load(f)
+    return ForecastSeries.from_timeseries(data['properties']['timeseries'])
+
+
+def parse_streaming(path):
+    """Camí streaming: ijson element a element"""
+    with open(path, 'rb') as f:
+        return parse_stream(f)
+
+
+def measure(func, path):
+    """Retornar (ms mediana, KB pic, punts)"""
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        series = func(path)
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times.sort()
+    return times[len(times) // 2], peak / 1024, len(series)
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--record':
+        record(float(sys.argv[2]), float(sys.argv[3]))
+        return
+
+    fixtures = sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.json')))
+    if not fixtures:
+        print("⚠️  No hi ha fixtures. Grava'n un amb:")
+        print("   python3 bench_yr_parse.py --record 59.8586 17.6389")
+        sys.exit(1)
+
+    print("🧪 Benchmark parseig YR")
+    print("=" * 50)
+
+    for path in fixtures:
+        size_kb = os.path.getsize(path) / 1024
+        print(f"\n📄 {os.path.basename(path)} ({size_kb:.0f} KB)")
+
+        ms, peak, points = measure(parse_full, path)
+        print(f"   json   : {ms:7.1f} ms  pic {peak:7.0f} KB  ({points} punts)")
+
+        if stream_available():
+            ms, peak, points = measure(parse_streaming, path)
+            print(f"   stream : {ms:7.1f} ms  pic {peak:7.0f} KB  ({points} punts)")
+        else:
+            print("   stream : ijson no instal·lat")
+
+
+if __name__ == "__main__":
+    main()
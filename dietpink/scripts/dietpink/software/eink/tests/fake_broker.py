@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+fake_broker.py - Broker MQTT 3.1.1 mínim per a proves locals
+Suporta CONNECT, SUBSCRIBE (+ i #), PUBLISH QoS 0/1, retained, PING i
+desconnexions forçades. Els missatges s'entreguen sempre amb QoS 0.
+"""
+
+import socket
+import struct
+import threading
+
+
+def topic_matches(topic_filter, topic):
+    """Comprovar si un topic coincideix amb un filtre MQTT"""
+    if topic.startswith('$') and topic_filter[:1] in ('+', '#'):
+        return False
+    f_levels = topic_filter.split('/')
+    t_levels = topic.split('/')
+    for i, level in enumerate(f_levels):
+        if level == '#':
+            return True
+        if i >= len(t_levels):
+            return False
+        if level != '+' and level != t_levels[i]:
+            return False
+    return len(f_levels) == len(t_levels)
+
+
+def _encode_length(n):
+    out = bytearray()
+    while True:
+        byte = n % 128
+        n //= 128
+        if n:
+            byte |= 0x80
+        out.append(byte)
+        if not n:
+            return bytes(out)
+
+
+def _publish_packet(topic, payload, retain=False):
+    topic_b = topic.encode()
+    body = struct.pack('!H', len(topic_b)) + topic_b + payload
+    return bytes([0x30 | (1 if retain else 0)]) + _encode_length(len(body)) + body
+
+
+class _Session:
+    """Connexió d'un client"""
+
+    def __init__(self, broker, sock):
+        self.broker = broker
+        self.sock = sock
+        self.filters = []
+        self.send_lock = threading.Lock()
+
+    def send(self, data):
+        with self.send_lock:
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                pass
+
+    def _recv_exact(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError
+            buf += chunk
+        return bytes(buf)
+
+    def _read_packet(self):
+        header = self._recv_exact(1)[0]
+        length, shift = 0, 0
+        while True:
+            byte = self._recv_exact(1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header, self._recv_exact(length) if length else b''
+
+    def run(self):
+        try:
+            while True:
+                header, body = self._read_packet()
+                kind = header >> 4
+                if kind == 1:      # CONNECT
+                    self.send(b'\x20\x02\x00\x00')
+                elif kind == 3:    # PUBLISH
+                    qos = (header >> 1) & 3
+                    n = struct.unpack_from('!H', body)[0]
+                    topic = body[2:2 + n].decode()
+                    pos = 2 + n
+                    if qos:
+                        packet_id = body[pos:pos + 2]
+                        pos += 2
+                        self.send(b'\x40\x02' + packet_id)
+                    self.broker.publish(topic, body[pos:], retain=bool(header & 1))
+                elif kind == 8:    # SUBSCRIBE
+                    packet_id = body[:2]
+                    pos, granted, new = 2, bytearray(), []
+                    while pos < len(body):
+                        n = struct.unpack_from('!H', body, pos)[0]
+                        topic_filter = body[pos + 2:pos + 2 + n].decode()
+                        pos += 3 + n
+                        new.append(topic_filter)
+                        granted.append(0)
+                    self.filters.extend(new)
+                    self.send(b'\x90' + _encode_length(2 + len(granted)) + packet_id + granted)
+                    self.broker._send_retained(self, new)
+                elif kind == 10:   # UNSUBSCRIBE
+                    self.send(b'\xb0\x02' + body[:2])
+                elif kind == 12:   # PINGREQ
+                    self.send(b'\xd0\x00')
+                elif kind == 14:   # DISCONNECT
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.broker._drop(self)
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+
+
+class FakeBroker:
+    """Broker en memòria escoltant a 127.0.0.1 (port lliure per defecte)"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(16)
+        self.host, self.port = self.server.getsockname()
+
+        self.sessions = []
+        self.retained = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._accept_loop, name="fake_broker", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.kick_all()
+        try:
+            self.server.close()
+        except OSError:
+            pass
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = _Session(self, sock)
+            with self.lock:
+                self.sessions.append(session)
+            threading.Thread(target=session.run, daemon=True).start()
+
+    def _drop(self, session):
+        with self.lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+
+    def _send_retained(self, session, filters):
+        with self.lock:
+            retained = list(self.retained.items())
+        for topic, payload in retained:
+            if any(topic_matches(f, topic) for f in filters):
+                session.send(_publish_packet(topic, payload, retain=True))
+
+    @property
+    def client_count(self):
+        with self.lock:
+            return len(self.sessions)
+
+    def publish(self, topic, payload, retain=False):
+        """Publicar un missatge com si vingués d'un client"""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with self.lock:
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            sessions = list(self.sessions)
+        packet = None
+        for session in sessions:
+            if any(topic_matches(f, topic) for f in session.filters):
+                if packet is None:
+                    packet = _publish_packet(topic, payload)
+                session.send(packet)
+
+    def kick_all(self):
+        """Tancar totes les connexions (simular caiguda del broker)"""
+        with self.lock:
+            sessions = list(self.sessions)
+        for session in sessions:
+            try:
+                session.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+fake_ha.py - Substitut local de Home Assistant per a proves (només stdlib)
+Serveix /api/config per REST i un websocket mínim amb auth, get_states,
+subscribe_trigger (state) i ping
+"""
+
+import json
+import base64
+import struct
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class _WSConnection:
+    """Costat servidor d'una connexió websocket (frames de text)"""
+
+    def __init__(self, rfile, wfile):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.lock = threading.Lock()
+        self.subscriptions = {}  # id -> entity_ids
+
+    def _read_exact(self, n):
+        data = self.rfile.read(n)
+        if len(data) < n:
+            raise ConnectionError
+        return data
+
+    def recv(self):
+        """Següent missatge de text (None si el client tanca)"""
+        while True:
+            b0, b1 = self._read_exact(2)
+            opcode = b0 & 0x0F
+            length = b1 & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', self._read_exact(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', self._read_exact(8))[0]
+            mask = self._read_exact(4) if b1 & 0x80 else None
+            payload = bytearray(self._read_exact(length))
+            if mask:
+                for i in range(length):
+                    payload[i] ^= mask[i % 4]
+            if opcode == 0x8:    # close
+                return None
+            if opcode == 0x9:    # ping de protocol
+                self._send_frame(0xA, bytes(payload))
+                continue
+            if opcode == 0x1:
+                return payload.decode()
+
+    def _send_frame(self, opcode, payload):
+        header = bytearray([0x80 | opcode])
+        if len(payload) < 126:
+            header.append(len(payload))
+        elif len(payload) < 65536:
+            header.append(126)
+            header += struct.pack('!H', len(payload))
+        else:
+            header.append(127)
+            header += struct.pack('!Q', len(payload))
+        with self.lock:
+            self.wfile.write(bytes(header) + payload)
+            self.wfile.flush()
+
+    def send(self, message):
+        self._send_frame(0x1, json.dumps(message).encode())
+
+
+class FakeHomeAssistant:
+    """HA en memòria escoltant a 127.0.0.1 (port lliure per defecte)"""
+
+    def __init__(self, token='test-token', latitude=41.3874, longitude=2.1686, port=0):
+        self.token = token
+        self.config = {'latitude': latitude, 'longitude': longitude,
+                       'time_zone': 'Europe/Madrid', 'version': 'fake'}
+        self.states = {}
+        self.connections = []
+        self.config_requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake_ha", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.drop_connections()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def set_state(self, entity_id, state, attributes=None):
+        """Canviar un estat i notificar els subscriptors (com state_changed)"""
+        new_state = {'entity_id': entity_id, 'state': str(state),
+                     'attributes': attributes or {}}
+        with self.lock:
+            old_state = self.states.get(entity_id)
+            self.states[entity_id] = new_state
+            connections = list(self.connections)
+        for conn in connections:
+            for sub_id, entity_ids in list(conn.subscriptions.items()):
+                if entity_id in entity_ids:
+                    try:
+                        conn.send({'id': sub_id, 'type': 'event', 'event': {'variables': {
+                            'trigger': {'platform': 'state', 'entity_id': entity_id,
+                                        'from_state': old_state, 'to_state': new_state}}}})
+                    except OSError:
+                        pass
+
+    def drop_connections(self):
+        """Tancar tots els websockets (simular reinici de HA)"""
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for conn in connections:
+            try:
+                conn.wfile.write(b'\x88\x00')
+                conn.wfile.flush()
+            except OSError:
+                pass
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _authorized(self):
+                return self.headers.get('Authorization') == f"Bearer {fake.token}"
+
+            def do_GET(self):
+                if self.path == '/api/config':
+                    fake.config_requests += 1
+                    if not self._authorized():
+                        self.send_response(401)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    body = json.dumps(fake.config).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif self.path == '/api/websocket':
+                    self._websocket()
+                else:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+
+            def _websocket(self):
+                key = self.headers.get('Sec-WebSocket-Key', '')
+                accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+                self.send_response(101)
+                self.send_header('Upgrade', 'websocket')
+                self.send_header('Connection', 'Upgrade')
+                self.send_header('Sec-WebSocket-Accept', accept)
+                self.end_headers()
+                self.wfile.flush()
+
+                conn = _WSConnection(self.rfile, self.wfile)
+                try:
+                    conn.send({'type': 'auth_required', 'ha_version': 'fake'})
+                    auth = json.loads(conn.recv() or '{}')
+                    if auth.get('access_token') != fake.token:
+                        conn.send({'type': 'auth_invalid', 'message': 'Invalid access token'})
+                        return
+                    conn.send({'type': 'auth_ok', 'ha_version': 'fake'})
+                    with fake.lock:
+                        fake.connections.append(conn)
+
+                    while True:
+                        raw = conn.recv()
+                        if raw is None:
+                            return
+                        message = json.loads(raw)
+                        kind = message.get('type')
+                        if kind == 'subscribe_trigger':
+                            entity_ids = message['trigger']['entity_id']
+                            if isinstance(entity_ids, str):
+                                entity_ids = [entity_ids]
+                            conn.subscriptions[message['id']] = set(entity_ids)
+                            conn.send({'id': message['id'], 'type': 'result',
+                                       'success': True, 'result': None})
+                        elif kind == 'get_states':
+                            with fake.lock:
+                                states = list(fake.states.values())
+                            conn.send({'id': message['id'], 'type': 'result',
+                                       'success': True, 'result': states})
+                        elif kind == 'ping':
+                            conn.send({'id': message['id'], 'type': 'pong'})
+                        else:
+                            conn.send({'id': message.get('id'), 'type': 'result', 'success': False,
+                                       'error': {'code': 'unknown_command', 'message': kind}})
+                except (ConnectionError, OSError, ValueError):
+                    pass
+                finally:
+                    with fake.lock:
+                        if conn in fake.connections:
+                            fake.connections.remove(conn)
+                    self.close_connection = True
+
+        return Handler
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Prova de càrrega de MQTTHandler contra un broker local (fake_broker.py)
+No cal Home Assistant ni xarxa: el broker escolta a 127.0.0.1
+
+Escenaris:
+    bootstrap  Molts topics retained: temps fins a wait_for_initial()
+    storm      Ràfega de publicacions a molts topics a un ritme objectiu
+    reconnect  Caigudes del broker durant la ràfega i temps de recuperació
+
+Mètriques: latència broker -> _on_message, temps dins _on_message,
+ritme de callbacks, notificacions descartades i contenció del data_lock.
+
+Ús:
+    python3 load_mqtt_handler.py                      # Tots els escenaris
+    python3 load_mqtt_handler.py storm --rate 5000 --topics 200 --seconds 5
+    python3 load_mqtt_handler.py --render-ms 800      # Callback lent (e-ink)
+"""
+
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.append('/root/projects/dietpink/software/eink/modules')
+
+from fake_broker import FakeBroker
+from mqtt_handler import MQTTHandler
+
+
+class ContendedLock:
+    """Lock instrumentat: compta adquisicions, esperes i temps esperat"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.contended = 0
+        self.wait_s = 0.0
+
+    def __enter__(self):
+        if not self.lock.acquire(blocking=False):
+            start = time.perf_counter()
+            self.lock.acquire()
+            self.wait_s += time.perf_counter() - start
+            self.contended += 1
+        self.acquired += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+class Probe:
+    """Instrumentació d'un MQTTHandler (sense tocar el mòdul)"""
+
+    def __init__(self, handler, render_ms):
+        self.handler = handler
+        self.render_s = render_ms / 1000.0
+        self.sent_at = {}       # payload -> perf_counter de publicació
+        self.delivery = []      # broker -> inici de _on_message (s)
+        self.handling = []      # durada de _on_message (s)
+        self.callbacks = []     # instants de callback
+
+        handler.data_lock = ContendedLock()
+        handler.set_data_callback(self._on_data)
+
+        original = handler._on_message
+
+        def timed(client, userdata, msg):
+            start = time.perf_counter()
+            sent = self.sent_at.pop(msg.payload, None)
+            if sent is not None:
+                self.delivery.append(start - sent)
+            original(client, userdata, msg)
+            self.handling.append(time.perf_counter() - start)
+
+        handler.client.on_message = timed
+
+    def _on_data(self, snapshot):
+        self.callbacks.append(time.perf_counter())
+        if self.render_s:
+            time.sleep(self.render_s)
+
+    def reset(self):
+        self.sent_at.clear()
+        self.delivery.clear()
+        self.handling.clear()
+        self.callbacks.clear()
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Percentils en mil·lisegons"""
+    if not samples:
+        return "sense mostres"
+    ordered = sorted(samples)
+    parts = []
+    for p in points:
+        value = ordered[min(len(ordered) - 1, len(ordered) * p // 100)]
+        parts.append(f"p{p}={value * 1000:.2f}")
+    parts.append(f"max={ordered[-1] * 1000:.2f}")
+    return " ".join(parts) + " ms"
+
+
+def make_handler(broker, topics, args):
+    return MQTTHandler(
+        broker=broker.host,
+        port=broker.port,
+        username='load',
+        password='load',
+        topics=topics,
+        coalesce_ms=args.coalesce_ms,
+        history_size=args.history
+    )
+
+
+def publish_storm(broker, probe, topics, rate, seconds, stop=None):
+    """Publicar a 'rate' missatges/s durant 'seconds' (payloads únics)"""
+    topic_list = list(topics.values())
+    interval = 1.0 / rate
+    sent = 0
+    start = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        if now - start >= seconds or (stop is not None and stop.is_set()):
+            break
+        # Recuperar el retard acumulat amb lots
+        due = int((now - start) / interval) - sent
+        for _ in range(max(1, due)):
+            payload = f"{20 + random.random() * 5:.6f}{sent % 10}".encode()
+            probe.sent_at[payload] = time.perf_counter()
+            broker.publish(random.choice(topic_list), payload)
+            sent += 1
+        time.sleep(interval)
+    return sent, time.perf_counter() - start
+
+
+def report(probe, sent, elapsed):
+    handler = probe.handler
+    lock = handler.data_lock
+    received = len(probe.handling)
+    print(f"   Enviats: {sent} en {elapsed:.2f}s ({sent / elapsed:.0f}/s)")
+    print(f"   Processats: {received} ({received / elapsed:.0f}/s)")
+    print(f"   Lliurament broker -> handler: {percentiles(probe.delivery)}")
+    print(f"   Temps a _on_message: {percentiles(probe.handling)}")
+    print(f"   Callbacks: {len(probe.callbacks)} ({len(probe.callbacks) / elapsed:.1f}/s), "
+          f"descartades a la cua: {handler.dropped_notifications}")
+    ratio = lock.contended / lock.acquired * 100 if lock.acquired else 0
+    print(f"   data_lock: {lock.acquired} adquisicions, {lock.contended} amb espera "
+          f"({ratio:.2f}%), {lock.wait_s * 1000:.1f} ms esperant")
+
+
+def scenario_bootstrap(args):
+    print(f"\n📦 Bootstrap: {args.topics} topics retained")
+    broker = FakeBroker().start()
+    topics = {f"s{i}": f"load/sensor/{i}" for i in range(args.topics)}
+    for topic in topics.values():
+        broker.publish(topic, f"{random.uniform(15, 25):.2f}", retain=True)
+
+    handler = make_handler(broker, topics, args)
+    probe = Probe(handler, args.render_ms)
+    start = time.perf_counter()
+    handler.connect()
+    ok = handler.wait_for_initial(timeout=10)
+    elapsed = time.perf_counter() - start
+    print(f"   wait_for_initial: {ok} en {elapsed * 1000:.1f} ms")
+    print(f"   Temps a _on_message: {percentiles(probe.handling)}")
+
+    handler.disconnect()
+    broker.stop()
+
+
+def scenario_storm(args):
+    print(f"\n🌪️  Storm: {args.rate}/s a {args.topics} topics durant {args.seconds}s "
+          f"(render {args.render_ms} ms)")
+    broker = FakeBroker().start()
+    topics = {f"s{i}": f"load/sensor/{i}" for i in range(args.topics)}
+    topics['wildcard'] = 'load/sensor/+'
+
+    handler = make_handler(broker, topics, args)
+    probe = Probe(handler, args.render_ms)
+    handler.connect()
+    while not handler.connected:
+        time.sleep(0.01)
+    time.sleep(0.1)  # SUBACK
+
+    sent, elapsed = publish_storm(broker, probe, topics, args.rate, args.seconds)
+    time.sleep(0.5)  # Buidar el que quedi en vol
+    report(probe, sent, elapsed)
+
+    handler.disconnect()
+    broker.stop()
+
+
+def scenario_reconnect(args):
+    print(f"\n🔁 Reconnect: {args.kicks} caigudes durant una ràfega de {args.rate}/s")
+    broker = FakeBroker().start()
+    topics = {f"s{i}": f"load/sensor/{i}" for i in range(args.topics)}
+    for topic in topics.values():
+        broker.publish(topic, "20.0", retain=True)
+
+    handler = make_handler(broker, topics, args)
+    probe = Probe(handler, args.render_ms)
+    handler.client.reconnect_delay_set(min_delay=1, max_delay=2)
+    handler.connect()
+    handler.wait_for_initial(timeout=10)
+
+    stop = threading.Event()
+    result = {}
+
+    def storm():
+        result['sent'], result['elapsed'] = publish_storm(
+            broker, probe, topics, args.rate, args.seconds * 10, stop)
+
+    thread = threading.Thread(target=storm, daemon=True)
+    thread.start()
+
+    recoveries = []
+    for _ in range(args.kicks):
+        time.sleep(args.seconds / args.kicks)
+        broker.kick_all()
+        down = time.perf_counter()
+        while handler.connected:
+            time.sleep(0.005)
+        while not handler.connected:
+            if time.perf_counter() - down > 10:
+                break
+            time.sleep(0.005)
+        recoveries.append(time.perf_counter() - down)
+
+    stop.set()
+    thread.join()
+    time.sleep(0.5)
+    print(f"   Recuperació: {percentiles(recoveries)}")
+    report(probe, result['sent'], result['elapsed'])
+
+    handler.disconnect()
+    broker.stop()
+
+
+SCENARIOS = {
+    'bootstrap': scenario_bootstrap,
+    'storm': scenario_storm,
+    'reconnect': scenario_reconnect,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prova de càrrega de MQTTHandler")
+    parser.add_argument('scenario', nargs='?', choices=list(SCENARIOS), help="Escenari (per defecte tots)")
+    parser.add_argument('--rate', type=int, default=2000, help="Missatges per segon")
+    parser.add_argument('--topics', type=int, default=100, help="Nombre de topics")
+    parser.add_argument('--seconds', type=float, default=3, help="Durada de la ràfega")
+    parser.add_argument('--kicks', type=int, default=3, help="Caigudes a l'escenari reconnect")
+    parser.add_argument('--render-ms', type=int, default=50, help="Durada simulada del callback")
+    parser.add_argument('--coalesce-ms', type=int, default=200, help="Finestra de coalescència")
+    parser.add_argument('--history', type=int, default=0, help="Mida de l'històric per sensor")
+    args = parser.parse_args()
+
+    print("🧪 Prova de càrrega MQTTHandler")
+    for name, scenario in SCENARIOS.items():
+        if args.scenario in (None, name):
+            scenario(args)
+
+
+if __name__ == "__main__":
+    main()
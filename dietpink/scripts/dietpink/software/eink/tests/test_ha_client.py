@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test de HAClient contra el substitut local de Home Assistant (fake_ha.py)
+Cache de /api/config (TTL i fallback) i websocket d'estats amb reconnexió
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append('/root/projects/dietpink/software/eink/modules')
+
+from fake_ha import FakeHomeAssistant
+from ha_client import HAClient
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_config_cache(ha, cache_path):
+    print("\n📍 /api/config amb cache")
+    client = HAClient(ha.url, ha.token, cache_path=cache_path)
+    assert client.get_coordinates() == (ha.config['latitude'], ha.config['longitude'])
+    assert ha.config_requests == 1
+
+    # Segona arrencada: la cache és vigent, cap petició
+    start = time.perf_counter()
+    client = HAClient(ha.url, ha.token, cache_path=cache_path)
+    coords = client.get_coordinates()
+    print(f"   ✅ Des de cache en {(time.perf_counter() - start) * 1000:.1f} ms: {coords}")
+    assert ha.config_requests == 1
+
+    # TTL vençut: es torna a demanar
+    client = HAClient(ha.url, ha.token, cache_path=cache_path, config_ttl_hours=0)
+    client.get_config()
+    assert ha.config_requests == 2
+    print("   ✅ TTL vençut: refrescada")
+
+    # HA respon amb error: cache antiga com a fallback
+    client = HAClient(ha.url, 'incorrecte', cache_path=cache_path,
+                      config_ttl_hours=0, timeout=1)
+    assert client.get_coordinates() == coords
+    print("   ✅ Error de HA: cache antiga")
+
+    # Una altra instància de HA no aprofita la cache d'aquesta
+    client = HAClient("http://127.0.0.1:1", ha.token, cache_path=cache_path, timeout=1)
+    assert client.get_coordinates() is None
+    print("   ✅ Altra url: cache ignorada")
+
+
+def test_websocket(ha):
+    print("\n🔌 Websocket d'estats")
+    ha.set_state('sensor.balco', '5.5')
+    ha.set_state('sensor.menjador', '21.0')
+    ha.set_state('sensor.altre', '99')
+
+    events = []
+    client = HAClient(ha.url, ha.token, ping_interval=0.5)
+    client.subscribe_states(['sensor.balco', 'sensor.menjador'],
+                            lambda e, s, a: events.append((e, s)))
+    assert client.wait_for_initial(5)
+    assert sorted(events) == [('sensor.balco', '5.5'), ('sensor.menjador', '21.0')]
+    print(f"   ✅ Estats inicials: {events}")
+
+    start = time.perf_counter()
+    ha.set_state('sensor.balco', '6.0')
+    ha.set_state('sensor.altre', '100')  # No subscrita
+    assert wait_until(lambda: client.get_state('sensor.balco')[0] == '6.0')
+    print(f"   ✅ Canvi rebut en {(time.perf_counter() - start) * 1000:.1f} ms")
+    assert ('sensor.altre', '100') not in events
+
+    # Pings de manteniment sense trànsit
+    time.sleep(1.5)
+    assert client.connected
+    print("   ✅ Connexió viva amb pings")
+
+    # Reinici de HA: reconnexió i relectura d'estats
+    ha.drop_connections()
+    ha.set_state('sensor.menjador', '22.5')
+    assert wait_until(lambda: client.get_state('sensor.menjador')[0] == '22.5', timeout=10)
+    print("   ✅ Reconnectat i estat recuperat")
+
+    client.stop()
+
+
+def test_bad_token(ha):
+    print("\n🔒 Token invàlid")
+    client = HAClient(ha.url, 'incorrecte')
+    client.subscribe_states(['sensor.balco'], lambda e, s, a: None)
+    assert not client.wait_for_initial(1)
+    client.stop()
+    print("   ✅ Rebutjat sense estats")
+
+
+def main():
+    ha = FakeHomeAssistant().start()
+    cache_path = os.path.join(tempfile.mkdtemp(prefix="dietpink_ha_"), 'ha_config.json')
+
+    print("🧪 Test HAClient")
+    try:
+        test_config_cache(ha, cache_path)
+        test_websocket(ha)
+        test_bad_token(ha)
+    finally:
+        ha.stop()
+    print("\n✅ Tots els tests han passat")
+
+
+if __name__ == "__main__":
+    main()
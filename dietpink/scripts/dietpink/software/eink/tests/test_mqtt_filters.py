@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test dels filtres de MQTTHandler contra el broker local (fake_broker.py)
+min_interval: un canvi retingut dins l'interval arriba al callback quan
+l'interval venç, encara que el sensor no torni a publicar
+"""
+
+import sys
+import time
+
+sys.path.append('/root/projects/dietpink/software/eink/modules')
+
+from fake_broker import FakeBroker
+from mqtt_handler import MQTTHandler
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_min_interval_trailing(broker):
+    print("\n⏱️  min_interval amb flanc final")
+    snapshots = []
+    handler = MQTTHandler('127.0.0.1', broker.port, 'user', 'pass',
+                          {'balco': 'test/balco'}, coalesce_ms=0,
+                          filters={'balco': {'min_interval': 1}})
+    handler.set_data_callback(lambda snapshot: snapshots.append(snapshot['balco']))
+    assert handler.connect()
+    assert wait_until(lambda: broker.client_count == 1 and handler.connected)
+    time.sleep(0.2)  # SUBSCRIBE processat
+
+    # A es notifica; B arriba dins l'interval i queda retingut
+    broker.publish('test/balco', '10.0')
+    assert wait_until(lambda: snapshots == [10.0])
+    start = time.monotonic()
+    broker.publish('test/balco', '12.0')
+    assert wait_until(lambda: handler.get_snapshot()['balco'] == 12.0)
+    time.sleep(0.2)
+    assert snapshots == [10.0]
+    print("   ✅ B retingut dins l'interval")
+
+    # Sense més missatges: B arriba quan venç l'interval
+    assert wait_until(lambda: snapshots == [10.0, 12.0], timeout=3)
+    print(f"   ✅ B notificat al cap de {time.monotonic() - start:.2f} s")
+    assert handler.get_filter_stats()['balco']['forwarded'] == 2
+
+    # Un canvi fora de l'interval segueix passant directe
+    time.sleep(1.1)
+    broker.publish('test/balco', '13.0')
+    assert wait_until(lambda: snapshots == [10.0, 12.0, 13.0])
+    assert not handler.trailing
+    print("   ✅ Fora de l'interval: notificat directe")
+
+    handler.disconnect()
+
+
+def main():
+    broker = FakeBroker().start()
+
+    print("🧪 Test filtres MQTT")
+    try:
+        test_min_interval_trailing(broker)
+    finally:
+        broker.stop()
+    print("\n✅ Tots els tests han passat")
+
+
+if __name__ == "__main__":
+    main()
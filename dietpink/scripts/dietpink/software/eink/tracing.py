@@ -0,0 +1,274 @@
+"""
+tracing - Lightweight end-to-end latency tracing for dietpink
+Spans share a correlation (trace) ID from the MQTT message to the end of
+the panel's BUSY wait. Sampled traces go to an in-memory ring buffer and
+can be exported as Chrome trace JSON (chrome://tracing, ui.perfetto.dev)
+"""
+
+import json
+import time
+import random
+import itertools
+from collections import deque
+from threading import Lock, local, get_ident, current_thread
+
+try:
+    from threading import get_native_id
+except ImportError:
+    get_native_id = get_ident
+
+
+class _NullSpan:
+    """Returned when no trace is active: costs one attribute lookup"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'trace_id', 'args', 'start')
+
+    def __init__(self, tracer, name, trace_id, args):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.record(self.name, self.start, time.monotonic(), self.trace_id, **self.args)
+        return False
+
+    def set(self, **args):
+        """Attach extra arguments to the span"""
+        self.args.update(args)
+
+
+class _Activation:
+    __slots__ = ('tracer', 'trace_id', 'previous')
+
+    def __init__(self, tracer, trace_id):
+        self.tracer = tracer
+        self.trace_id = trace_id
+
+    def __enter__(self):
+        self.previous = getattr(self.tracer._local, 'trace_id', None)
+        self.tracer._local.trace_id = self.trace_id
+        return self.trace_id
+
+    def __exit__(self, *exc):
+        self.tracer._local.trace_id = self.previous
+        return False
+
+
+class Tracer:
+    """
+    Trace recorder
+
+    A trace starts with new_trace() (subject to sampling). Work on other
+    threads joins it with activate(trace_id); span() then attributes the
+    timed block to the active trace. Spans whose start happened earlier
+    (queue waits) are added with record().
+    """
+
+    def __init__(self, capacity=4096, sample_rate=0.0):
+        """
+        Args:
+            capacity: Spans kept in the ring buffer
+            sample_rate: Fraction of new_trace() calls that are recorded (0 = off)
+        """
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.spans = deque(maxlen=capacity)
+        self.starts = {}  # trace_id -> start time (open traces)
+        self.lock = Lock()
+        self._ids = itertools.count(1)
+        self._local = local()
+        self.thread_names = {0: 'traces'}
+        self.pid = 1
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def configure(self, sample_rate=None, capacity=None):
+        with self.lock:
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if capacity is not None and capacity != self.capacity:
+                self.capacity = capacity
+                self.spans = deque(self.spans, maxlen=capacity)
+
+    def new_trace(self, start=None):
+        """
+        Start a trace
+
+        Returns:
+            int trace ID, or None if not sampled
+        """
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return None
+        trace_id = next(self._ids)
+        with self.lock:
+            if len(self.starts) >= self.capacity:
+                self.starts.clear()  # Traces that never finished
+            self.starts[trace_id] = time.monotonic() if start is None else start
+        return trace_id
+
+    def finish(self, trace_id, end=None):
+        """
+        Close a trace and record its end-to-end span
+
+        Returns:
+            float seconds from new_trace() to end, or None
+        """
+        if trace_id is None:
+            return None
+        with self.lock:
+            start = self.starts.pop(trace_id, None)
+        if start is None:
+            return None
+        end = time.monotonic() if end is None else end
+        self.record('trace', start, end, trace_id, tid=0)
+        return end - start
+
+    def discard(self, trace_id):
+        """Drop an open trace that will not reach the panel"""
+        if trace_id is not None:
+            with self.lock:
+                self.starts.pop(trace_id, None)
+
+    def current(self):
+        """Trace ID active on this thread (or None)"""
+        return getattr(self._local, 'trace_id', None)
+
+    def activate(self, trace_id):
+        """Context manager: make trace_id the active trace on this thread"""
+        return _Activation(self, trace_id)
+
+    def span(self, name, trace_id=None, **args):
+        """Context manager timing a block within the active (or given) trace"""
+        if trace_id is None:
+            trace_id = getattr(self._local, 'trace_id', None)
+            if trace_id is None:
+                return _NULL_SPAN
+        return _Span(self, name, trace_id, args)
+
+    def record(self, name, start, end, trace_id=None, tid=None, **args):
+        """Add a finished span (start/end from time.monotonic())"""
+        if trace_id is None:
+            trace_id = getattr(self._local, 'trace_id', None)
+            if trace_id is None:
+                return
+        if tid is None:
+            tid = get_native_id()
+            if tid not in self.thread_names:
+                self.thread_names[tid] = current_thread().name
+        self.spans.append((name, trace_id, start, end, tid, args))
+
+    def traces(self):
+        """
+        Spans grouped by trace
+
+        Returns:
+            dict trace_id -> list of (name, start offset ms, duration ms)
+        """
+        grouped = {}
+        for name, trace_id, start, end, _, _ in list(self.spans):
+            grouped.setdefault(trace_id, []).append((name, start, end))
+        result = {}
+        for trace_id, spans in grouped.items():
+            origin = min(start for _, start, _ in spans)
+            result[trace_id] = sorted(((name, (start - origin) * 1000, (end - start) * 1000)
+                                       for name, start, end in spans), key=lambda row: row[1])
+        return result
+
+    def chrome_trace(self):
+        """Spans as a Chrome trace dict (complete 'X' events, microseconds)"""
+        events = []
+        threads = {}
+        for name, trace_id, start, end, tid, args in list(self.spans):
+            event_args = {'trace': trace_id}
+            event_args.update(args)
+            events.append({
+                'name': name, 'cat': 'dietpink', 'ph': 'X', 'pid': self.pid, 'tid': tid,
+                'ts': round(start * 1e6, 3), 'dur': round((end - start) * 1e6, 3),
+                'args': event_args
+            })
+            threads.setdefault(tid, None)
+        for tid in threads:
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+                           'args': {'name': self.thread_names.get(tid, f"thread {tid}")}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome(self, path):
+        """Write the ring buffer as Chrome trace JSON; returns the span count"""
+        trace = self.chrome_trace()
+        with open(path, 'w') as f:
+            json.dump(trace, f)
+        return len(trace['traceEvents'])
+
+
+# Process-wide tracer (disabled until configured)
+TRACER = Tracer()
+
+
+def span(name, **args):
+    """Span on the process-wide tracer (no-op without an active trace)"""
+    return TRACER.span(name, **args)
+
+
+# Module test
+if __name__ == "__main__":
+    from threading import Thread
+
+    TRACER.configure(sample_rate=1.0)
+    handoff = deque()
+
+    def network():
+        trace_id = TRACER.new_trace()
+        with TRACER.activate(trace_id), span('mqtt.message', topic='balco'):
+            time.sleep(0.001)
+        handoff.append((trace_id, time.monotonic()))
+
+    def renderer():
+        trace_id, queued = handoff.popleft()
+        TRACER.record('render.queue', queued, time.monotonic(), trace_id)
+        with TRACER.activate(trace_id):
+            with span('ui.render'):
+                time.sleep(0.02)
+            with span('epd.busy'):
+                time.sleep(0.05)
+        return TRACER.finish(trace_id)
+
+    for _ in range(3):
+        t = Thread(target=network)
+        t.start()
+        t.join()
+        time.sleep(0.01)
+        print(f"🔎 Trace: {renderer() * 1000:.1f} ms")
+
+    for trace_id, spans in TRACER.traces().items():
+        print(f"   #{trace_id}: " + ", ".join(f"{n} +{s:.1f}/{d:.1f}ms" for n, s, d in spans))
+    print(f"   Exported {TRACER.export_chrome('/tmp/dietpink_trace.json')} events")
+
+    n = 100000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with span('disabled'):
+            pass
+    print(f"   span() with no active trace: {(time.perf_counter() - t0) / n * 1e9:.0f} ns")
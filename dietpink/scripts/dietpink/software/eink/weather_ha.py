@@ -5,17 +5,19 @@ Mostra temperatures de Home Assistant + previsió YR al display e-ink
 
 Arquitectura:
 - MQTT: Temperatures en temps real (on-demand)
+  (o websocket de HA si es configuren homeassistant.entities)
 - YR API: Previsió cada 3h (00:00, 03:00, 06:00, etc.)
-- UI: Update quan canvien dades
+- UI: Update quan canvien dades (thread renderer sobre un StateStore)
+- Config: Canvis a weather_config.json aplicats en calent (ConfigWatcher)
 """
 
 import sys
 import json
 import time
-import requests
 import signal
 from datetime import datetime, timedelta
-from threading import Thread, Event
+from threading import Event, Thread, Lock
+from collections import deque
 
 # Afegir paths dels mòduls
 sys.path.append('/root/projects/dietpink/software/eink/modules')
@@ -23,6 +25,41 @@ sys.path.append('/root/projects/dietpink/software/eink/modules')
 from mqtt_handler import MQTTHandler
 from yr_weather import YRWeatherClient
 from weather_ui import WeatherUI
+from scheduler import TimerScheduler
+from sensor_store import SensorStore
+from task_graph import TaskGraph
+from state_store import StateStore
+from ha_client import HAClient
+from config_watcher import ConfigWatcher, diff_config
+from log_setup import setup_logging, shutdown_logging, get_logger
+from metrics import MetricsServer, counter, gauge, histogram
+from tracing import TRACER, span
+from profiling import ServiceProfiler
+
+log = get_logger('weather')
+
+RENDER_MS = histogram('dietpink_render_ms', 'State snapshot to panel updated (UI draw + refresh)')
+RENDER_ERRORS = counter('dietpink_render_errors_total', 'Failed renders')
+TRACE_E2E_MS = histogram('dietpink_trace_e2e_ms', 'Traced sensor message to end of panel BUSY')
+
+# Cache persistent de la previsió YR
+YR_CACHE_PATH = '/root/projects/dietpink/software/eink/cache/yr_forecast.json'
+
+# Perfils de CPU i memòria (SIGUSR1 / SIGUSR2)
+LOGS_DIR = '/root/projects/dietpink/software/eink/logs'
+
+# Cache de /api/config de Home Assistant (coordenades)
+HA_CONFIG_CACHE_PATH = '/root/projects/dietpink/software/eink/cache/ha_config.json'
+
+# Claus que no es poden aplicar en calent (cal reiniciar el servei)
+RESTART_KEYS = {
+    'mqtt.history_size', 'mqtt.history_windows', 'mqtt.history_max_keys',
+    'mqtt.store_dir', 'mqtt.store_flush_s', 'mqtt.initial_timeout', 'homeassistant.entities',
+    'homeassistant.initial_timeout', 'yr_api.cache_path', 'yr_api.stream_parse',
+    'reload_config'
+}
+# Seccions senceres que només es llegeixen en arrencar
+RESTART_SECTIONS = {'metrics', 'profiling'}
 
 
 class WeatherDisplay:
@@ -39,23 +76,52 @@ class WeatherDisplay:
         print("=" * 50)
         
         # Carregar configuració
+        self.config_path = config_path
         with open(config_path, 'r') as f:
             self.config = json.load(f)
+        self.config_watcher = None
+        self.metrics_server = None
+        setup_logging(self.config.get('logging'))
+        self._configure_tracing()
         
         # Estat del sistema
         self.running = True
         self.shutdown_event = Event()
         
-        # Dades actuals
-        self.temp_interior = 0.0
-        self.temp_exterior = 0.0
-        self.forecast = None
+        # Dades actuals (None = encara no rebudes). MQTT i YR hi escriuen;
+        # el renderer llegeix snapshots consistents
+        self.state = StateStore({
+            'temp_interior': None,
+            'temp_exterior': None,
+            'forecast': None
+        })
         self.coordinates = None
         
         # Mòduls
         self.ui = None
         self.mqtt = None
         self.yr_client = None
+        self.ha = self._create_ha_client()
+        # Sensor -> entity_id: si hi és, les temperatures arriben pel websocket de HA
+        self.ha_entities = self.config['homeassistant'].get('entities') or {}
+        self.scheduler = TimerScheduler()
+        profiling_config = self.config.get('profiling', {})
+        self.profiler = ServiceProfiler(
+            profiling_config.get('log_dir', LOGS_DIR),
+            defer=lambda func: self.scheduler.call_later(0, func, name="profiling"),
+            top=profiling_config.get('top', 30),
+            tracemalloc_frames=profiling_config.get('tracemalloc_frames', 1),
+            tracemalloc_at_start=profiling_config.get('tracemalloc_at_start', False)
+        )
+        self.yr_job = None
+        self.store = None
+        
+        # Renderer: únic thread que dibuixa al panell
+        self.render_thread = None
+        # Traces pendents de dibuixar: (versió, trace_id, instant de l'update)
+        self.pending_traces = deque()
+        self.traces_lock = Lock()
+        self.render_coalesce_s = self.config.get('display', {}).get('render_coalesce_ms', 100) / 1000.0
         
         # Timestamps
         self.last_display_update = None
@@ -64,199 +130,520 @@ class WeatherDisplay:
         print("✅ Configuració carregada")
     
     def setup(self):
-        """Configurar tots els mòduls"""
+        """
+        Configurar tots els mòduls
+        
+        Les dependències s'inicialitzen en paral·lel (TaskGraph): panell,
+        cache YR, coordenades de HA i MQTT. El primer frame (previsió de
+        cache, temperatures pendents) es mostra tan bon punt el panell està
+        llest, i el renderer el completa a mesura que arriba cada font
+        (cada font escriu al StateStore). L'arrencada dura
+        el que la dependència més lenta, no la suma de totes.
+        """
+        self.scheduler.start()
+        self._start_metrics()
+        
+        graph = TaskGraph("setup")
+        graph.add('ui', self._setup_ui)
+        graph.add('yr', self._setup_yr)
+        graph.add('coords', self._setup_coordinates)
+        if self.ha_entities:
+            graph.add('sensors', self._setup_ha_sensors)
+        else:
+            graph.add('sensors', self._setup_mqtt)
+        graph.add('renderer', self._start_renderer, deps=['ui', 'yr'])
+        graph.add('yr_schedule', self._setup_yr_schedule, deps=['coords', 'yr'])
+        graph.run()
         
-        # 1. Obtenir coordenades de Home Assistant
-        print("\n📍 Obtenint coordenades de Home Assistant...")
-        if not self._get_coordinates():
-            print("⚠️  No s'han pogut obtenir coordenades, usant Uppsala per defecte")
-            self.coordinates = (59.8586, 17.6389)
+        print("\n⏱️  Arrencada:")
+        for name, begin, duration in graph.timings():
+            print(f"   {name:12s} +{begin:5.2f}s  {duration:5.2f}s")
+        
+        if graph.failed('sensors'):
+            print("❌ Error connectant la font de temperatures")
+            return False
+        if graph.failed('renderer'):
+            # Sense renderer (ha fallat ui o yr) el servei correria sense panell
+            print("❌ Error inicialitzant el renderer")
+            return False
         
-        # 2. Inicialitzar UI
+        if self.config.get('reload_config', True):
+            self.config_watcher = ConfigWatcher(self.config_path, self._on_config_changed).start()
+        
+        print("\n" + "=" * 50)
+        print("✅ Sistema inicialitzat correctament!")
+        print("=" * 50)
+        
+        return True
+    
+    def _start_metrics(self):
+        """Servir les mètriques en format Prometheus (si està activat)"""
+        metrics_config = self.config.get('metrics', {})
+        if not metrics_config.get('enabled', False):
+            return
+        try:
+            self.metrics_server = MetricsServer(
+                host=metrics_config.get('host', '127.0.0.1'),
+                port=metrics_config.get('port', 9105),
+                routes={'/trace': lambda: ('application/json',
+                                           json.dumps(TRACER.chrome_trace()).encode())}
+            ).start()
+            print(f"📈 Mètriques a http://{metrics_config.get('host', '127.0.0.1')}:"
+                  f"{self.metrics_server.port}/metrics")
+        except OSError as e:
+            print(f"⚠️  No s'ha pogut obrir el port de mètriques: {e}")
+            return
+        
+        gauge('dietpink_state_version', 'StateStore version').set_function(lambda: self.state.version)
+        gauge('dietpink_yr_forecast_age_seconds', 'Age of the current forecast').set_function(
+            lambda: (datetime.now() - self.yr_client.last_update).total_seconds()
+            if self.yr_client and self.yr_client.last_update else float('nan'))
+    
+    def _configure_tracing(self):
+        """Aplicar la secció 'tracing' (sample_rate 0 = desactivat)"""
+        tracing_config = self.config.get('tracing', {})
+        TRACER.configure(sample_rate=tracing_config.get('sample_rate', 0.0),
+                         capacity=tracing_config.get('capacity', 4096))
+    
+    def _create_ha_client(self):
+        """Client de Home Assistant segons la config actual"""
+        ha_config = self.config['homeassistant']
+        return HAClient(
+            ha_config['url'],
+            ha_config['token'],
+            cache_path=ha_config.get('config_cache_path', HA_CONFIG_CACHE_PATH),
+            config_ttl_hours=ha_config.get('config_ttl_hours', 24)
+        )
+    
+    def _setup_ui(self):
+        """Tasca d'arrencada: inicialitzar el panell (init + Clear)"""
         print("\n🖼️  Inicialitzant UI...")
         self.ui = WeatherUI()
         print("✅ UI ready")
-        
-        # 3. Inicialitzar YR client
+    
+    def _setup_yr(self):
+        """Tasca d'arrencada: client YR amb la previsió de la cache de disc"""
         print("\n🌤️  Inicialitzant YR Weather client...")
+        yr_config = self.config['yr_api']
+        # Sense coordenades: la cache aporta les de l'últim fetch
         self.yr_client = YRWeatherClient(
-            user_agent=self.config['yr_api']['user_agent'],
-            lat=self.coordinates[0],
-            lon=self.coordinates[1]
+            user_agent=yr_config['user_agent'],
+            cache_path=yr_config.get('cache_path', YR_CACHE_PATH),
+            max_age_hours=yr_config['update_interval_hours'],
+            stream_parse=yr_config.get('stream_parse', False)
         )
+        forecast = self.yr_client.get_cached_forecast()
+        if forecast['success']:
+            state = "antiga" if forecast['stale'] else "vigent"
+            print(f"   ✅ Previsió de cache ({state})")
+        self.state.update(forecast=forecast)
         print("✅ YR client ready")
-        
-        # 4. Obtenir primera previsió
-        print("\n🌐 Obtenint previsió inicial...")
-        self.forecast = self.yr_client.get_forecast()
-        
-        # 5. Inicialitzar MQTT
+    
+    def _setup_coordinates(self):
+        """Tasca d'arrencada: coordenades fixes de la config o de Home Assistant"""
+        fixed = self.config['yr_api'].get('coordinates')
+        if fixed:
+            self.coordinates = tuple(fixed)
+            print(f"\n📍 Coordenades de la config: {self.coordinates}")
+            return
+        print("\n📍 Obtenint coordenades de Home Assistant...")
+        self._get_coordinates()
+    
+    def _setup_yr_schedule(self):
+        """Tasca d'arrencada: fixar la ubicació i planificar el fetch YR"""
+        if self.coordinates is None:
+            if self.yr_client.lat is not None:
+                print("⚠️  Sense coordenades de HA, usant les de la cache YR")
+                self.coordinates = (self.yr_client.lat, self.yr_client.lon)
+            else:
+                print("⚠️  No s'han pogut obtenir coordenades, usant Uppsala per defecte")
+                self.coordinates = (59.8586, 17.6389)
+        
+        moved = self.yr_client.set_coordinates(*self.coordinates)
+        # Fetch immediat si la cache és antiga o d'una altra ubicació
+        self._schedule_yr_update(0.0 if moved or self.yr_client.is_stale() else None)
+    
+    def _setup_mqtt(self):
+        """Tasca d'arrencada: connectar MQTT i esperar els valors retained"""
         print("\n📡 Inicialitzant MQTT handler...")
         mqtt_config = self.config['mqtt']
+        
+        # Històric persistent a disc (opcional)
+        if mqtt_config.get('store_dir'):
+            self.store = SensorStore(mqtt_config['store_dir'],
+                                     flush_interval=mqtt_config.get('store_flush_s', 60))
+            self.store.start()
+            # Compactar cada dia a les 03:00 (i un cop poc després d'arrencar)
+            self.scheduler.call_later(60, self._compact_history, name="compact_history")
+            self.scheduler.call_every(86400, self._compact_history, name="compact_history",
+                                      align=True, offset=3 * 3600)
+        
         self.mqtt = MQTTHandler(
             broker=mqtt_config['broker'],
             port=mqtt_config['port'],
             username=mqtt_config['username'],
             password=mqtt_config['password'],
-            topics=mqtt_config['topics']
+            topics=mqtt_config['topics'],
+            coalesce_ms=mqtt_config.get('coalesce_ms', 200),
+            qos=mqtt_config.get('qos', 0),
+            history_size=mqtt_config.get('history_size', 0),
+            history_windows=mqtt_config.get('history_windows', (3600, 86400)),
+            store=self.store,
+            filters=mqtt_config.get('filters'),
+            history_max_keys=mqtt_config.get('history_max_keys', 64)
         )
         
         # Configurar callback MQTT
         self.mqtt.set_data_callback(self._on_temperature_change)
         
         # Connectar MQTT
-        if self.mqtt.connect():
-            print("✅ MQTT connectat")
-        else:
-            print("❌ Error connectant MQTT")
-            return False
+        if not self.mqtt.connect():
+            raise RuntimeError("no s'ha pogut connectar al broker")
+        print("✅ MQTT connectat")
         
-        # 6. Esperar primers missatges MQTT (màxim 5 segons)
+        # Esperar valors retained (sortir en quant arribin tots)
         print("\n⏳ Esperant temperatures inicials...")
-        time.sleep(5)
-        self.temp_interior, self.temp_exterior = self.mqtt.get_temperatures()
+        start = time.monotonic()
+        if self.mqtt.wait_for_initial(['balco', 'menjador'],
+                                      timeout=mqtt_config.get('initial_timeout', 5)):
+            print(f"   ✅ Temperatures rebudes en {(time.monotonic() - start) * 1000:.0f} ms")
+        else:
+            print("   ⚠️  Timeout: falten temperatures, continuant igualment")
+        temp_balco, temp_menjador = self.mqtt.get_temperatures()
+        self.state.update(temp_interior=temp_menjador, temp_exterior=temp_balco)
+    
+    def _setup_ha_sensors(self, wait=True):
+        """
+        Tasca d'arrencada: temperatures pel websocket de Home Assistant
         
-        # 7. Mostrar UI inicial
-        print("\n🎨 Renderitzant UI inicial...")
-        self._update_display()
+        Args:
+            wait: Esperar els estats inicials (fins a initial_timeout)
+        """
+        print("\n📡 Subscrivint entitats de Home Assistant...")
+        names = {entity_id: name for name, entity_id in self.ha_entities.items()}
         
-        print("\n" + "=" * 50)
-        print("✅ Sistema inicialitzat correctament!")
-        print("=" * 50)
+        def on_state(entity_id, state, attributes):
+            try:
+                value = float(state)
+            except (TypeError, ValueError):
+                return  # 'unavailable', 'unknown'...
+            with TRACER.activate(TRACER.new_trace()):
+                self._on_temperature_change({names[entity_id]: value})
         
-        return True
+        self.ha.subscribe_states(list(names), on_state)
+        if not wait:
+            return
+        
+        print("\n⏳ Esperant temperatures inicials...")
+        start = time.monotonic()
+        if self.ha.wait_for_initial(timeout=self.config['homeassistant'].get('initial_timeout', 5)):
+            print(f"   ✅ Temperatures rebudes en {(time.monotonic() - start) * 1000:.0f} ms")
+        else:
+            print("   ⚠️  Timeout: falten temperatures, continuant igualment")
+    
+    def _start_renderer(self):
+        """Tasca d'arrencada: iniciar el renderer (dibuixa el primer frame)"""
+        print("\n🎨 Renderitzant UI inicial...")
+        self.render_thread = Thread(target=self._render_loop, name="renderer", daemon=True)
+        self.render_thread.start()
     
     def _get_coordinates(self):
-        """Obtenir coordenades de Home Assistant API"""
-        try:
-            headers = {
-                'Authorization': f"Bearer {self.config['homeassistant']['token']}",
-                'Content-Type': 'application/json'
-            }
-            
-            url = f"{self.config['homeassistant']['url']}/api/config"
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            config = response.json()
-            lat = config['latitude']
-            lon = config['longitude']
-            
-            self.coordinates = (lat, lon)
-            print(f"   ✅ Coordenades: ({lat}, {lon})")
-            return True
-            
-        except Exception as e:
-            print(f"   ⚠️  Error: {e}")
+        """Obtenir coordenades de Home Assistant (cache de /api/config)"""
+        coordinates = self.ha.get_coordinates()
+        if coordinates is None:
             return False
+        
+        self.coordinates = coordinates
+        print(f"   ✅ Coordenades: {coordinates}")
+        return True
     
-    def _on_temperature_change(self, temp_balco, temp_menjador):
+    def _on_config_changed(self, new_config):
         """
-        Callback quan canvien les temperatures via MQTT
+        Callback del ConfigWatcher: aplicar només les parts que han canviat
+        
+        El panell, el renderer, les caches i l'històric no es toquen;
+        MQTT es resubscriu (o reconnecta), YR es reubica o replanifica.
         
         Args:
-            temp_balco: Temperatura exterior
-            temp_menjador: Temperatura interior
+            new_config: dict amb la configuració nova (ja validada com a JSON)
         """
-        print(f"\n🔔 Temperatures actualitzades: IN={temp_menjador}°C, OUT={temp_balco}°C")
+        changed = diff_config(self.config, new_config)
+        if not changed:
+            return
+        start = time.perf_counter()
+        print(f"\n🔄 Config canviada: {', '.join(sorted(changed))}")
+        
+        pending = sorted(key for key in changed
+                         if key in RESTART_KEYS or key.split('.', 1)[0] in RESTART_SECTIONS)
+        if pending:
+            print(f"   ⚠️  Requereixen reiniciar el servei: {', '.join(pending)}")
+        
+        # Els helpers llegeixen self.config: la nova queda vigent només si
+        # tot s'aplica; si no, el pròxim desat torna a provar els mateixos canvis
+        old_config, self.config = self.config, new_config
+        try:
+            self._apply_config_changes(changed, new_config)
+        except Exception:
+            self.config = old_config
+            raise
         
-        self.temp_interior = temp_menjador
-        self.temp_exterior = temp_balco
+        print(f"   ✅ Config aplicada en {(time.perf_counter() - start) * 1000:.0f} ms")
+    
+    def _apply_config_changes(self, changed, new_config):
+        """Aplicar les claus canviades (self.config ja és new_config)"""
+        mqtt_config = new_config.get('mqtt', {})
+        if self.mqtt is not None:
+            if changed & {'mqtt.broker', 'mqtt.port', 'mqtt.username', 'mqtt.password'}:
+                self.mqtt.reconnect(mqtt_config['broker'], mqtt_config['port'],
+                                    mqtt_config['username'], mqtt_config['password'])
+            if changed & {'mqtt.topics', 'mqtt.qos'}:
+                self.mqtt.set_topics(mqtt_config['topics'], qos=mqtt_config.get('qos', 0))
+            if 'mqtt.filters' in changed:
+                self.mqtt.set_filters(mqtt_config.get('filters'))
+            if 'mqtt.coalesce_ms' in changed:
+                self.mqtt.coalesce_s = mqtt_config.get('coalesce_ms', 200) / 1000.0
+        
+        ha_changed = {key for key in changed if key.startswith('homeassistant.')}
+        if ha_changed - {'homeassistant.entities'}:
+            old_ha, self.ha = self.ha, self._create_ha_client()
+            if self.ha_entities:
+                old_ha.stop()
+                # Sense esperar els estats: arriben pel callback i el
+                # thread del watcher no es bloqueja
+                self._setup_ha_sensors(wait=False)
+        
+        yr_config = new_config['yr_api']
+        if 'yr_api.user_agent' in changed:
+            self.yr_client.user_agent = yr_config['user_agent']
+        if 'yr_api.update_interval_hours' in changed:
+            self.yr_client.max_age = timedelta(hours=yr_config['update_interval_hours'])
+        
+        moved = False
+        ha_moved = changed & {'homeassistant.url', 'homeassistant.token'}
+        if 'yr_api.coordinates' in changed or ha_moved:
+            if ha_moved:
+                # La cache de /api/config podria ser de l'altra instància
+                self.ha.clear_config_cache()
+            self.coordinates = None
+            self._setup_coordinates()
+            if self.coordinates is not None:
+                moved = self.yr_client.set_coordinates(*self.coordinates)
+        
+        if moved:
+            self._schedule_yr_update(0.0)
+        elif changed & {'yr_api.update_interval_hours', 'yr_api.update_start_hour'}:
+            self._schedule_yr_update()
+        
+        if any(key.startswith('logging') for key in changed):
+            setup_logging(new_config.get('logging'))
+        if any(key.startswith('tracing') for key in changed):
+            self._configure_tracing()
+        
+        if 'display.render_coalesce_ms' in changed:
+            self.render_coalesce_s = new_config.get('display', {}).get('render_coalesce_ms', 100) / 1000.0
+    
+    def _on_temperature_change(self, snapshot):
+        """
+        Callback quan canvien les temperatures (MQTT o websocket de HA)
         
-        # Update display
-        self._update_display()
+        Args:
+            snapshot: dict sensor -> valor ('balco' exterior, 'menjador' interior)
+        """
+        changes = {}
+        if 'menjador' in snapshot:
+            changes['temp_interior'] = snapshot['menjador']
+        if 'balco' in snapshot:
+            changes['temp_exterior'] = snapshot['balco']
+        
+        # Les dues temperatures en un sol canvi de versió
+        trace_id = TRACER.current()
+        before = self.state.version
+        with span('state.update'):
+            version = self.state.update(changes)
+        if trace_id is not None:
+            if version > before:
+                with self.traces_lock:
+                    self.pending_traces.append((version, trace_id, time.monotonic()))
+            else:
+                TRACER.discard(trace_id)  # Sense canvis: no hi haurà render
+        current = self.state.snapshot()
+        log.info("🔔 Temperatures: IN=%s°C, OUT=%s°C",
+                 current['temp_interior'], current['temp_exterior'])
     
-    def _update_display(self):
-        """Actualitzar display amb dades actuals"""
+    def _on_forecast_refreshed(self, forecast):
+        """
+        Callback quan el refresc de fons de YR obté una previsió nova
+        
+        Args:
+            forecast: Dict amb la previsió nova
+        """
+        self.last_yr_update = datetime.now()
+        self.state.update(forecast=forecast)
+    
+    def _render_loop(self):
+        """
+        Thread renderer: dormir fins a un canvi de versió i dibuixar
+        
+        Els canvis que arriben durant la finestra de coalescència (o mentre
+        el panell refresca) s'agrupen en un sol render.
+        """
+        version = -1  # Dibuixar també l'estat inicial
+        while self.running:
+            snapshot = self.state.wait(version)
+            if snapshot is None:
+                return
+            
+            if self.render_coalesce_s > 0:
+                time.sleep(self.render_coalesce_s)
+                snapshot = self.state.snapshot()
+            
+            version = snapshot.version
+            trace_id, coalesced = self._take_traces(version)
+            if trace_id is None:
+                with self.profiler.section():
+                    self._update_display(snapshot)
+                continue
+            
+            with TRACER.activate(trace_id), self.profiler.section():
+                with span('render', version=version, coalesced=coalesced):
+                    self._update_display(snapshot)
+            elapsed = TRACER.finish(trace_id)
+            if elapsed is not None:
+                TRACE_E2E_MS.observe(elapsed * 1000)
+                log.debug("🔎 Traça #%d: %.0f ms del missatge al panell", trace_id, elapsed * 1000)
+    
+    def _take_traces(self, version):
+        """
+        Traces que dibuixa el render d'una versió
+        
+        Es segueix la més antiga (la que més ha esperat); les altres
+        s'agrupen al mateix render i es descarten.
+        
+        Returns:
+            (trace_id o None, nombre de traces agrupades)
+        """
+        with self.traces_lock:
+            taken = []
+            while self.pending_traces and self.pending_traces[0][0] <= version:
+                taken.append(self.pending_traces.popleft())
+        if not taken:
+            return None, 0
+        for _, extra_id, _ in taken[1:]:
+            TRACER.discard(extra_id)
+        _, trace_id, updated_at = taken[0]
+        TRACER.record('render.wait', updated_at, time.monotonic(), trace_id)
+        return trace_id, len(taken) - 1
+    
+    def _update_display(self, snapshot):
+        """
+        Actualitzar display amb un snapshot de l'estat
+        
+        Args:
+            snapshot: Snapshot del StateStore (valors consistents entre si)
+        """
         try:
-            print("🎨 Actualitzant display...")
-            print(f"   DEBUG: temp_interior={self.temp_interior}")
-            print(f"   DEBUG: temp_exterior={self.temp_exterior}")
-            print(f"   DEBUG: forecast={self.forecast}")
+            start = time.perf_counter()
             
             # Usar última previsió en cache si no n'hi ha
-            if self.forecast is None:
-                print("   ⚠️  Forecast is None, obtenint cached...")
-                self.forecast = self.yr_client.get_cached_forecast()
-                print(f"   DEBUG: cached forecast={self.forecast}")
+            forecast = snapshot['forecast']
+            if forecast is None:
+                log.debug("Sense previsió a l'estat, usant la de cache")
+                forecast = self.yr_client.get_cached_forecast()
             
             # Renderitzar
-            print("   Cridant ui.render()...")
             self.ui.render(
-                temp_interior=self.temp_interior,
-                temp_exterior=self.temp_exterior,
-                forecast=self.forecast
+                temp_interior=snapshot['temp_interior'],
+                temp_exterior=snapshot['temp_exterior'],
+                forecast=forecast,
+                history=self._get_graph_history()
             )
             
             self.last_display_update = datetime.now()
-            print("   ✅ Display actualitzat (render completat)")
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            RENDER_MS.observe(elapsed_ms)
+            log.info("🎨 Display actualitzat (v%d) en %.0f ms", snapshot.version, elapsed_ms)
             
-        except Exception as e:
-            print(f"   ❌ Error actualitzant display: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            RENDER_ERRORS.inc()
+            log.exception("❌ Error actualitzant display")
 
-    def _should_update_yr(self):
-        """Comprovar si cal actualitzar previsió YR (cada 3h)"""
-        if self.last_yr_update is None:
-            return True
-        
-        now = datetime.now()
-        elapsed = now - self.last_yr_update
+    def _get_graph_history(self):
+        """Sèries de 24h per als gràfics de la UI (None si desactivats)"""
+        if not self.config.get('display', {}).get('graphs', False) or self.mqtt is None:
+            return None
+        
+        since = time.time() - 86400
+        history = {
+            'interior': self.mqtt.get_series('menjador', since),
+            'exterior': self.mqtt.get_series('balco', since)
+        }
+        # get_series retorna (times, values): la tupla és certa encara que sigui buida
+        plottable = any(series and len(series[0]) >= 2 for series in history.values())
+        return history if plottable else None
+    
+    def _compact_history(self):
+        """Tasca diària: compactar l'històric antic a agregats"""
+        try:
+            keep_days = self.config['mqtt'].get('store_keep_days', 7)
+            compacted = self.store.compact(older_than_days=keep_days)
+            if compacted:
+                print(f"🗜️  Històric: {compacted} dies compactats")
+        except OSError as e:
+            print(f"⚠️  Error compactant històric: {e}")
+    
+    def _schedule_yr_update(self, delay=None):
+        """
+        Planificar el pròxim fetch YR
         
-        # Actualitzar cada 3 hores
-        interval = timedelta(hours=self.config['yr_api']['update_interval_hours'])
+        Args:
+            delay: Segons fins al fetch (None = calcular segons Expires,
+                   cadència configurada i backoff d'errors)
+        """
+        if delay is None:
+            yr_config = self.config['yr_api']
+            delay = self.yr_client.next_update_delay(
+                interval_hours=yr_config['update_interval_hours'],
+                start_hour=yr_config.get('update_start_hour', 0)
+            )
         
-        if elapsed >= interval:
-            # Comprovar si estem a una hora "rodona" (00:00, 03:00, 06:00, etc.)
-            if now.hour % self.config['yr_api']['update_interval_hours'] == 0:
-                return True
+        if self.yr_job is not None:
+            self.yr_job.cancel()
+        self.yr_job = self.scheduler.call_later(delay, self._yr_update, name="yr_update")
         
-        return False
+        next_time = datetime.now() + timedelta(seconds=delay)
+        print(f"   🗓️  Pròxim update YR: {next_time.strftime('%H:%M:%S')}")
     
-    def _yr_update_loop(self):
-        """Thread per actualitzar YR periòdicament"""
-        print("\n🔄 Thread YR iniciat")
+    def _yr_update(self):
+        """Tasca planificada: obtenir previsió i replanificar"""
+        try:
+            print(f"\n⏰ Update programat YR ({datetime.now().strftime('%H:%M')})")
+            
+            new_forecast = self.yr_client.get_forecast()
+            
+            if new_forecast['success']:
+                self._on_forecast_refreshed(new_forecast)
+            else:
+                print("   ⚠️  Previsió fallida, mantenint anterior")
         
-        while self.running:
-            try:
-                if self._should_update_yr():
-                    print(f"\n⏰ Update programat YR ({datetime.now().strftime('%H:%M')})")
-                    
-                    new_forecast = self.yr_client.get_forecast()
-                    
-                    if new_forecast['success']:
-                        self.forecast = new_forecast
-                        self.last_yr_update = datetime.now()
-                        
-                        # Update display amb nova previsió
-                        self._update_display()
-                    else:
-                        print("   ⚠️  Previsió fallida, mantenint anterior")
-                
-                # Comprovar cada 10 minuts
-                self.shutdown_event.wait(600)
-                
-            except Exception as e:
-                print(f"❌ Error al thread YR: {e}")
-                self.shutdown_event.wait(600)
+        except Exception as e:
+            print(f"❌ Error a l'update YR: {e}")
+        
+        finally:
+            if self.running:
+                self._schedule_yr_update()
     
     def run(self):
         """Executar loop principal"""
         
-        # Iniciar thread YR
-        yr_thread = Thread(target=self._yr_update_loop, daemon=True)
-        yr_thread.start()
-        
         print("\n🏃 Sistema en execució...")
         print("   Prem Ctrl+C per aturar")
         print("")
         
         try:
-            # Loop principal (només mantenir viu)
-            while self.running:
-                time.sleep(1)
-                
+            # Tota la feina la fan el planificador, el renderer i MQTT:
+            # el thread principal dorm fins a l'aturada (cap despertar periòdic)
+            self.shutdown_event.wait()
+            
         except KeyboardInterrupt:
             print("\n\n⏹️  Interrupció rebuda (Ctrl+C)")
             self.shutdown()
@@ -267,14 +654,39 @@ class WeatherDisplay:
         
         self.running = False
         self.shutdown_event.set()
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+        self.state.close()
+        if self.render_thread is not None:
+            self.render_thread.join(timeout=30)
+        self.scheduler.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
         
         # Desconnectar MQTT
         if self.mqtt:
             self.mqtt.disconnect()
+        self.ha.stop()
+        
+        # Escriure l'històric pendent
+        if self.store:
+            self.store.stop()
         
         # Netejar display (opcional)
         # self.ui.clear()
         
+        # Desar les traces del buffer (si està configurat)
+        export_path = self.config.get('tracing', {}).get('export_path')
+        if TRACER.enabled and export_path:
+            try:
+                count = TRACER.export_chrome(export_path)
+                print(f"🔎 {count} events de traça desats a {export_path}")
+            except OSError as e:
+                print(f"⚠️  No s'han pogut desar les traces: {e}")
+        
+        # Buidar la cua de logs pendents
+        shutdown_logging()
+        
         print("✅ Sistema aturat correctament")
         print("")
 
@@ -296,6 +708,9 @@ def main():
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
+    # Diagnòstic en calent: kill -USR1 (perfil CPU) / kill -USR2 (memòria)
+    weather.profiler.install_signals()
+    
     # Setup
     if not weather.setup():
         print("❌ Error durant setup")